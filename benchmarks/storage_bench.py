@@ -0,0 +1,623 @@
+"""
+Бенчмарк слоя хранения на синтетических «больших клубах».
+
+Строит временную SQLite-базу заданного размера, замеряет методы Database
+и сервисов поверх неё и пишет JSON-отчёт. Отчёт можно сравнить с сохранённым
+базовым, тогда при замедлении сверх порога скрипт завершится с кодом 1.
+
+Запуск из корня репозитория:
+    python -m benchmarks.storage_bench --output bench.json
+    python -m benchmarks.storage_bench --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from services.book_service import BookService
+from services.genre_service import GenreService
+from services.history_service import HistoryService
+from services.users_service import UsersService
+from storage.database import ActivityBatchRow, Database
+
+
+REPORT_FORMAT = 1
+
+# Чат, на котором меряем чтения: в нём максимум данных
+HOT_CHAT_ID = -1_000_000_000_001
+# Чат для изменяющих операций, чтобы не портить данные «горячего» чата
+SCRATCH_CHAT_ID = -1_000_000_000_002
+
+
+@dataclass
+class BenchConfig:
+    chats: int = 200
+    suggestions: int = 40
+    genres: int = 15
+    history_years: int = 10
+    users: int = 100_000
+    users_per_chat: int = 200
+    iterations: int = 200
+    seed: int = 42
+
+
+PRESETS: Dict[str, Dict[str, int]] = {
+    "small": {"chats": 20, "suggestions": 20, "genres": 10, "history_years": 3, "users": 2_000, "users_per_chat": 50},
+    "medium": {},
+    "large": {"chats": 2_000, "suggestions": 100, "genres": 30, "history_years": 20, "users": 300_000, "users_per_chat": 500},
+}
+
+
+@dataclass
+class CaseResult:
+    iterations: int
+    median_us: float
+    p95_us: float
+    min_us: float
+    max_us: float
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "iterations": self.iterations,
+            "median_us": round(self.median_us, 2),
+            "p95_us": round(self.p95_us, 2),
+            "min_us": round(self.min_us, 2),
+            "max_us": round(self.max_us, 2),
+        }
+
+
+@dataclass
+class Bench:
+    iterations: int
+    name_filter: Optional[str] = None
+    results: Dict[str, CaseResult] = field(default_factory=dict)
+
+    def case(
+        self,
+        name: str,
+        fn: Callable[[], Any],
+        *,
+        setup: Optional[Callable[[], Any]] = None,
+        iterations: Optional[int] = None,
+    ) -> None:
+        """Замеряет fn() iterations раз. setup() выполняется перед каждым замером и не учитывается."""
+        if self.name_filter and self.name_filter not in name:
+            return
+        n = max(1, iterations or self.iterations)
+        samples: List[float] = []
+        for _ in range(n):
+            if setup is not None:
+                setup()
+            started = time.perf_counter_ns()
+            fn()
+            samples.append((time.perf_counter_ns() - started) / 1000)
+        samples.sort()
+        self.results[name] = CaseResult(
+            iterations=n,
+            median_us=statistics.median(samples),
+            p95_us=samples[min(n - 1, int(n * 0.95))],
+            min_us=samples[0],
+            max_us=samples[-1],
+        )
+        print(f"  {name:<58} {self.results[name].median_us:>12.1f} us", flush=True)
+
+
+# ----- генерация данных -----
+
+def _ts(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def build_database(db_path: str, cfg: BenchConfig) -> Database:
+    """
+    Создаёт базу через Database (миграции те же, что в боте)
+    и заливает синтетику пачками напрямую через sqlite3.
+    """
+    db = Database(db_path)
+    rnd = random.Random(cfg.seed)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    chat_ids = [HOT_CHAT_ID, SCRATCH_CHAT_ID] + [-1_000_000_100_000 - i for i in range(max(cfg.chats - 2, 0))]
+
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT INTO groups (chat_id, title, type, is_active, added_at, updated_at) VALUES (?, ?, 'supergroup', ?, ?, ?)",
+                [
+                    (chat_id, f"Клуб {n}", 1 if n % 10 else 0, _ts(now - timedelta(days=n)), _ts(now))
+                    for n, chat_id in enumerate(chat_ids)
+                ],
+            )
+
+            conn.executemany(
+                "INSERT INTO suggestions (chat_id, user_id, username, text, source_message_id, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (chat_id, 1000 + i, f"reader{i}", f"Автор {i} — Книга номер {i} из клуба {n}", i,
+                     _ts(now - timedelta(minutes=cfg.suggestions - i)))
+                    for n, chat_id in enumerate(chat_ids)
+                    for i in range(cfg.suggestions)
+                ),
+            )
+
+            conn.executemany(
+                "INSERT INTO genres (chat_id, title, source_message_id, position, used) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (chat_id, f"Жанр {i}", i, i + 1, 1 if i % 3 == 0 else 0)
+                    for chat_id in chat_ids
+                    for i in range(cfg.genres)
+                ),
+            )
+
+            first_year = now.year - cfg.history_years + 1
+            conn.executemany(
+                "INSERT INTO history (chat_id, month_year, book, genre, year, month) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (chat_id, f"{month}_{year}", f"Книга {month}/{year}", f"Жанр {month}", year, month)
+                    for chat_id in chat_ids
+                    for year in range(first_year, now.year + 1)
+                    for month in range(1, 13)
+                ),
+            )
+
+            conn.executemany(
+                "INSERT INTO polls (chat_id, poll_id, question, options, message_id, status) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (chat_id, f"{chat_id}:{i}", "Что читаем?", json.dumps([f"Книга {j}" for j in range(5)]), i,
+                     "active" if i == 0 else "closed")
+                    for chat_id in chat_ids
+                    for i in range(5)
+                ),
+            )
+
+            def activity_rows():
+                for n, chat_id in enumerate(chat_ids):
+                    count = cfg.users if chat_id == HOT_CHAT_ID else cfg.users_per_chat
+                    base_user = 10_000_000 * (n + 1)
+                    for i in range(count):
+                        first_seen = now - timedelta(days=rnd.randint(30, 1500))
+                        last = None if i % 7 == 0 else now - timedelta(minutes=rnd.randint(0, 60 * 24 * 720))
+                        username = None if i % 5 == 0 else f"user_{base_user + i}"
+                        effective = (last or first_seen).replace(tzinfo=timezone.utc)
+                        yield (
+                            chat_id, base_user + i, username, _ts(first_seen), _ts(last) if last else None,
+                            int(effective.timestamp()),
+                        )
+
+            conn.executemany(
+                """
+                INSERT INTO user_activity (chat_id, user_id, username, first_seen_at, last_activity_at, last_activity_ts)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                activity_rows(),
+            )
+
+            # Дневные счётчики горячего чата: 90 дней, каждый день активна двадцатая часть участников
+            today = int(now.replace(tzinfo=timezone.utc).timestamp()) // 86400
+
+            def daily_rows():
+                active_per_day = max(cfg.users // 20, 1)
+                for day in range(today - 89, today + 1):
+                    for user_id in rnd.sample(range(10_000_000, 10_000_000 + cfg.users), active_per_day):
+                        yield (HOT_CHAT_ID, day, user_id, rnd.randint(0, 40), rnd.randint(0, 5), rnd.randint(0, 20))
+
+            conn.executemany(
+                """
+                INSERT INTO user_activity_daily (chat_id, day, user_id, messages, callbacks, reactions)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                daily_rows(),
+            )
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return db
+
+
+# ----- сценарии -----
+
+def bench_suggestions(bench: Bench, db: Database, books: BookService, cfg: BenchConfig) -> None:
+    hot, scratch = HOT_CHAT_ID, SCRATCH_CHAT_ID
+    middle = max(1, cfg.suggestions // 2)
+    counter = iter(range(10**9))
+
+    bench.case("db.get_suggestions", lambda: db.get_suggestions(hot), setup=db.clear_caches)
+    bench.case("db.get_suggestions[cached]", lambda: db.get_suggestions(hot))
+    bench.case("db.count_suggestions", lambda: db.count_suggestions(hot), setup=db.clear_caches)
+    bench.case("db.get_suggestion_by_index", lambda: db.get_suggestion_by_index(hot, middle), setup=db.clear_caches)
+    bench.case("db.add_suggestion", lambda: db.add_suggestion(scratch, 1, "bench", f"Книга {next(counter)}", 1))
+    bench.case(
+        "db.delete_suggestion_by_index",
+        lambda: db.delete_suggestion_by_index(scratch, 1),
+        setup=lambda: db.add_suggestion(scratch, 1, "bench", "Удаляемая книга", 1),
+    )
+    bench.case(
+        "db.delete_suggestion",
+        lambda: db.delete_suggestion(scratch, db.get_suggestions(scratch)[-1][0]),
+        setup=lambda: db.add_suggestion(scratch, 1, "bench", "Удаляемая книга", 1),
+    )
+    bench.case(
+        "db.clear_suggestions",
+        lambda: db.clear_suggestions(scratch),
+        setup=lambda: [db.add_suggestion(scratch, 1, "bench", f"Книга {i}", i) for i in range(cfg.suggestions)],
+        iterations=max(1, bench.iterations // 10),
+    )
+    # Восстанавливаем список, чтобы сервисные сценарии ниже видели данные
+    for i in range(cfg.suggestions):
+        db.add_suggestion(scratch, 1, "bench", f"Книга {i}", i)
+
+    def cold():
+        db.clear_caches()
+        books._rendered.clear()
+
+    bench.case("books.list_books", lambda: books.list_books(hot), setup=cold)
+    bench.case("books.list_books[cached]", lambda: books.list_books(hot))
+    bench.case("books.has_books", lambda: books.has_books(hot), setup=db.clear_caches)
+    bench.case("books.choose_random_book", lambda: books.choose_random_book(hot), setup=db.clear_caches)
+    bench.case("books.get_books_for_poll", lambda: books.get_books_for_poll(hot), setup=db.clear_caches)
+    bench.case(
+        "books.delete_book",
+        lambda: books.delete_book(scratch, 1, 1, True),
+        setup=lambda: db.add_suggestion(scratch, 1, "bench", "Удаляемая книга", 1),
+    )
+
+
+def bench_genres(bench: Bench, db: Database, genres: GenreService, cfg: BenchConfig) -> None:
+    hot, scratch = HOT_CHAT_ID, SCRATCH_CHAT_ID
+    middle = max(1, cfg.genres // 2)
+    counter = iter(range(10**9))
+
+    bench.case("db.get_genres", lambda: db.get_genres(hot), setup=db.clear_caches)
+    bench.case("db.get_genres[cached]", lambda: db.get_genres(hot))
+    bench.case("db.get_genre_by_index", lambda: db.get_genre_by_index(hot, middle), setup=db.clear_caches)
+    bench.case("db.add_genre", lambda: db.add_genre(scratch, f"Жанр {next(counter)}", 1))
+    bench.case("db.toggle_genre_active_by_index", lambda: db.toggle_genre_active_by_index(scratch, 1))
+    bench.case("db.toggle_genre_active", lambda: db.toggle_genre_active(scratch, db.get_genres(scratch)[0][0]))
+    bench.case("db.reset_all_genres_active", lambda: db.reset_all_genres_active(scratch))
+    bench.case(
+        "db.delete_genre_by_index",
+        lambda: db.delete_genre_by_index(scratch, 1),
+        setup=lambda: db.add_genre(scratch, f"Жанр {next(counter)}", 1),
+    )
+    bench.case(
+        "db.delete_genre",
+        lambda: db.delete_genre(scratch, db.get_genres(scratch)[-1][0]),
+        setup=lambda: db.add_genre(scratch, f"Жанр {next(counter)}", 1),
+    )
+
+    def cold():
+        db.clear_caches()
+        genres._rendered.clear()
+
+    bench.case("genres.list_genres", lambda: genres.list_genres(hot), setup=cold)
+    bench.case("genres.list_genres[cached]", lambda: genres.list_genres(hot))
+    bench.case("genres.get_genres_for_poll", lambda: genres.get_genres_for_poll(hot), setup=db.clear_caches)
+    bench.case("genres.toggle_genre_active", lambda: genres.toggle_genre_active(scratch, 1))
+
+
+def bench_history(bench: Bench, db: Database, history: HistoryService, cfg: BenchConfig) -> None:
+    hot, scratch = HOT_CHAT_ID, SCRATCH_CHAT_ID
+    year = datetime.now().year
+
+    bench.case("db.get_history_years", lambda: db.get_history_years(hot))
+    bench.case("db.get_history_for_year", lambda: db.get_history_for_year(hot, year))
+    bench.case("db.upsert_history_book", lambda: db.upsert_history_book(scratch, f"1_{year}", "Книга"))
+    bench.case("db.upsert_history_genre", lambda: db.upsert_history_genre(scratch, f"1_{year}", "Жанр"))
+    bench.case(
+        "db.upsert_history_book_from_suggestion_index",
+        lambda: db.upsert_history_book_from_suggestion_index(scratch, 1, f"2_{year}"),
+    )
+    bench.case(
+        "db.upsert_history_genre_from_genre_index",
+        lambda: db.upsert_history_genre_from_genre_index(scratch, 1, f"2_{year}"),
+    )
+    bench.case("history.get_years", lambda: history.get_years(hot))
+    bench.case("history.get_year_text", lambda: history.get_year_text(hot, year))
+
+
+def bench_polls(bench: Bench, db: Database, books: BookService) -> None:
+    hot, scratch = HOT_CHAT_ID, SCRATCH_CHAT_ID
+    counter = iter(range(10**9))
+
+    bench.case("db.get_polls", lambda: db.get_polls(hot))
+    bench.case("db.get_polls[active]", lambda: db.get_polls(hot, "active"))
+    bench.case("db.get_poll_by_poll_id", lambda: db.get_poll_by_poll_id(hot, f"{hot}:3"))
+    bench.case(
+        "db.add_poll",
+        lambda: db.add_poll(scratch, f"bench:{next(counter)}", "Что читаем?", ["А", "Б", "В"], 1),
+    )
+    bench.case("db.close_poll", lambda: db.close_poll(scratch, f"bench:{next(counter)}"))
+    bench.case("books.list_polls", lambda: books.list_polls(hot))
+    bench.case("books.get_active_polls", lambda: books.get_active_polls(hot))
+
+
+def bench_groups(bench: Bench, db: Database) -> None:
+    scratch = SCRATCH_CHAT_ID
+
+    bench.case("db.get_all_groups", lambda: db.get_all_groups())
+    bench.case("db.get_all_groups[active]", lambda: db.get_all_groups(active_only=True))
+    bench.case("db.get_group", lambda: db.get_group(HOT_CHAT_ID))
+    bench.case("db.add_or_update_group", lambda: db.add_or_update_group(scratch, "Клуб", "supergroup", 1))
+    bench.case("db.remove_group", lambda: db.remove_group(scratch))
+    db.add_or_update_group(scratch, "Клуб", "supergroup", 1)
+
+
+def bench_users(bench: Bench, db: Database, users: UsersService, cfg: BenchConfig) -> None:
+    hot, scratch = HOT_CHAT_ID, SCRATCH_CHAT_ID
+    # Большие выборки меряем меньшее число раз, иначе прогон на 100k+ затягивается
+    heavy = max(5, bench.iterations // 10)
+    counter = iter(range(10**9))
+    new_users = [(900_000_000 + i, f"new_{i}") for i in range(1_000)]
+    now_ts = int(time.time())
+    batch = [(scratch, 800_000_000 + i, f"u{i}", now_ts - i) for i in range(500)]
+
+    bench.case("db.get_users_for_chat", lambda: db.get_users_for_chat(hot), iterations=heavy)
+    for months in (1, 3, 6):
+        bench.case(
+            f"db.get_users_for_chat[inactive={months}]",
+            lambda months=months: db.get_users_for_chat(hot, inactive_months=months),
+            iterations=heavy,
+        )
+    # Для сравнения: прежний фильтр по выражению над датами (индексом не обслуживается)
+    # и фильтр по last_activity_ts. count(*) меряет сам фильтр, без сортировки и выдачи строк.
+    for label, predicate, arg in (
+        ("datetime expression", "datetime(COALESCE(last_activity_at, first_seen_at)) < datetime('now', ?)", "-3 months"),
+        ("last_activity_ts", "last_activity_ts < CAST(strftime('%s', 'now', ?) AS INTEGER)", "-3 months"),
+    ):
+        bench.case(
+            f"sql.inactive_count[{label}, 3 months]",
+            lambda predicate=predicate, arg=arg: db._conn.execute(
+                f"SELECT count(*) FROM user_activity WHERE chat_id = ? AND {predicate}", (hot, arg)
+            ).fetchone(),
+            iterations=heavy,
+        )
+        bench.case(
+            f"sql.inactive_list[{label}, 3 months]",
+            lambda predicate=predicate, arg=arg: db._conn.execute(
+                f"""
+                SELECT user_id, username, last_activity_at
+                FROM user_activity
+                WHERE chat_id = ? AND {predicate}
+                ORDER BY COALESCE(username, '') COLLATE NOCASE ASC, user_id ASC
+                """,
+                (hot, arg),
+            ).fetchall(),
+            iterations=heavy,
+        )
+    # Страницы /users: первая и «глубокая» (около 90% списка) должны стоить одинаково
+    deep = db._conn.execute(
+        """
+        SELECT user_id FROM user_activity WHERE chat_id = ?
+        ORDER BY COALESCE(username, '') COLLATE NOCASE, user_id
+        LIMIT 1 OFFSET ?
+        """,
+        (hot, int(cfg.users * 0.9)),
+    ).fetchone()
+    bench.case("users.get_users_page[first]", lambda: users.get_users_page(hot, inactive_months=None))
+    bench.case("users.get_users_page[first, inactive=3]", lambda: users.get_users_page(hot, inactive_months=3))
+    if deep:
+        bench.case(
+            "users.get_users_page[deep next]",
+            lambda: users.get_users_page(hot, inactive_months=None, cursor_user_id=deep[0]),
+        )
+        bench.case(
+            "users.get_users_page[deep prev, inactive=3]",
+            lambda: users.get_users_page(hot, inactive_months=3, cursor_user_id=deep[0], backward=True),
+        )
+    bench.case("users.get_users_for_chat", lambda: users.get_users_for_chat(hot, inactive_months=3), iterations=heavy)
+    bench.case("users.find_username_for_chat", lambda: users.find_username_for_chat(hot, 10_000_001), iterations=heavy)
+    bench.case("db.upsert_user_activity", lambda: db.upsert_user_activity(hot, 10_000_000 + next(counter) % 1000, "u"))
+    bench.case("db.upsert_user_activity_many[500]", lambda: db.upsert_user_activity_many(batch), iterations=heavy)
+    # Массовый вход 1000 участников: одной транзакцией через буфер против вызова на каждого
+    joins = [(scratch, 700_000_000 + i, f"j{i}", now_ts, False) for i in range(1_000)]
+    leaves = [(scratch, 700_000_000 + i, None, None, True) for i in range(1_000)]
+    bench.case(
+        "db.apply_user_activity_batch[1k joins]",
+        lambda: db.apply_user_activity_batch(joins),
+        setup=lambda: db.apply_user_activity_batch(leaves),
+        iterations=heavy,
+    )
+    # Типичный flush раз в минуту: 500 участников и их дневные счётчики одной транзакцией
+    today = now_ts // 86400
+    minute = [(hot, 10_000_000 + i, None, now_ts, False) for i in range(min(cfg.users, 500))]
+    minute_daily = [(hot, user_id, today, 3, 1, 2) for _c, user_id, _u, _ts, _r in minute]
+    bench.case("db.apply_user_activity_batch[500]", lambda: db.apply_user_activity_batch(minute), iterations=heavy)
+    bench.case(
+        "db.apply_user_activity_batch[500 + daily]",
+        lambda: db.apply_user_activity_batch(minute, minute_daily),
+        iterations=heavy,
+    )
+    # Тот же flush, но каждый раз новые участники вразброс и более позднее время:
+    # так меняются записи индексов по last_activity_ts и по имени, как в проде
+    scattered_ts = iter(range(now_ts + 60, now_ts + 60 * 10**6, 60))
+    stride = max(cfg.users // 500, 1)
+    scattered: List[ActivityBatchRow] = []
+
+    def next_scattered_batch() -> None:
+        ts = next(scattered_ts)
+        user_ids = [10_000_000 + (ts // 60 + i * stride) % cfg.users for i in range(min(cfg.users, 500))]
+        scattered[:] = [(hot, user_id, f"user_{user_id}", ts, False) for user_id in user_ids]
+
+    bench.case(
+        "db.apply_user_activity_batch[500 scattered, newer ts]",
+        lambda: db.apply_user_activity_batch(scattered),
+        setup=next_scattered_batch,
+        iterations=heavy,
+    )
+    # Сводка /inactivity по всем чатам базы: одна выборка + расчёт по отсортированным массивам
+    all_chats = [row[0] for row in db._conn.execute("SELECT DISTINCT chat_id FROM user_activity")]
+    bench.case(
+        f"users.get_inactivity_report[{len(all_chats)} chats]",
+        lambda: users.get_inactivity_report(all_chats),
+        iterations=heavy,
+    )
+    for days in (7, 30, 90):
+        bench.case(
+            f"users.get_top_active_users[{days} days]",
+            lambda days=days: users.get_top_active_users(hot, days=days),
+            iterations=heavy,
+        )
+    bench.case(
+        "db.upsert_user_activity[1k joins, one by one]",
+        lambda: [db.upsert_user_activity(chat_id, user_id, username) for chat_id, user_id, username, _ts, _r in joins],
+        setup=lambda: db.apply_user_activity_batch(leaves),
+        iterations=heavy,
+    )
+    bench.case(
+        "db.delete_user_activity",
+        lambda: db.delete_user_activity(scratch, 1),
+        setup=lambda: db.upsert_user_activity(scratch, 1, "u"),
+    )
+    # Импорт /init_users: новые пользователи и уже известные (есть в горячем чате)
+    for size, label in ((1_000, "1k"), (10_000, "10k"), (100_000, "100k")):
+        imported_new = [(900_000_000 + i, f"new_{i}") for i in range(size)]
+        imported_known = [(10_000_000 + i, None) for i in range(min(cfg.users, size))]
+        bench.case(
+            f"db.insert_user_activity_if_missing_by_user_id[{label} new]",
+            lambda imported_new=imported_new: db.insert_user_activity_if_missing_by_user_id(scratch, imported_new),
+            setup=lambda: db.clear_user_activity(scratch),
+            iterations=heavy,
+        )
+        bench.case(
+            f"db.insert_user_activity_if_missing_by_user_id[{label} known]",
+            lambda imported_known=imported_known: db.insert_user_activity_if_missing_by_user_id(scratch, imported_known),
+            iterations=heavy,
+        )
+    bench.case(
+        "users.import_users_if_missing_by_user_id[1k new]",
+        lambda: users.import_users_if_missing_by_user_id(chat_id=scratch, users=new_users),
+        setup=lambda: db.clear_user_activity(scratch),
+        iterations=heavy,
+    )
+    bench.case(
+        "db.clear_user_activity[500]",
+        lambda: db.clear_user_activity(scratch),
+        setup=lambda: db.upsert_user_activity_many(batch),
+        iterations=heavy,
+    )
+
+
+def run_benchmarks(cfg: BenchConfig, *, name_filter: Optional[str] = None, keep_db: Optional[str] = None) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="bookclub-bench-") as tmp:
+        db_path = keep_db or str(Path(tmp) / "bench.sqlite3")
+        print(f"Строим базу: {db_path}", flush=True)
+        started = time.perf_counter()
+        db = build_database(db_path, cfg)
+        build_sec = time.perf_counter() - started
+        print(f"  готово за {build_sec:.1f} с", flush=True)
+
+        bench = Bench(iterations=cfg.iterations, name_filter=name_filter)
+        books = BookService(db)
+        genres = GenreService(db)
+        history = HistoryService(db)
+        users = UsersService(db)
+        try:
+            bench_suggestions(bench, db, books, cfg)
+            bench_genres(bench, db, genres, cfg)
+            bench_history(bench, db, history, cfg)
+            bench_polls(bench, db, books)
+            bench_groups(bench, db)
+            bench_users(bench, db, users, cfg)
+        finally:
+            db.close()
+
+    return {
+        "format": REPORT_FORMAT,
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "build_sec": round(build_sec, 2),
+            "config": cfg.__dict__,
+        },
+        "results": {name: result.as_dict() for name, result in sorted(bench.results.items())},
+    }
+
+
+def compare_reports(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    *,
+    threshold: float,
+    min_delta_us: float,
+) -> List[str]:
+    """
+    Сравнивает медианы с базовым отчётом. Возвращает имена сценариев,
+    которые стали медленнее больше чем в threshold раз и больше чем на min_delta_us.
+    """
+    regressions: List[str] = []
+    base_results = baseline.get("results", {})
+    if baseline.get("meta", {}).get("config") != current["meta"]["config"]:
+        print("Внимание: параметры базового отчёта отличаются от текущих, сравнение неточное")
+
+    print(f"\n{'сценарий':<58} {'база, us':>12} {'сейчас, us':>12} {'x':>7}")
+    for name, result in current["results"].items():
+        base = base_results.get(name)
+        if not base:
+            print(f"{name:<58} {'—':>12} {result['median_us']:>12.1f}")
+            continue
+        ratio = max(result["median_us"], 1.0) / max(base["median_us"], 1.0)
+        # На операциях в десятки микросекунд шум планировщика сопоставим с самой операцией
+        regressed = ratio > threshold and result["median_us"] - base["median_us"] > min_delta_us
+        mark = "  <-- регрессия" if regressed else ""
+        print(f"{name:<58} {base['median_us']:>12.1f} {result['median_us']:>12.1f} {ratio:>7.2f}{mark}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк слоя хранения (SQLite) на синтетических данных")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="medium", help="готовый набор размеров")
+    parser.add_argument("--chats", type=int, help="число чатов")
+    parser.add_argument("--suggestions", type=int, help="предложений книг на чат")
+    parser.add_argument("--genres", type=int, help="жанров на чат")
+    parser.add_argument("--history-years", type=int, help="лет истории на чат")
+    parser.add_argument("--users", type=int, help="участников в самом большом чате")
+    parser.add_argument("--users-per-chat", type=int, help="участников в остальных чатах")
+    parser.add_argument("--iterations", type=int, help="замеров на сценарий")
+    parser.add_argument("--seed", type=int, help="seed генератора данных")
+    parser.add_argument("--filter", help="запускать только сценарии, в имени которых есть подстрока")
+    parser.add_argument("--output", help="куда записать JSON-отчёт")
+    parser.add_argument("--baseline", help="базовый JSON-отчёт для сравнения")
+    parser.add_argument("--threshold", type=float, default=1.5, help="допустимое замедление медианы (раз)")
+    parser.add_argument("--min-delta-us", type=float, default=50.0, help="замедления меньше этого (мкс) не считаются")
+    parser.add_argument("--keep-db", help="строить базу по этому пути и не удалять (для ручного разбора)")
+    args = parser.parse_args(argv)
+
+    cfg = BenchConfig(**PRESETS[args.preset])
+    for key in cfg.__dict__:
+        value = getattr(args, key, None)
+        if value is not None:
+            setattr(cfg, key, value)
+
+    report = run_benchmarks(cfg, name_filter=args.filter, keep_db=args.keep_db)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nОтчёт: {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare_reports(
+            report, baseline, threshold=args.threshold, min_delta_us=args.min_delta_us
+        )
+        if regressions:
+            print(f"\nРегрессии ({len(regressions)}): {', '.join(regressions)}")
+            return 1
+        print("\nРегрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
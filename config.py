@@ -9,4 +9,16 @@ VISIT_ASK_HOUR = int(os.environ.get("VISIT_ASK_HOUR", 20))
 DB_PATH = os.environ.get(
     "DB_PATH",
     str(Path(__file__).resolve().parent / "data" / "bot.sqlite3")
-)
\ No newline at end of file
+)
+
+# как часто буфер активности пишется в БД (время событий сохраняется точно, интервал влияет только на нагрузку)
+ACTIVITY_FLUSH_INTERVAL_SECONDS = int(os.environ.get("ACTIVITY_FLUSH_INTERVAL_SECONDS", 300))
+
+# сколько различных (чат, пользователь) копится в буфере активности до внеочередной записи в БД
+ACTIVITY_BUFFER_MAX = int(os.environ.get("ACTIVITY_BUFFER_MAX", 20000))
+
+# журнал буфера активности: переживает падение процесса между flush'ами
+ACTIVITY_JOURNAL_PATH = os.environ.get("ACTIVITY_JOURNAL_PATH", DB_PATH + ".activity.journal")
+
+# окно «недавно видели» для активности: повторные события участника в пределах окна не буферизуются (0 — выключено)
+ACTIVITY_DEDUPE_WINDOW_SECONDS = int(os.environ.get("ACTIVITY_DEDUPE_WINDOW_SECONDS", 60))
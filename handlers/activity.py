@@ -2,9 +2,12 @@ from telegram import Update
 from telegram.ext import ContextTypes
 
 from services.user_activity_service import (
+    ACTIVITY_CALLBACK,
+    ACTIVITY_MESSAGE,
+    ACTIVITY_REACTION,
     buffer_user_activity,
     flush_user_activity_buffer,
-    start_user_activity_flush_loop,
+    schedule_user_activity_flush,
 )
 
 
@@ -12,9 +15,13 @@ async def handle_any_message_activity(update: Update, context: ContextTypes.DEFA
     """
     Отмечает last_activity_at для любого сообщения пользователя в группе/супергруппе.
     Не отвечает в чат — только буферизует.
+    Служебные сообщения о входе/выходе обрабатывает handle_user_membership_update:
+    здесь они не считаются ни активностью, ни сообщением в дневной статистике.
     """
     if not update.message:
         return
+    if update.message.new_chat_members or update.message.left_chat_member:
+        return
 
     chat = update.effective_chat
     user = update.effective_user
@@ -23,7 +30,7 @@ async def handle_any_message_activity(update: Update, context: ContextTypes.DEFA
     if getattr(user, "is_bot", False):
         return
 
-    await buffer_user_activity(chat.id, user.id, getattr(user, "username", None), context)
+    await buffer_user_activity(chat.id, user.id, getattr(user, "username", None), context, at=update.message.date, kind=ACTIVITY_MESSAGE)
 
 
 async def handle_any_callback_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -40,7 +47,7 @@ async def handle_any_callback_activity(update: Update, context: ContextTypes.DEF
     if getattr(user, "is_bot", False):
         return
 
-    await buffer_user_activity(chat.id, user.id, getattr(user, "username", None), context)
+    await buffer_user_activity(chat.id, user.id, getattr(user, "username", None), context, kind=ACTIVITY_CALLBACK)
 
 
 async def handle_any_reaction_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -56,5 +63,9 @@ async def handle_any_reaction_activity(update: Update, context: ContextTypes.DEF
     if getattr(user, "is_bot", False):
         return
 
-    await buffer_user_activity(chat.id, user.id, getattr(user, "username", None), context)
+    # Снятие реакции (пустой new_reaction) — активность, но не реакция в статистике
+    kind = ACTIVITY_REACTION if getattr(mr, "new_reaction", None) else None
+    await buffer_user_activity(
+        chat.id, user.id, getattr(user, "username", None), context, at=getattr(mr, "date", None), kind=kind
+    )
 
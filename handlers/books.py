@@ -11,6 +11,7 @@ from handlers.common import (
     _is_private,
     _is_admin_or_private_for_chat_id,
     _set_pending,
+    run_db,
     ui,
 )
 
@@ -29,7 +30,7 @@ async def list_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     service: BookService = context.bot_data["book_service"]
     chat_id = _get_chat_id(update, context)
-    text = service.list_books(chat_id)
+    text = await run_db(context, service.list_books, chat_id)
     if _is_private(update):
         chat_title = _get_chat_title_for_selected_chat_id(update, context, chat_id)
         text = f"{chat_title}\n\n{text}"
@@ -81,7 +82,7 @@ async def choose_book_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     chat_id = _get_chat_id(update, context)
     service: BookService = context.bot_data["book_service"]
 
-    if not service.has_books(chat_id):
+    if not await run_db(context, service.has_books, chat_id):
         await update.message.reply_text(ui.LIST_EMPTY)
         return
 
@@ -109,7 +110,7 @@ async def handle_books_callbacks(update: Update, context: ContextTypes.DEFAULT_T
             await query.edit_message_text(ui.ERR_ADMIN_ONLY)
             return
         service: BookService = context.bot_data["book_service"]
-        await query.edit_message_text(service.clear_books(chat_id))
+        await query.edit_message_text(await run_db(context, service.clear_books, chat_id))
         return
 
     if data == "books:clear:cancel":
@@ -118,7 +119,7 @@ async def handle_books_callbacks(update: Update, context: ContextTypes.DEFAULT_T
 
     if data == "books:choose:confirm":
         service: BookService = context.bot_data["book_service"]
-        result = service.choose_random_book(chat_id)
+        result = await run_db(context, service.choose_random_book, chat_id)
         if not result:
             await query.edit_message_text(ui.LIST_EMPTY)
             return
@@ -136,9 +137,10 @@ async def handle_books_callbacks(update: Update, context: ContextTypes.DEFAULT_T
             return
 
         service: GenreService = context.bot_data["genre_service"]
-        ok, msg = service.reset_all_genres_active(chat_id)
+        ok, msg = await run_db(context, service.reset_all_genres_active, chat_id)
         if ok:
-            await query.edit_message_text(f"{msg}\n\n{service.list_genres(chat_id)}")
+            genres_text = await run_db(context, service.list_genres, chat_id)
+            await query.edit_message_text(f"{msg}\n\n{genres_text}")
         else:
             await query.edit_message_text(msg)
         return
@@ -23,18 +23,12 @@ async def chats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data[USER_DATA_SELECTED_CHAT_ID] = private_chat_id
 
     chats: ChatsService = context.bot_data["chats_service"]
-    groups = chats.get_active_groups()
     selected_chat_id = chats.normalize_selected_chat_id(
         private_chat_id=private_chat_id,
         selected_chat_id=context.user_data.get(USER_DATA_SELECTED_CHAT_ID),
-        active_groups=groups,
     )
     context.user_data[USER_DATA_SELECTED_CHAT_ID] = selected_chat_id
-    keyboard = chats.build_keyboard(
-        private_chat_id=private_chat_id,
-        selected_chat_id=selected_chat_id,
-        active_groups=groups,
-    )
+    keyboard = chats.keyboard_for(private_chat_id=private_chat_id, selected_chat_id=selected_chat_id)
     await update.message.reply_text("Список чатов:", reply_markup=keyboard)
 
 
@@ -69,17 +63,11 @@ async def handle_chats_callbacks(update: Update, context: ContextTypes.DEFAULT_T
         context.user_data[USER_DATA_SELECTED_CHAT_ID] = selected_chat_id
 
     chats: ChatsService = context.bot_data["chats_service"]
-    groups = chats.get_active_groups()
     selected_chat_id = chats.normalize_selected_chat_id(
         private_chat_id=private_chat_id,
         selected_chat_id=selected_chat_id,
-        active_groups=groups,
     )
     context.user_data[USER_DATA_SELECTED_CHAT_ID] = selected_chat_id
-    keyboard = chats.build_keyboard(
-        private_chat_id=private_chat_id,
-        selected_chat_id=selected_chat_id,
-        active_groups=groups,
-    )
+    keyboard = chats.keyboard_for(private_chat_id=private_chat_id, selected_chat_id=selected_chat_id)
     await query.edit_message_text("Список чатов:", reply_markup=keyboard)
 
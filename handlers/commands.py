@@ -11,7 +11,7 @@ from handlers.activity import (
     handle_any_callback_activity,
     handle_any_message_activity,
     handle_any_reaction_activity,
-    start_user_activity_flush_loop,
+    schedule_user_activity_flush,
 )
 from handlers.books import (
     choose_book_command,
@@ -23,6 +23,7 @@ from handlers.books import (
     suggest_command,
 )
 from handlers.chats import chats_command, handle_chats_callbacks
+from handlers.export import export_command, handle_import_callbacks, import_command
 from handlers.genres import (
     activegenre_command,
     addgenre_command,
@@ -36,11 +37,16 @@ from handlers.history import (
     save_book_command,
     save_genre_command,
 )
-from handlers.membership import handle_my_chat_member, handle_user_membership_update
+from handlers.membership import (
+    handle_chat_member_update,
+    handle_my_chat_member,
+    handle_user_membership_update,
+)
 from handlers.polls import handle_poll_callbacks, pollbook_command, pollgenre_command
-from handlers.reply import handle_reply
+from handlers.reply import handle_document_reply, handle_reply
 from handlers.users import (
     handle_users_callbacks,
+    inactivity_command,
     init_users_command,
     reset_users_command,
     users_command,
@@ -63,15 +69,21 @@ __all__ = [
     "history_command",
     "handle_history_callbacks",
     "handle_reply",
+    "handle_document_reply",
     "handle_books_callbacks",
     "pollbook_command",
     "pollgenre_command",
     "handle_poll_callbacks",
     "handle_my_chat_member",
+    "handle_chat_member_update",
     "chats_command",
     "handle_chats_callbacks",
     "init_users_command",
     "users_command",
+    "inactivity_command",
+    "export_command",
+    "import_command",
+    "handle_import_callbacks",
     "reset_users_command",
     "handle_users_callbacks",
     "handle_user_membership_update",
@@ -79,6 +91,6 @@ __all__ = [
     "handle_any_callback_activity",
     "handle_any_reaction_activity",
     "flush_user_activity_buffer",
-    "start_user_activity_flush_loop",
+    "schedule_user_activity_flush",
 ]
 
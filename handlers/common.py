@@ -1,38 +1,38 @@
 import time
 from dataclasses import dataclass
-from typing import Optional, Tuple
+from typing import Any, Callable, Optional, Tuple
 
 from telegram import Update
 from telegram.ext import ContextTypes
 
+from services.admin_roster import AdminRoster
+from services.db_access import get_async_db_from_bot_data, get_db_from_bot_data
+from services.group_directory import GroupDirectory
+from storage.async_database import AsyncDatabase
 from storage.database import Database
 from utils import get_poll_month_year_key
 
 
 # ====== Database access (single point) ======
 
-def _get_db_from_bot_data(bot_data) -> Database:
-    """
-    Возвращает Database из bot_data, создавая при отсутствии.
+def get_db(context: ContextTypes.DEFAULT_TYPE) -> Database:
+    return get_db_from_bot_data(context.bot_data)
 
-    Важно: импортируем DB_PATH лениво, чтобы импорт этого модуля не падал,
-    если BOT_TOKEN не задан (config.py читает его при импорте).
-    """
-    db: Database = bot_data.get("database")
-    if not db:
-        from config import DB_PATH
 
-        db = Database(DB_PATH)
-        bot_data["database"] = db
-    return db
+def get_db_from_app(app) -> Database:
+    return get_db_from_bot_data(app.bot_data)
 
 
-def get_db(context: ContextTypes.DEFAULT_TYPE) -> Database:
-    return _get_db_from_bot_data(context.bot_data)
+def get_async_db(context: ContextTypes.DEFAULT_TYPE) -> AsyncDatabase:
+    return get_async_db_from_bot_data(context.bot_data)
 
 
-def get_db_from_app(app) -> Database:
-    return _get_db_from_bot_data(app.bot_data)
+async def run_db(context: ContextTypes.DEFAULT_TYPE, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Выполняет синхронный код, работающий с БД (методы сервисов/Database), в потоке БД.
+    Хендлеры не должны вызывать Database напрямую, чтобы не блокировать event loop.
+    """
+    return await get_async_db(context).run(fn, *args, **kwargs)
 
 
 # ====== UI текст/ключи ======
@@ -52,12 +52,36 @@ class UI:
     HISTORY_SELECT_YEAR: str = "Выберите год:"
     INIT_USERS_PROMPT: str = (
         "Пришлите CSV со строкой заголовка (как в members.*.csv).\n"
-        "Можно просто вставить текст CSV сюда.\n\n"
+        "Можно прислать файл или просто вставить текст CSV сюда.\n\n"
         "Для отмены отправьте `-`."
     )
+    INIT_USERS_DOWNLOADING: str = "Загружаю файл…"
+    INIT_USERS_PROGRESS: str = "Импорт: обработано {processed}, добавлено {inserted}…"
+    INIT_USERS_FILE_TOO_BIG: str = "Файл больше 20 МБ — бот не может его скачать."
     USERS_TITLE: str = "Пользователи"
     USERS_ERR_SELECT_GROUP: str = "Выберите групповой чат через /chats (сейчас выбран ЛС)."
     USERS_ERR_NEED_ADMIN: str = "Чтобы удалять пользователей, вы должны быть админом в выбранном чате."
+    USERS_TOP_TITLE: str = "Самые активные за {days} дн. (сообщения / кнопки / реакции)"
+    USERS_TOP_EMPTY: str = "За этот период активности не было."
+    INACTIVITY_NO_GROUPS: str = "Нет групп, где вы администратор и бот видел вашу активность."
+    INACTIVITY_EMPTY: str = "В ваших группах пока нет данных об участниках."
+    EXPORT_USAGE: str = "Формат выгрузки: /export csv или /export jsonl"
+    EXPORT_ERR_SELECT_GROUP: str = "Выберите групповой чат через /chats (сейчас выбран ЛС)."
+    EXPORT_ERR_NEED_ADMIN: str = "Выгрузка доступна только администраторам выбранного чата."
+    EXPORT_IN_PROGRESS: str = "Готовлю выгрузку…"
+    EXPORT_TOO_BIG: str = "Архив получился больше 50 МБ — Telegram не даст его отправить."
+    EXPORT_FAILED: str = "Не удалось подготовить выгрузку."
+    IMPORT_PROMPT: str = (
+        "Пришлите архив, полученный командой /export (zip).\n"
+        "Сначала покажу, что будет загружено, и попрошу подтверждение.\n\n"
+        "Для отмены отправьте `-`."
+    )
+    IMPORT_ERR_NEED_ADMIN: str = "Загрузка доступна только администраторам выбранного чата."
+    IMPORT_CHECKING: str = "Проверяю архив…"
+    IMPORT_IN_PROGRESS: str = "Загружаю…"
+    IMPORT_CANCELLED: str = "Загрузка отменена."
+    IMPORT_EXPIRED: str = "Архив для загрузки не найден. Начните заново: /import"
+    IMPORT_FAILED: str = "Не удалось загрузить архив, данные чата не изменены."
     RESET_USERS_CONFIRM: str = "Удалить все данные о пользователях для чата '{chat_title}'?"
     RESET_USERS_DONE: str = "Удалено записей: {count}"
 
@@ -89,6 +113,7 @@ class PendingAction:
     SAVE_BOOK = "save_book"
     SAVE_GENRE = "save_genre"
     INIT_USERS = "init_users"
+    IMPORT_SNAPSHOT = "import_snapshot"
 
 
 USER_DATA_KEY = "pending_action"
@@ -96,6 +121,8 @@ USER_DATA_PROMPT_MSG_ID = "pending_prompt_message_id"
 USER_DATA_PENDING_AT = "pending_action_at"
 USER_DATA_PENDING_RESET_JOB = "pending_reset_job"
 USER_DATA_SELECTED_CHAT_ID = "selected_chat_id"
+# Загруженный архив /import, ждущий подтверждения: {"path": ..., "chat_id": ...}
+USER_DATA_IMPORT_SNAPSHOT = "import_snapshot"
 
 # Таймаут ожидания ответа на ForceReply (секунды). По истечении — ожидание сбрасывается по таймеру.
 PENDING_REPLY_TIMEOUT_SEC = 300  # 5 минут
@@ -140,41 +167,44 @@ def _get_chat_title_for_selected_chat_id(
     """
     Для ЛС: возвращает название выбранного чата.
     - если выбран id ЛС -> "Приватная беседа"
-    - иначе -> title группы из БД (таблица groups), если есть
+    - иначе -> title группы из справочника групп (зеркало таблицы groups), если есть
     """
     private_chat = update.effective_chat
     if private_chat and selected_chat_id == private_chat.id:
         return "Приватная беседа"
 
-    db = get_db(context)
-    group = db.get_group(selected_chat_id)
-    if group:
-        _chat_id, title, _chat_type, _is_active, _added_at, _updated_at = group
+    directory: GroupDirectory = context.bot_data["group_directory"]
+    title = directory.title(selected_chat_id)
+    if title is not None:
         return title
 
     # Фолбэк на случай, если группы нет в БД (например, бот уже не в группе)
     return str(selected_chat_id)
 
 
+def get_admin_roster(context: ContextTypes.DEFAULT_TYPE) -> AdminRoster:
+    """Кэш администраторов по чатам (создаётся при отсутствии)."""
+    roster: AdminRoster = context.bot_data.get("admin_roster")
+    if not roster:
+        roster = AdminRoster()
+        context.bot_data["admin_roster"] = roster
+    return roster
+
+
 async def _is_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     user = update.effective_user
     if not user:
         return False
 
-    try:
-        chat = update.effective_chat
-        if not chat or getattr(chat, "type", None) == "private":
-            return False
-        member = await context.bot.get_chat_member(chat.id, user.id)
-        return member.status in ("administrator", "creator")
-    except Exception:
+    chat = update.effective_chat
+    if not chat or getattr(chat, "type", None) == "private":
         return False
+    return await _is_admin_in_chat(context, chat.id, user.id)
 
 
 async def _is_admin_in_chat(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int) -> bool:
     try:
-        member = await context.bot.get_chat_member(chat_id, user_id)
-        return member.status in ("administrator", "creator")
+        return await get_admin_roster(context).is_admin(context.bot, chat_id, user_id)
     except Exception:
         return False
 
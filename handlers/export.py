@@ -0,0 +1,240 @@
+import asyncio
+import os
+import tempfile
+from datetime import datetime
+from typing import Dict
+
+from telegram import ForceReply, InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.ext import ContextTypes
+
+from services.export_service import EXPORT_FORMATS, ExportService
+from services.import_service import ImportService, SnapshotError, SnapshotPlan
+
+from handlers.common import (
+    PendingAction,
+    USER_DATA_IMPORT_SNAPSHOT,
+    _get_chat_id,
+    _get_chat_title_for_selected_chat_id,
+    _is_admin_for_chat_id,
+    _is_private,
+    _set_pending,
+    run_db,
+    ui,
+)
+
+
+# Bot API принимает от бота файлы до 50 МБ
+EXPORT_DOCUMENT_MAX_BYTES = 50 * 1024 * 1024
+# ...а скачать бот может не больше 20 МБ
+IMPORT_DOCUMENT_MAX_BYTES = 20 * 1024 * 1024
+
+# Как таблицы называются в отчёте пробного прогона и что с ними делает загрузка
+_IMPORT_TABLE_LABELS = {
+    "suggestions": "предложения",
+    "genres": "жанры",
+    "history": "история",
+    "user_activity": "пользователи",
+}
+_IMPORT_MERGED_TABLES = ("user_activity",)
+
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /export [csv|jsonl] — выгрузка выбранного чата (предложения, жанры, опросы, история,
+    пользователи) zip-архивом. Архив собирается в отдельном потоке, event loop не блокируется.
+    """
+    if not update.message:
+        return
+
+    if not _is_private(update):
+        await update.message.reply_text(ui.ERR_PRIVATE_ONLY)
+        return
+
+    args = getattr(context, "args", None) or []
+    fmt = args[0].lower() if args else "csv"
+    if fmt not in EXPORT_FORMATS:
+        await update.message.reply_text(ui.EXPORT_USAGE)
+        return
+
+    chat_id = _get_chat_id(update, context)
+    if chat_id == update.effective_chat.id:
+        await update.message.reply_text(ui.EXPORT_ERR_SELECT_GROUP)
+        return
+
+    if not await _is_admin_for_chat_id(update, context, chat_id):
+        await update.message.reply_text(ui.EXPORT_ERR_NEED_ADMIN)
+        return
+
+    title = _get_chat_title_for_selected_chat_id(update, context, chat_id)
+    service: ExportService = context.bot_data["export_service"]
+    status = await update.message.reply_text(ui.EXPORT_IN_PROGRESS)
+
+    fd, path = tempfile.mkstemp(prefix="export-", suffix=".zip")
+    os.close(fd)
+    try:
+        try:
+            counts = await asyncio.to_thread(service.export_chat, chat_id, fmt=fmt, out_path=path)
+        except Exception:
+            await status.edit_text(ui.EXPORT_FAILED)
+            return
+
+        if os.path.getsize(path) > EXPORT_DOCUMENT_MAX_BYTES:
+            await status.edit_text(ui.EXPORT_TOO_BIG)
+            return
+
+        summary = ", ".join(f"{table}: {count}" for table, count in counts.items())
+        filename = f"export_{abs(chat_id)}_{datetime.now().strftime('%Y%m%d')}_{fmt}.zip"
+        with open(path, "rb") as f:
+            await update.message.reply_document(document=f, filename=filename, caption=f"{title}\n{summary}")
+        await status.delete()
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+async def import_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /import — загрузка архива /export в выбранный чат. Сначала пробный прогон
+    (сколько строк в архиве и в чате), запись — только после подтверждения.
+    """
+    if not update.message:
+        return
+
+    if not _is_private(update):
+        await update.message.reply_text(ui.ERR_PRIVATE_ONLY)
+        return
+
+    chat_id = _get_chat_id(update, context)
+    if chat_id == update.effective_chat.id:
+        await update.message.reply_text(ui.EXPORT_ERR_SELECT_GROUP)
+        return
+
+    if not await _is_admin_for_chat_id(update, context, chat_id):
+        await update.message.reply_text(ui.IMPORT_ERR_NEED_ADMIN)
+        return
+
+    sent = await update.message.reply_text(ui.IMPORT_PROMPT, reply_markup=ForceReply(selective=True))
+    _set_pending(context, PendingAction.IMPORT_SNAPSHOT, sent.message_id, update.effective_user.id)
+
+
+async def import_snapshot_document(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Архив для /import: скачивается во временный файл, проверяется и ждёт подтверждения."""
+    document = update.message.document
+    if document.file_size and document.file_size > IMPORT_DOCUMENT_MAX_BYTES:
+        await update.message.reply_text(ui.INIT_USERS_FILE_TOO_BIG)
+        return
+
+    chat_id = _get_chat_id(update, context)
+    title = _get_chat_title_for_selected_chat_id(update, context, chat_id)
+    service: ImportService = context.bot_data["import_service"]
+    status = await update.message.reply_text(ui.IMPORT_CHECKING)
+
+    fd, path = tempfile.mkstemp(prefix="import-", suffix=".zip")
+    os.close(fd)
+    try:
+        tg_file = await context.bot.get_file(document.file_id)
+        await tg_file.download_to_drive(custom_path=path)
+        # Разбор архива — в отдельном потоке: поток-воркер БД занят только подсчётом строк чата
+        plan = await asyncio.to_thread(service.inspect, path)
+        existing = await run_db(context, service.count_existing, chat_id)
+    except SnapshotError as e:
+        _remove_file(path)
+        await status.edit_text(str(e))
+        return
+    except Exception:
+        _remove_file(path)
+        raise
+
+    # Новый архив заменяет ранее загруженный, но не подтверждённый
+    _discard_staged_snapshot(context)
+    context.user_data[USER_DATA_IMPORT_SNAPSHOT] = {"path": path, "chat_id": chat_id}
+
+    keyboard = InlineKeyboardMarkup(
+        [[
+            InlineKeyboardButton("Загрузить", callback_data="import:confirm"),
+            InlineKeyboardButton("Отмена", callback_data="import:cancel"),
+        ]]
+    )
+    await status.edit_text(_format_import_plan(title, plan, existing), reply_markup=keyboard)
+
+
+async def handle_import_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    if not query:
+        return
+
+    await query.answer()
+
+    if not _is_private(update):
+        await query.edit_message_text(ui.ERR_PRIVATE_ONLY)
+        return
+
+    data = getattr(query, "data", None) or ""
+    staged = context.user_data.get(USER_DATA_IMPORT_SNAPSHOT)
+
+    if data == "import:cancel":
+        _discard_staged_snapshot(context)
+        await query.edit_message_text(ui.IMPORT_CANCELLED)
+        return
+
+    if data != "import:confirm":
+        return
+
+    if not staged or not os.path.exists(staged["path"]):
+        context.user_data.pop(USER_DATA_IMPORT_SNAPSHOT, None)
+        await query.edit_message_text(ui.IMPORT_EXPIRED)
+        return
+
+    # Архив проверялся для этого чата; права могли измениться, пока ждали подтверждения
+    chat_id = staged["chat_id"]
+    if not await _is_admin_for_chat_id(update, context, chat_id):
+        _discard_staged_snapshot(context)
+        await query.edit_message_text(ui.IMPORT_ERR_NEED_ADMIN)
+        return
+
+    title = _get_chat_title_for_selected_chat_id(update, context, chat_id)
+    service: ImportService = context.bot_data["import_service"]
+    await query.edit_message_text(ui.IMPORT_IN_PROGRESS)
+    try:
+        counts = await run_db(context, service.restore, staged["path"], chat_id)
+    except SnapshotError as e:
+        await query.edit_message_text(str(e))
+        return
+    except Exception:
+        await query.edit_message_text(ui.IMPORT_FAILED)
+        return
+    finally:
+        _discard_staged_snapshot(context)
+
+    summary = "\n".join(f"{_IMPORT_TABLE_LABELS[table]}: {count}" for table, count in counts.items())
+    await query.edit_message_text(f"Загрузка в '{title}' завершена.\n{summary}")
+
+
+def _format_import_plan(title: str, plan: SnapshotPlan, existing: Dict[str, int]) -> str:
+    lines = [f"Пробный прогон: архив ({plan.fmt}) -> '{title}'"]
+    if plan.source_chat_id is not None:
+        lines[0] += f"\nисходный чат: {plan.source_chat_id}"
+    for table, label in _IMPORT_TABLE_LABELS.items():
+        if table not in plan.incoming:
+            continue
+        action = "объединятся" if table in _IMPORT_MERGED_TABLES else "заменят"
+        lines.append(
+            f"{label}: в архиве {plan.incoming[table]}, в чате {existing.get(table, 0)} — {action}"
+        )
+    lines.append("Опросы не загружаются: они привязаны к сообщениям исходного чата.")
+    return "\n".join(lines)
+
+
+def _discard_staged_snapshot(context: ContextTypes.DEFAULT_TYPE) -> None:
+    staged = context.user_data.pop(USER_DATA_IMPORT_SNAPSHOT, None)
+    if staged:
+        _remove_file(staged["path"])
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -10,6 +10,7 @@ from handlers.common import (
     _is_admin_or_private_for_chat_id,
     _is_private,
     _set_pending,
+    run_db,
     ui,
 )
 
@@ -20,7 +21,7 @@ async def genres_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     chat_id = _get_chat_id(update, context)
     service: GenreService = context.bot_data["genre_service"]
-    text = service.list_genres(chat_id)
+    text = await run_db(context, service.list_genres, chat_id)
     if _is_private(update):
         chat_title = _get_chat_title_for_selected_chat_id(update, context, chat_id)
         text = f"{chat_title}\n\n{text}"
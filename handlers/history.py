@@ -10,7 +10,8 @@ from handlers.common import (
     _get_chat_id,
     _is_admin_or_private_for_chat_id,
     _set_pending,
-    get_db,
+    get_async_db,
+    run_db,
     ui,
 )
 
@@ -25,11 +26,12 @@ async def save_book_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     service: BookService = context.bot_data["book_service"]
-    if not service.has_books(chat_id):
+    if not await run_db(context, service.has_books, chat_id):
         await update.message.reply_text(ui.LIST_EMPTY)
         return
 
-    prompt_text = f"{service.list_books(chat_id)}\n\n{ui.SAVE_BOOK_PROMPT}"
+    books_text = await run_db(context, service.list_books, chat_id)
+    prompt_text = f"{books_text}\n\n{ui.SAVE_BOOK_PROMPT}"
     sent = await update.message.reply_text(prompt_text, reply_markup=ForceReply(selective=True))
     _set_pending(context, PendingAction.SAVE_BOOK, sent.message_id, update.effective_user.id)
 
@@ -43,13 +45,12 @@ async def save_genre_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text(ui.ERR_ADMIN_ONLY)
         return
 
-    db = get_db(context)
-    if not db.get_genres(chat_id):
+    if not await get_async_db(context).get_genres(chat_id):
         await update.message.reply_text("Список жанров пуст")
         return
 
     service: GenreService = context.bot_data["genre_service"]
-    text = service.list_genres(chat_id)
+    text = await run_db(context, service.list_genres, chat_id)
 
     prompt_text = f"{text}\n\n{ui.SAVE_GENRE_PROMPT}"
     sent = await update.message.reply_text(prompt_text, reply_markup=ForceReply(selective=True))
@@ -66,7 +67,7 @@ async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     service: HistoryService = context.bot_data["history_service"]
-    years = service.get_years(chat_id)
+    years = await run_db(context, service.get_years, chat_id)
     if not years:
         await update.message.reply_text(ui.HISTORY_EMPTY)
         return
@@ -97,9 +98,9 @@ async def handle_history_callbacks(update: Update, context: ContextTypes.DEFAULT
         return
 
     service: HistoryService = context.bot_data["history_service"]
-    text = service.get_year_text(chat_id, year)
+    text = await run_db(context, service.get_year_text, chat_id, year)
     if not text:
-        years = service.get_years(chat_id)
+        years = await run_db(context, service.get_years, chat_id)
         if not years:
             await query.edit_message_text(ui.HISTORY_EMPTY)
             return
@@ -2,7 +2,9 @@ from telegram import Update
 from telegram.ext import ContextTypes
 
 from services.groups_service import GroupsService
-from handlers.common import get_db
+from services.admin_roster import ADMIN_STATUSES
+from services.user_activity_service import buffer_user_activity, buffer_user_departure
+from handlers.common import get_admin_roster, run_db
 
 
 async def handle_my_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -24,8 +26,13 @@ async def handle_my_chat_member(update: Update, context: ContextTypes.DEFAULT_TY
     chat_title = chat.title or "Unknown"
     chat_type = "supergroup" if chat.type == "supergroup" else "group"
 
+    # Права бота в чате поменялись — список админов мог измениться тоже
+    get_admin_roster(context).invalidate(chat_id)
+
     groups: GroupsService = context.bot_data["groups_service"]
-    groups.apply_bot_membership_update(
+    await run_db(
+        context,
+        groups.apply_bot_membership_update,
         chat_id=chat_id,
         chat_title=chat_title,
         chat_type=chat_type,
@@ -33,10 +40,30 @@ async def handle_my_chat_member(update: Update, context: ContextTypes.DEFAULT_TY
     )
 
 
+async def handle_chat_member_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Изменение статуса участника (chat_member): если кто-то стал или перестал быть админом,
+    сбрасываем кэш администраторов этого чата.
+    """
+    chat_member = update.chat_member
+    if not chat_member:
+        return
+
+    old_status = chat_member.old_chat_member.status
+    new_status = chat_member.new_chat_member.status
+    if old_status == new_status:
+        return
+    if old_status in ADMIN_STATUSES or new_status in ADMIN_STATUSES:
+        get_admin_roster(context).invalidate(chat_member.chat.id)
+
+
 async def handle_user_membership_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Обновляет user_activity при входе/выходе пользователей в чате.
     Работает по сервисным сообщениям Telegram: new_chat_members / left_chat_member.
+
+    События идут через тот же буфер, что и активность по сообщениям:
+    массовый вход (например, по ссылке-приглашению) записывается одной транзакцией при flush.
     """
     if not update.message:
         return
@@ -46,8 +73,7 @@ async def handle_user_membership_update(update: Update, context: ContextTypes.DE
         return
 
     chat_id = chat.id
-
-    db = get_db(context)
+    at = update.message.date
 
     # Добавили новых участников
     if update.message.new_chat_members:
@@ -55,14 +81,9 @@ async def handle_user_membership_update(update: Update, context: ContextTypes.DE
             # ботов не учитываем
             if getattr(member, "is_bot", False):
                 continue
-            db.upsert_user_activity(
-                chat_id=chat_id,
-                user_id=member.id,
-                username=getattr(member, "username", None),
-            )
+            await buffer_user_activity(chat_id, member.id, getattr(member, "username", None), context, at=at)
 
     # Кто-то вышел/его удалили
     if update.message.left_chat_member:
         left = update.message.left_chat_member
-        db.delete_user_activity(chat_id=chat_id, user_id=left.id)
-
+        await buffer_user_departure(chat_id, left.id, context, at=at)
@@ -7,7 +7,7 @@ from telegram.ext import ContextTypes
 from services.book_service import BookService
 from services.genre_service import GenreService
 
-from handlers.common import _get_chat_id, _is_admin_or_private_for_chat_id, ui
+from handlers.common import _get_chat_id, _is_admin_or_private_for_chat_id, run_db, ui
 
 
 async def _send_books_like_vote(
@@ -37,7 +37,7 @@ async def pollbook_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = _get_chat_id(update, context)
     service: BookService = context.bot_data["book_service"]
 
-    book_titles, month_name = service.get_books_for_poll(chat_id)
+    book_titles, month_name = await run_db(context, service.get_books_for_poll, chat_id)
     if not book_titles:
         await update.message.reply_text(ui.LIST_EMPTY)
         return
@@ -86,7 +86,7 @@ async def handle_poll_callbacks(update: Update, context: ContextTypes.DEFAULT_TY
             return
 
         service: BookService = context.bot_data["book_service"]
-        book_titles, month_name = service.get_books_for_poll(chat_id)
+        book_titles, month_name = await run_db(context, service.get_books_for_poll, chat_id)
         if not book_titles:
             await query.edit_message_text(ui.LIST_EMPTY)
             return
@@ -106,7 +106,9 @@ async def handle_poll_callbacks(update: Update, context: ContextTypes.DEFAULT_TY
         )
 
         if poll_message.poll:
-            service.save_poll(
+            await run_db(
+                context,
+                service.save_poll,
                 chat_id=chat_id,
                 poll_id=poll_message.poll.id,
                 question=question,
@@ -126,7 +128,7 @@ async def handle_poll_callbacks(update: Update, context: ContextTypes.DEFAULT_TY
             return
 
         genre_service: GenreService = context.bot_data["genre_service"]
-        genre_titles, month_name = genre_service.get_genres_for_poll(chat_id)
+        genre_titles, month_name = await run_db(context, genre_service.get_genres_for_poll, chat_id)
         if not genre_titles:
             await query.edit_message_text("Нет жанров с used=0")
             return
@@ -149,7 +151,9 @@ async def handle_poll_callbacks(update: Update, context: ContextTypes.DEFAULT_TY
         if poll_message.poll:
             # если ты специально сохраняешь все опросы в book_service — оставляю как было
             book_service: BookService = context.bot_data["book_service"]
-            book_service.save_poll(
+            await run_db(
+                context,
+                book_service.save_poll,
                 chat_id=chat_id,
                 poll_id=poll_message.poll.id,
                 question=question,
@@ -170,7 +174,7 @@ async def pollgenre_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     service: GenreService = context.bot_data["genre_service"]
 
-    genre_titles, month_name = service.get_genres_for_poll(chat_id)
+    genre_titles, month_name = await run_db(context, service.get_genres_for_poll, chat_id)
     if not genre_titles:
         await update.message.reply_text("Нет жанров с used=0")
         return
@@ -17,11 +17,15 @@ from handlers.common import (
     _get_pending,
     _is_admin_or_private_for_chat_id,
     _is_pending_expired,
+    _is_private,
     _parse_index_and_optional_month_year,
     _parse_range,
     _validate_text,
+    run_db,
     ui,
 )
+from handlers.export import import_snapshot_document
+from handlers.users import import_members_document
 
 
 async def handle_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -74,7 +78,12 @@ async def handle_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
             chat_id = _get_chat_id(update, context)
             chat_title = _get_chat_title_for_selected_chat_id(update, context, chat_id)
 
-            inserted, skipped = users_service.import_users_if_missing_by_user_id(chat_id=chat_id, users=users)
+            inserted, skipped = await run_db(
+                context,
+                users_service.import_users_if_missing_by_user_id,
+                chat_id=chat_id,
+                users=users,
+            )
             await update.message.reply_text(
                 f"Импорт в '{chat_title}' завершён.\n"
                 f"Добавлено: {inserted}\n"
@@ -111,10 +120,11 @@ async def handle_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
             is_admin = await _is_admin_or_private_for_chat_id(update, context, chat_id)
 
             service: BookService = context.bot_data["book_service"]
-            success, msg = service.delete_book(chat_id, idx, user.id, is_admin)
+            success, msg = await run_db(context, service.delete_book, chat_id, idx, user.id, is_admin)
 
             if success:
-                await update.message.reply_text(f"{msg}\nНовый список:\n\n{service.list_books(chat_id)}")
+                books_text = await run_db(context, service.list_books, chat_id)
+                await update.message.reply_text(f"{msg}\nНовый список:\n\n{books_text}")
             else:
                 await update.message.reply_text(msg)
             return
@@ -127,7 +137,9 @@ async def handle_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return
 
             service: BookService = context.bot_data["book_service"]
-            ok = service.add_suggestion(
+            ok = await run_db(
+                context,
+                service.add_suggestion,
                 chat_id=chat_id,
                 user_id=user.id,
                 username=user.username,
@@ -136,7 +148,7 @@ async def handle_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
 
             if ok:
-                await update.message.reply_text(service.list_books(chat_id))
+                await update.message.reply_text(await run_db(context, service.list_books, chat_id))
             else:
                 await update.message.reply_text("Ошибка при сохранении предложения")
             return
@@ -153,9 +165,9 @@ async def handle_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return
 
             service: GenreService = context.bot_data["genre_service"]
-            ok = service.add_genre(chat_id, text, update.message.message_id)
+            ok = await run_db(context, service.add_genre, chat_id, text, update.message.message_id)
             if ok:
-                await update.message.reply_text(service.list_genres(chat_id))
+                await update.message.reply_text(await run_db(context, service.list_genres, chat_id))
             else:
                 await update.message.reply_text("Ошибка при сохранении жанра")
             return
@@ -181,9 +193,10 @@ async def handle_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return
 
             service: GenreService = context.bot_data["genre_service"]
-            ok, msg = service.delete_genre(chat_id, idx)
+            ok, msg = await run_db(context, service.delete_genre, chat_id, idx)
             if ok:
-                await update.message.reply_text(f"{msg}\nНовый список:\n\n{service.list_genres(chat_id)}")
+                genres_text = await run_db(context, service.list_genres, chat_id)
+                await update.message.reply_text(f"{msg}\nНовый список:\n\n{genres_text}")
             else:
                 await update.message.reply_text(msg)
             return
@@ -209,9 +222,10 @@ async def handle_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return
 
             service: GenreService = context.bot_data["genre_service"]
-            ok, msg = service.toggle_genre_active(chat_id, idx)
+            ok, msg = await run_db(context, service.toggle_genre_active, chat_id, idx)
             if ok:
-                await update.message.reply_text(f"{msg}\nНовый список:\n\n{service.list_genres(chat_id)}")
+                genres_text = await run_db(context, service.list_genres, chat_id)
+                await update.message.reply_text(f"{msg}\nНовый список:\n\n{genres_text}")
             else:
                 await update.message.reply_text(msg)
             return
@@ -229,7 +243,13 @@ async def handle_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return
 
             history: HistoryService = context.bot_data["history_service"]
-            _ok, msg = history.save_book_from_suggestions_index(chat_id, index=idx, month_year=month_year)
+            _ok, msg = await run_db(
+                context,
+                history.save_book_from_suggestions_index,
+                chat_id,
+                index=idx,
+                month_year=month_year,
+            )
             await update.message.reply_text(msg)
             return
 
@@ -246,7 +266,13 @@ async def handle_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return
 
             history: HistoryService = context.bot_data["history_service"]
-            _ok, msg = history.save_genre_from_index(chat_id, index=idx, month_year=month_year)
+            _ok, msg = await run_db(
+                context,
+                history.save_genre_from_index,
+                chat_id,
+                index=idx,
+                month_year=month_year,
+            )
             await update.message.reply_text(msg)
             return
 
@@ -254,3 +280,32 @@ async def handle_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # очищаем состояние даже если что-то упало внутри
         _clear_pending(context)
 
+
+async def handle_document_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Файл в ЛС в ответ на prompt: members.csv для /init_users или архив для /import.
+    Сам файл можно прислать и не ответом: тогда достаточно ожидающего действия.
+    """
+    if not update.message or not update.message.document or not _is_private(update):
+        return
+
+    pending = _get_pending(context)
+    if pending not in (PendingAction.INIT_USERS, PendingAction.IMPORT_SNAPSHOT):
+        return
+
+    if _is_pending_expired(context):
+        _clear_pending(context)
+        return
+
+    reply_to = update.message.reply_to_message
+    prompt_msg_id = context.user_data.get(USER_DATA_PROMPT_MSG_ID)
+    if reply_to and prompt_msg_id and reply_to.message_id != prompt_msg_id:
+        return
+
+    try:
+        if pending == PendingAction.IMPORT_SNAPSHOT:
+            await import_snapshot_document(update, context)
+        else:
+            await import_members_document(update, context)
+    finally:
+        _clear_pending(context)
@@ -1,18 +1,27 @@
-from typing import Optional
+import asyncio
+import csv
+import os
+import tempfile
+import time
+from typing import Optional, Tuple
 
 from telegram import ForceReply, Update
 from telegram.error import BadRequest, Forbidden
 from telegram.ext import ContextTypes
 
-from services.users_service import UsersService
+from services.chats_service import ChatsService
+from services.inactivity_report import format_inactivity_report
+from services.users_service import MEMBERS_CSV_EMPTY, UsersService
 
 from handlers.common import (
     PendingAction,
     _get_chat_id,
     _get_chat_title_for_selected_chat_id,
     _is_admin_for_chat_id,
+    _is_admin_in_chat,
     _is_private,
     _set_pending,
+    run_db,
     ui,
 )
 
@@ -29,6 +38,81 @@ async def init_users_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     _set_pending(context, PendingAction.INIT_USERS, sent.message_id, update.effective_user.id)
 
 
+# Бот может скачать файл не больше 20 МБ (ограничение Bot API)
+MEMBERS_DOCUMENT_MAX_BYTES = 20 * 1024 * 1024
+# Не чаще одного редактирования статуса в столько секунд (лимиты Telegram на правки)
+IMPORT_PROGRESS_EDIT_INTERVAL_SEC = 2.0
+
+
+async def import_members_document(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    /init_users файлом: members.csv скачивается во временный файл, читается потоково
+    и пишется в БД пачками; прогресс — правками одного сообщения.
+    """
+    document = update.message.document
+    if document.file_size and document.file_size > MEMBERS_DOCUMENT_MAX_BYTES:
+        await update.message.reply_text(ui.INIT_USERS_FILE_TOO_BIG)
+        return
+
+    users_service: UsersService = context.bot_data["users_service"]
+    chat_id = _get_chat_id(update, context)
+    chat_title = _get_chat_title_for_selected_chat_id(update, context, chat_id)
+    status = await update.message.reply_text(ui.INIT_USERS_DOWNLOADING)
+
+    fd, path = tempfile.mkstemp(prefix="members-", suffix=".csv")
+    os.close(fd)
+    try:
+        tg_file = await context.bot.get_file(document.file_id)
+        await tg_file.download_to_drive(custom_path=path)
+
+        inserted = skipped = 0
+        last_edit = time.monotonic()
+        # utf-8-sig: Excel и экспорт из Telegram-клиентов часто пишут BOM
+        with open(path, encoding="utf-8-sig", errors="replace", newline="") as f:
+            try:
+                for batch in users_service.iter_members_csv(f):
+                    batch_inserted, batch_skipped = await run_db(
+                        context,
+                        users_service.import_users_if_missing_by_user_id,
+                        chat_id=chat_id,
+                        users=batch,
+                    )
+                    inserted += batch_inserted
+                    skipped += batch_skipped
+                    if time.monotonic() - last_edit >= IMPORT_PROGRESS_EDIT_INTERVAL_SEC:
+                        last_edit = time.monotonic()
+                        await _edit_status(
+                            status,
+                            ui.INIT_USERS_PROGRESS.format(processed=inserted + skipped, inserted=inserted),
+                        )
+            except (ValueError, csv.Error) as e:
+                await _edit_status(status, f"{e}\nУже добавлено: {inserted}" if inserted else str(e))
+                return
+
+        if not inserted and not skipped:
+            await _edit_status(status, MEMBERS_CSV_EMPTY)
+            return
+        await _edit_status(
+            status,
+            f"Импорт в '{chat_title}' завершён.\n"
+            f"Добавлено: {inserted}\n"
+            f"Пропущено (уже были по user_id): {skipped}",
+        )
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+async def _edit_status(status, text: str) -> None:
+    try:
+        await status.edit_text(text)
+    except BadRequest:
+        # «message is not modified» и т.п. — прогресс не критичен
+        pass
+
+
 async def users_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message:
         return
@@ -48,6 +132,56 @@ async def users_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(f"{ui.USERS_TITLE}: {title}", reply_markup=users_service.filters_keyboard())
 
 
+# Сколько get_chat_administrators /inactivity запрашивает одновременно (лимиты Telegram)
+INACTIVITY_ADMIN_CHECK_CONCURRENCY = 5
+
+
+async def inactivity_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Сводка неактивности по группам, где вызывающий — администратор.
+    Кандидаты — только группы, в user_activity которых бот видел вызывающего:
+    иначе проверка прав шла бы по всем группам бота.
+    """
+    if not update.message:
+        return
+
+    if not _is_private(update):
+        await update.message.reply_text(ui.ERR_PRIVATE_ONLY)
+        return
+
+    user_id = update.effective_user.id
+    chats: ChatsService = context.bot_data["chats_service"]
+    users_service: UsersService = context.bot_data["users_service"]
+    member_chat_ids = set(await run_db(context, users_service.get_member_chat_ids, user_id))
+    groups = [group for group in chats.get_active_groups() if group[0] in member_chat_ids]
+
+    # Списки админов берутся из кэша AdminRoster; промахи запрашиваются не больше N разом
+    semaphore = asyncio.Semaphore(INACTIVITY_ADMIN_CHECK_CONCURRENCY)
+
+    async def is_admin_in(chat_id: int) -> bool:
+        async with semaphore:
+            return await _is_admin_in_chat(context, chat_id, user_id)
+
+    is_admin = await asyncio.gather(*(is_admin_in(group[0]) for group in groups))
+    titles = {group[0]: group[1] for group, ok in zip(groups, is_admin) if ok}
+    if not titles:
+        await update.message.reply_text(ui.INACTIVITY_NO_GROUPS)
+        return
+
+    report = await run_db(context, users_service.get_inactivity_report, list(titles))
+    if not report:
+        await update.message.reply_text(ui.INACTIVITY_EMPTY)
+        return
+
+    items = sorted(
+        ((titles[chat_id], item) for chat_id, item in report.items()),
+        key=lambda pair: pair[1].members,
+        reverse=True,
+    )
+    for text in format_inactivity_report(items):
+        await update.message.reply_text(text)
+
+
 async def reset_users_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message:
         return
@@ -111,35 +245,47 @@ async def handle_users_callbacks(update: Update, context: ContextTypes.DEFAULT_T
             await query.edit_message_text(f"{ui.USERS_TITLE}: {title}", reply_markup=users_service.filters_keyboard())
             return
 
-        deleted = users_service.clear_users_for_chat(chat_id)
+        deleted = await run_db(context, users_service.clear_users_for_chat, chat_id)
         await query.edit_message_text(ui.RESET_USERS_DONE.format(count=deleted), reply_markup=users_service.filters_keyboard())
         return
 
-    # users:filter:<all|months>
+    # users:filter:<all|months> -> первая страница
     if len(parts) == 3 and parts[1] == "filter":
-        raw = parts[2]
-        inactive_months: Optional[int]
-        if raw == "all":
-            inactive_months = None
-            subtitle = users_service.subtitle_for_inactive_months(inactive_months)
-        else:
-            try:
-                inactive_months = int(raw)
-            except ValueError:
-                return
-            subtitle = users_service.subtitle_for_inactive_months(inactive_months)
-
-        users = users_service.get_users_for_chat(chat_id, inactive_months=inactive_months)
-        if not users:
-            await query.edit_message_text(
-                f"{ui.USERS_TITLE}: {title}\n\n{subtitle}\n\nПусто.",
-                reply_markup=users_service.filters_keyboard(),
-            )
+        await _show_users_page(query, context, users_service, chat_id, title, parts[2])
+        return
+
+    # users:page:<all|months>:<n|p>:<user_id> -> следующая/предыдущая страница
+    if len(parts) == 5 and parts[1] == "page" and parts[3] in ("n", "p"):
+        try:
+            cursor_user_id = int(parts[4])
+        except ValueError:
             return
+        await _show_users_page(
+            query,
+            context,
+            users_service,
+            chat_id,
+            title,
+            parts[2],
+            cursor_user_id=cursor_user_id,
+            backward=parts[3] == "p",
+        )
+        return
 
+    # users:top:<days> -> самые активные за окно дней
+    if len(parts) == 3 and parts[1] == "top":
+        try:
+            days = int(parts[2])
+        except ValueError:
+            return
+        if days < 1:
+            return
+
+        rows = await run_db(context, users_service.get_top_active_users, chat_id, days=days)
+        body = users_service.format_top_active(rows) if rows else ui.USERS_TOP_EMPTY
         await query.edit_message_text(
-            f"{ui.USERS_TITLE}: {title}\n\n{subtitle}\n\nВыберите пользователя:",
-            reply_markup=users_service.list_keyboard(users),
+            f"{ui.USERS_TITLE}: {title}\n\n{ui.USERS_TOP_TITLE.format(days=days)}\n\n{body}",
+            reply_markup=users_service.back_keyboard(),
         )
         return
 
@@ -150,7 +296,7 @@ async def handle_users_callbacks(update: Update, context: ContextTypes.DEFAULT_T
         except ValueError:
             return
 
-        username = users_service.find_username_for_chat(chat_id, user_id)
+        username = await run_db(context, users_service.find_username_for_chat, chat_id, user_id)
         label = users_service.label_for_user(user_id, username)
         await query.edit_message_text(
             f"Удалить {label} из чата '{title}'?",
@@ -181,8 +327,55 @@ async def handle_users_callbacks(update: Update, context: ContextTypes.DEFAULT_T
             await query.edit_message_text(f"Не удалось удалить пользователя: {e.message}", reply_markup=users_service.filters_keyboard())
             return
 
-        users_service.delete_user_for_chat(chat_id, user_id)
+        await run_db(context, users_service.delete_user_for_chat, chat_id, user_id)
 
         await query.edit_message_text("Пользователь удалён.", reply_markup=users_service.filters_keyboard())
         return
 
+
+
+def _parse_inactive_filter(raw: str) -> Tuple[bool, Optional[int]]:
+    """'all' -> (True, None), '<months>' -> (True, months), иначе (False, None)."""
+    if raw == "all":
+        return True, None
+    try:
+        return True, int(raw)
+    except ValueError:
+        return False, None
+
+
+async def _show_users_page(
+    query,
+    context: ContextTypes.DEFAULT_TYPE,
+    users_service: UsersService,
+    chat_id: int,
+    title: str,
+    raw_filter: str,
+    *,
+    cursor_user_id: Optional[int] = None,
+    backward: bool = False,
+) -> None:
+    ok, inactive_months = _parse_inactive_filter(raw_filter)
+    if not ok:
+        return
+    subtitle = users_service.subtitle_for_inactive_months(inactive_months)
+
+    page = await run_db(
+        context,
+        users_service.get_users_page,
+        chat_id,
+        inactive_months=inactive_months,
+        cursor_user_id=cursor_user_id,
+        backward=backward,
+    )
+    if not page.users:
+        await query.edit_message_text(
+            f"{ui.USERS_TITLE}: {title}\n\n{subtitle}\n\nПусто.",
+            reply_markup=users_service.filters_keyboard(),
+        )
+        return
+
+    await query.edit_message_text(
+        f"{ui.USERS_TITLE}: {title}\n\n{subtitle}\n\nВыберите пользователя:",
+        reply_markup=users_service.page_keyboard(page, raw_filter),
+    )
@@ -22,7 +22,16 @@ from telegram.ext import (
     filters,
 )
 
-from config import BOT_TOKEN, DB_PATH
+from config import (
+    ACTIVITY_BUFFER_MAX,
+    ACTIVITY_DEDUPE_WINDOW_SECONDS,
+    ACTIVITY_FLUSH_INTERVAL_SECONDS,
+    ACTIVITY_JOURNAL_PATH,
+    BOT_TOKEN,
+    DB_PATH,
+)
+from storage.activity_journal import ActivityJournal
+from storage.async_database import AsyncDatabase
 from storage.database import Database
 from services.book_service import BookService
 from services.genre_service import GenreService
@@ -30,6 +39,17 @@ from services.history_service import HistoryService
 from services.chats_service import ChatsService
 from services.users_service import UsersService
 from services.groups_service import GroupsService
+from services.group_directory import GroupDirectory
+from services.admin_roster import AdminRoster
+from services.scheduler import Scheduler
+from services.export_service import ExportService
+from services.import_service import ImportService
+from services.user_activity_service import (
+    ActivityBuffer,
+    RecentActivityFilter,
+    replay_user_activity_journal,
+    close_user_activity_buffer,
+)
 
 from handlers.commands import (
     suggest_command,
@@ -48,15 +68,21 @@ from handlers.commands import (
     history_command,
     handle_history_callbacks,
     handle_reply,
+    handle_document_reply,
     handle_books_callbacks,
     pollbook_command,
     pollgenre_command,
     handle_poll_callbacks,
     handle_my_chat_member,
+    handle_chat_member_update,
     chats_command,
     handle_chats_callbacks,
     init_users_command,
     users_command,
+    inactivity_command,
+    export_command,
+    import_command,
+    handle_import_callbacks,
     reset_users_command,
     handle_users_callbacks,
     handle_user_membership_update,
@@ -64,21 +90,47 @@ from handlers.commands import (
     handle_any_callback_activity,
     handle_any_reaction_activity,
     flush_user_activity_buffer,
-    start_user_activity_flush_loop,
+    schedule_user_activity_flush,
 )
 
 async def post_init(app: Application):
     db = Database(DB_PATH)
     app.bot_data["database"] = db
+    # Все обращения хендлеров к SQLite идут через поток-воркер, чтобы не блокировать event loop
+    adb = AsyncDatabase(db)
+    app.bot_data["async_database"] = adb
+    # Справочник групп в памяти: названия, активные группы и клавиатуры /chats без похода в SQLite
+    directory = GroupDirectory()
+    directory.load(await adb.get_all_groups())
+    app.bot_data["group_directory"] = directory
     app.bot_data["book_service"] = BookService(db)
     app.bot_data["genre_service"] = GenreService(db)
     app.bot_data["history_service"] = HistoryService(db)
-    app.bot_data["chats_service"] = ChatsService(db)
+    app.bot_data["chats_service"] = ChatsService(db, directory)
     app.bot_data["users_service"] = UsersService(db)
-    app.bot_data["groups_service"] = GroupsService(db)
+    app.bot_data["groups_service"] = GroupsService(db, directory)
+    app.bot_data["export_service"] = ExportService(db)
+    app.bot_data["import_service"] = ImportService(db)
+    # Кэш администраторов: один get_chat_administrators на чат вместо get_chat_member на каждую проверку
+    app.bot_data["admin_roster"] = AdminRoster(ttl_seconds=600)
 
-    # Flush активности пользователей раз в минуту (батч в SQLite) без JobQueue
-    start_user_activity_flush_loop(app, interval_seconds=60)
+    # Буфер активности: при заполнении пишется в БД, не дожидаясь планового flush
+    app.bot_data["activity_buffer"] = ActivityBuffer(
+        max_pending=ACTIVITY_BUFFER_MAX,
+        journal=ActivityJournal(ACTIVITY_JOURNAL_PATH),
+        recent=(
+            RecentActivityFilter(window_seconds=ACTIVITY_DEDUPE_WINDOW_SECONDS)
+            if ACTIVITY_DEDUPE_WINDOW_SECONDS > 0
+            else None
+        ),
+    )
+    # Активность, не дошедшая до БД до прошлой остановки/падения
+    await replay_user_activity_journal(app)
+    # Фоновые периодические задачи: flush активности пользователей (батч в SQLite)
+    scheduler = Scheduler()
+    app.bot_data["scheduler"] = scheduler
+    schedule_user_activity_flush(scheduler, app, interval_seconds=ACTIVITY_FLUSH_INTERVAL_SECONDS)
+    scheduler.start()
 
     bot_suggest_command = BotCommand("suggest", "Предложить книгу")
     bot_list_command = BotCommand("list", "Показать список предложений")
@@ -91,6 +143,9 @@ async def post_init(app: Application):
     bot_chats_command = BotCommand("chats", "Показать список чатов")
     bot_init_users_command = BotCommand("init_users", "Импортировать пользователей из CSV")
     bot_users_command = BotCommand("users", "Пользователи (удаление по неактивности)")
+    bot_inactivity_command = BotCommand("inactivity", "Сводка неактивности по вашим группам")
+    bot_export_command = BotCommand("export", "Выгрузить данные выбранного чата (csv/jsonl)")
+    bot_import_command = BotCommand("import", "Загрузить архив /export в выбранный чат")
     bot_reset_users_command = BotCommand("reset_users", "Сбросить список пользователей для выбранного чата")
     bot_clear_command = BotCommand("clear", "Очистить список предложений")
     bot_addgenre_command = BotCommand("addgenre", "Добавить жанр")
@@ -151,13 +206,38 @@ async def post_init(app: Application):
         bot_chats_command,
         bot_init_users_command,
         bot_users_command,
+        bot_inactivity_command,
         bot_reset_users_command,
+        bot_export_command,
+        bot_import_command,
     ]
     await app.bot.set_my_commands(private_commands, scope=BotCommandScopeAllPrivateChats())
 
 
+async def post_shutdown(app: Application):
+    try:
+        scheduler: Scheduler = app.bot_data.get("scheduler")
+        if scheduler:
+            await scheduler.stop()
+        # Дописываем буфер активности в БД, пока поток-воркер ещё работает
+        await close_user_activity_buffer(app)
+    finally:
+        adb: AsyncDatabase = app.bot_data.get("async_database")
+        if adb:
+            await adb.close()
+        db: Database = app.bot_data.get("database")
+        if db:
+            db.close()
+
+
 def main():
-    application = Application.builder().token(BOT_TOKEN).post_init(post_init).build()
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Команды
     application.add_handler(CommandHandler("suggest", suggest_command))
@@ -179,6 +259,9 @@ def main():
     application.add_handler(CommandHandler("chats", chats_command))
     application.add_handler(CommandHandler("init_users", init_users_command))
     application.add_handler(CommandHandler("users", users_command))
+    application.add_handler(CommandHandler("inactivity", inactivity_command))
+    application.add_handler(CommandHandler("export", export_command))
+    application.add_handler(CommandHandler("import", import_command))
     application.add_handler(CommandHandler("reset_users", reset_users_command))
 
     # Callback-и кнопок (InlineKeyboard)
@@ -187,9 +270,12 @@ def main():
     application.add_handler(CallbackQueryHandler(handle_chats_callbacks, pattern=r"^chats:"))
     application.add_handler(CallbackQueryHandler(handle_users_callbacks, pattern=r"^users:"))
     application.add_handler(CallbackQueryHandler(handle_history_callbacks, pattern=r"^history:"))
+    application.add_handler(CallbackQueryHandler(handle_import_callbacks, pattern=r"^import:"))
 
     # Reply (ForceReply). Должен быть после команд, чтобы не перехватывать команды.
     application.add_handler(MessageHandler(filters.TEXT & filters.REPLY, handle_reply))
+    # Файлы в ЛС для ожидающих действий (CSV для /init_users)
+    application.add_handler(MessageHandler(filters.Document.ALL & filters.ChatType.PRIVATE, handle_document_reply))
 
     # Обновление user_activity при входе/выходе участников
     application.add_handler(
@@ -206,6 +292,8 @@ def main():
 
     # Обработчик событий группы (добавление/удаление бота, изменение прав)
     application.add_handler(ChatMemberHandler(handle_my_chat_member, ChatMemberHandler.MY_CHAT_MEMBER))
+    # Изменение прав участников (сброс кэша администраторов)
+    application.add_handler(ChatMemberHandler(handle_chat_member_update, ChatMemberHandler.CHAT_MEMBER))
 
     application.run_polling(allowed_updates=Update.ALL_TYPES)
 
@@ -0,0 +1,74 @@
+import asyncio
+import time
+from typing import Dict, FrozenSet, Tuple
+
+
+ADMIN_STATUSES = ("administrator", "creator")
+
+
+class AdminRoster:
+    """
+    Кэш списка администраторов по чатам.
+
+    Список берётся одним вызовом get_chat_administrators и живёт ttl_seconds.
+    Параллельные проверки одного чата ждут один и тот же запрос к Telegram.
+    При изменении прав участника (chat_member) запись чата сбрасывается.
+    """
+
+    def __init__(self, *, ttl_seconds: float = 600):
+        self.ttl_seconds = ttl_seconds
+        # chat_id -> (истекает_в_monotonic, id администраторов)
+        self._entries: Dict[int, Tuple[float, FrozenSet[int]]] = {}
+        self._inflight: Dict[int, "asyncio.Future[FrozenSet[int]]"] = {}
+        # Поколение записи чата: если сброс пришёл во время запроса, его результат не сохраняем
+        self._generations: Dict[int, int] = {}
+        self.lookups = 0
+        self.api_calls = 0
+        self.api_errors = 0
+
+    async def is_admin(self, bot, chat_id: int, user_id: int) -> bool:
+        admins = await self.get_admins(bot, chat_id)
+        return user_id in admins
+
+    async def get_admins(self, bot, chat_id: int) -> FrozenSet[int]:
+        self.lookups += 1
+        entry = self._entries.get(chat_id)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+
+        inflight = self._inflight.get(chat_id)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._fetch(bot, chat_id))
+            self._inflight[chat_id] = inflight
+        # shield: отмена одного ожидающего не должна отменять общий запрос
+        return await asyncio.shield(inflight)
+
+    def invalidate(self, chat_id: int) -> None:
+        self._entries.pop(chat_id, None)
+        self._generations[chat_id] = self._generations.get(chat_id, 0) + 1
+
+    def stats(self) -> Dict[str, int]:
+        # Без кэша каждая проверка стоила бы один вызов get_chat_member
+        return {
+            "lookups": self.lookups,
+            "api_calls": self.api_calls,
+            "api_errors": self.api_errors,
+            "api_calls_saved": max(self.lookups - self.api_calls, 0),
+            "cached_chats": len(self._entries),
+        }
+
+    async def _fetch(self, bot, chat_id: int) -> FrozenSet[int]:
+        generation = self._generations.get(chat_id, 0)
+        self.api_calls += 1
+        try:
+            members = await bot.get_chat_administrators(chat_id)
+        except Exception:
+            self.api_errors += 1
+            raise
+        finally:
+            self._inflight.pop(chat_id, None)
+
+        admins = frozenset(m.user.id for m in members if m.status in ADMIN_STATUSES)
+        if self._generations.get(chat_id, 0) == generation:
+            self._entries[chat_id] = (time.monotonic() + self.ttl_seconds, admins)
+        return admins
@@ -1,11 +1,14 @@
 from typing import List, Optional, Tuple
+from storage.cache import LRUCache
 from storage.database import Database
 from utils import get_poll_month_name
 
 
 class BookService:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, *, render_cache_entries: int = 1024, render_cache_chars: int = 2_000_000):
         self.db = db
+        # Готовые тексты списка: ключ (chat_id, версия_списка, вид). Ограничены по числу и суммарной длине.
+        self._rendered = LRUCache(render_cache_entries, max_weight=render_cache_chars, weigher=len)
 
     def add_suggestion(self, chat_id: int, user_id: int, username: Optional[str], 
                       text: str, source_message_id: int) -> bool:
@@ -13,6 +16,13 @@ class BookService:
         return self.db.add_suggestion(chat_id, user_id, username, text, source_message_id)
 
     def list_books(self, chat_id: int) -> str:
+        # Версию берём до чтения данных: если список изменится между ними,
+        # текст попадёт под уже устаревший ключ и никому не достанется.
+        key = (chat_id, self.db.suggestions_version(chat_id), "list")
+        cached = self._rendered.get(key)
+        if cached is not None:
+            return cached
+
         suggestions = self.db.get_suggestions(chat_id)
         if not suggestions:
             return "Список предложений пуст"
@@ -22,7 +32,12 @@ class BookService:
             user_str = f"@{username}" if username else f"ID:{user_id}"
             lines.append(f"{idx}. {text} (от {user_str})")
         
-        return "\n".join(lines)
+        rendered = "\n".join(lines)
+        self._rendered.put(key, rendered)
+        return rendered
+
+    def render_cache_stats(self) -> dict:
+        return self._rendered.stats()
 
     def has_books(self, chat_id: int) -> bool:
         """Проверяет, есть ли книги в списке для данного чата"""
@@ -38,7 +53,12 @@ class BookService:
         Возвращает (успех, сообщение).
         Удалять может только автор книги или администратор.
         """
-        suggestion = self.db.get_suggestion_by_index(chat_id, index)
+        # Поиск по номеру, проверка автора и удаление — одной транзакцией
+        suggestion, deleted = self.db.delete_suggestion_by_index(
+            chat_id,
+            index,
+            author_user_id=None if is_admin else user_id,
+        )
         if not suggestion:
             return False, f"Книга с номером {index} не найдена"
         
@@ -49,9 +69,7 @@ class BookService:
             author_str = f"@{username}" if username else f"ID:{author_user_id}"
             return False, f"Вы можете удалять только свои книги. Эта книга предложена пользователем {author_str}"
         
-        # Удаляем книгу
-        success = self.db.delete_suggestion(chat_id, suggestion_id)
-        if not success:
+        if not deleted:
             return False, "Ошибка при удалении книги"
         
         return True, "Удалил книгу"
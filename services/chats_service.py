@@ -1,27 +1,29 @@
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
+from services.group_directory import GroupDirectory, GroupRow
 from storage.database import Database
 
 
-GroupRow = Tuple[int, str, str, int, str, str]
-
-
 class ChatsService:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, directory: GroupDirectory):
         self.db = db
+        self.directory = directory
+        # Готовые клавиатуры /chats: ключ — выбранная группа (None = ЛС).
+        # Сбрасываются целиком при изменении справочника групп.
+        self._keyboards: Dict[Optional[int], InlineKeyboardMarkup] = {}
+        self._keyboards_version = -1
 
     def get_active_groups(self) -> List[GroupRow]:
         # (chat_id, title, type, is_active, added_at, updated_at)
-        return self.db.get_all_groups(active_only=True)
+        return self.directory.active_groups()
 
     def normalize_selected_chat_id(
         self,
         *,
         private_chat_id: int,
         selected_chat_id: Optional[int],
-        active_groups: List[GroupRow],
     ) -> int:
         """
         Если selected_chat_id не задан — по умолчанию ЛС.
@@ -30,12 +32,30 @@ class ChatsService:
         if selected_chat_id is None:
             return private_chat_id
 
-        active_group_ids = {chat_id for chat_id, *_ in active_groups} if active_groups else set()
-        if selected_chat_id != private_chat_id and selected_chat_id not in active_group_ids:
+        if selected_chat_id != private_chat_id and not self.directory.is_active(selected_chat_id):
             return private_chat_id
 
         return selected_chat_id
 
+    def keyboard_for(self, *, private_chat_id: int, selected_chat_id: int) -> InlineKeyboardMarkup:
+        """Клавиатура /chats для выбранного чата (из кэша, пока не менялся справочник групп)."""
+        version = self.directory.version
+        if version != self._keyboards_version:
+            self._keyboards = {}
+            self._keyboards_version = version
+
+        # Кнопка ЛС не зависит от id ЛС (callback "chats:select:private"), поэтому все ЛС делят одну клавиатуру
+        key = None if selected_chat_id == private_chat_id else selected_chat_id
+        keyboard = self._keyboards.get(key)
+        if keyboard is None:
+            keyboard = self.build_keyboard(
+                private_chat_id=private_chat_id,
+                selected_chat_id=selected_chat_id,
+                active_groups=self.directory.active_groups(),
+            )
+            self._keyboards[key] = keyboard
+        return keyboard
+
     def build_keyboard(
         self,
         *,
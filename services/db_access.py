@@ -0,0 +1,27 @@
+from storage.async_database import AsyncDatabase
+from storage.database import Database
+
+
+def get_db_from_bot_data(bot_data) -> Database:
+    """
+    Возвращает Database из bot_data, создавая при отсутствии.
+
+    Важно: импортируем DB_PATH лениво, чтобы импорт этого модуля не падал,
+    если BOT_TOKEN не задан (config.py читает его при импорте).
+    """
+    db: Database = bot_data.get("database")
+    if not db:
+        from config import DB_PATH
+
+        db = Database(DB_PATH)
+        bot_data["database"] = db
+    return db
+
+
+def get_async_db_from_bot_data(bot_data) -> AsyncDatabase:
+    """Возвращает AsyncDatabase (поток-воркер БД) из bot_data, создавая при отсутствии."""
+    adb: AsyncDatabase = bot_data.get("async_database")
+    if not adb:
+        adb = AsyncDatabase(get_db_from_bot_data(bot_data))
+        bot_data["async_database"] = adb
+    return adb
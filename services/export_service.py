@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+import time
+import zipfile
+from typing import Dict
+
+from storage.database import CHAT_EXPORT_TABLES, Database
+from storage.migrations import SCHEMA_VERSION
+
+
+EXPORT_FORMATS = ("csv", "jsonl")
+EXPORT_BATCH_SIZE = 1000
+EXPORT_MANIFEST = "manifest.json"
+
+
+class ExportService:
+    """
+    Выгрузка данных одного чата в zip: по файлу на таблицу (CSV или JSONL) + manifest.json.
+
+    Строки читаются курсором пачками из отдельного read-only соединения (один снимок базы)
+    и сразу пишутся в архив, поэтому память не зависит от размера чата.
+    export_chat синхронный и долгий — вызывать в отдельном потоке (asyncio.to_thread).
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def export_chat(
+        self,
+        chat_id: int,
+        *,
+        fmt: str,
+        out_path: str,
+        batch_size: int = EXPORT_BATCH_SIZE,
+    ) -> Dict[str, int]:
+        """Пишет архив в out_path. Возвращает количество строк по таблицам."""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"unknown export format: {fmt}")
+
+        counts: Dict[str, int] = {}
+        with self.db.snapshot_connection() as conn, zipfile.ZipFile(out_path, "w", zipfile.ZIP_DEFLATED) as zf:
+            for table, (columns, _order_by) in CHAT_EXPORT_TABLES.items():
+                count = 0
+                with zf.open(f"{table}.{fmt}", "w", force_zip64=True) as raw:
+                    out = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+                    if fmt == "csv":
+                        writer = csv.writer(out)
+                        writer.writerow(columns)
+                    for batch in self.db.iter_chat_table(conn, table, chat_id, batch_size=batch_size):
+                        if fmt == "csv":
+                            writer.writerows(batch)
+                        else:
+                            out.writelines(
+                                json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in batch
+                            )
+                        count += len(batch)
+                    out.flush()
+                    out.detach()
+                counts[table] = count
+
+            zf.writestr(
+                EXPORT_MANIFEST,
+                json.dumps(
+                    {
+                        "chat_id": chat_id,
+                        "format": fmt,
+                        "schema_version": SCHEMA_VERSION,
+                        "exported_at": int(time.time()),
+                        "tables": {table: {"columns": list(columns), "rows": counts[table]}
+                                   for table, (columns, _o) in CHAT_EXPORT_TABLES.items()},
+                    },
+                    ensure_ascii=False,
+                    indent=2,
+                ),
+            )
+        return counts
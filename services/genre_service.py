@@ -1,11 +1,14 @@
 from typing import List, Optional, Tuple
+from storage.cache import LRUCache
 from storage.database import Database
 from utils import get_poll_month_name
 
 
 class GenreService:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, *, render_cache_entries: int = 1024, render_cache_chars: int = 1_000_000):
         self.db = db
+        # Готовые тексты списка: ключ (chat_id, версия_списка, вид). Ограничены по числу и суммарной длине.
+        self._rendered = LRUCache(render_cache_entries, max_weight=render_cache_chars, weigher=len)
 
     def add_genre(self, chat_id: int, title: str, source_message_id: int) -> bool:
         """Добавляет жанр. Возвращает успех операции"""
@@ -13,6 +16,12 @@ class GenreService:
 
     def list_genres(self, chat_id: int) -> str:
         """Возвращает список жанров в виде строки"""
+        # Версию берём до чтения данных (см. BookService.list_books)
+        key = (chat_id, self.db.genres_version(chat_id), "list")
+        cached = self._rendered.get(key)
+        if cached is not None:
+            return cached
+
         genres = self.db.get_genres(chat_id)
         if not genres:
             return "Список жанров пуст"
@@ -23,24 +32,23 @@ class GenreService:
             indicator = "🟢" if used == 0 else "⚪"
             lines.append(f"{idx}. {title} {indicator}")
         
-        return "\n".join(lines)
+        rendered = "\n".join(lines)
+        self._rendered.put(key, rendered)
+        return rendered
+
+    def render_cache_stats(self) -> dict:
+        return self._rendered.stats()
 
     def delete_genre(self, chat_id: int, index: int) -> Tuple[bool, str]:
         """
         Удаляет жанр по номеру в списке.
         Возвращает (успех, сообщение).
         """
-        genre = self.db.get_genre_by_index(chat_id, index)
+        # Поиск по номеру и удаление — одной транзакцией
+        genre = self.db.delete_genre_by_index(chat_id, index)
         if not genre:
             return False, f"Жанр с номером {index} не найден"
         
-        genre_id, title, created_at, source_message_id, position, used = genre
-        
-        # Удаляем жанр
-        success = self.db.delete_genre(chat_id, genre_id)
-        if not success:
-            return False, "Ошибка при удалении жанра"
-        
         return True, "Удалил жанр"
 
     def get_genres_for_poll(self, chat_id: int) -> Tuple[List[str], str]:
@@ -62,16 +70,13 @@ class GenreService:
         Переключает флаг активности жанра по номеру в списке.
         Возвращает (успех, сообщение).
         """
-        genre = self.db.get_genre_by_index(chat_id, index)
+        # Поиск по номеру и переключение — одной транзакцией
+        genre, new_active = self.db.toggle_genre_active_by_index(chat_id, index)
         if not genre:
             return False, f"Жанр с номером {index} не найден"
         
         genre_id, title, created_at, source_message_id, position, used = genre
         
-        success, new_active = self.db.toggle_genre_active(chat_id, genre_id)
-        if not success:
-            return False, "Ошибка при изменении активности жанра"
-        
         status = "активным" if new_active else "неактивным"
         return True, f"Жанр '{title}' теперь {status}"
 
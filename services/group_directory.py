@@ -0,0 +1,73 @@
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+
+GroupRow = Tuple[int, str, str, int, str, str]  # (chat_id, title, type, is_active, added_at, updated_at)
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    version: int = 0
+    groups: Dict[int, GroupRow] = field(default_factory=dict)
+    active: Tuple[GroupRow, ...] = ()
+    active_ids: FrozenSet[int] = frozenset()
+
+
+class GroupDirectory:
+    """
+    Справочник групп в памяти (зеркало таблицы groups).
+
+    Загружается один раз в post_init, дальше обновляется через
+    GroupsService.apply_bot_membership_update. Отвечает на запросы
+    названия, списка активных групп и проверки «бот состоит в группе» за O(1).
+
+    Данные хранятся неизменяемым снимком, который целиком подменяется при обновлении:
+    читатели в event loop и писатель в потоке БД не видят промежуточного состояния.
+    """
+
+    def __init__(self):
+        self._snapshot = _Snapshot()
+
+    @property
+    def version(self) -> int:
+        """Меняется при каждом изменении справочника."""
+        return self._snapshot.version
+
+    def load(self, rows: Iterable[GroupRow]) -> None:
+        self._publish({row[0]: tuple(row) for row in rows})
+
+    def upsert(self, row: Optional[GroupRow]) -> None:
+        if not row:
+            return
+        groups = dict(self._snapshot.groups)
+        groups[row[0]] = tuple(row)
+        self._publish(groups)
+
+    def get(self, chat_id: int) -> Optional[GroupRow]:
+        return self._snapshot.groups.get(chat_id)
+
+    def title(self, chat_id: int) -> Optional[str]:
+        group = self._snapshot.groups.get(chat_id)
+        return group[1] if group else None
+
+    def is_active(self, chat_id: int) -> bool:
+        return chat_id in self._snapshot.active_ids
+
+    def active_groups(self) -> List[GroupRow]:
+        """Активные группы в том же порядке, что и get_all_groups(active_only=True)."""
+        return list(self._snapshot.active)
+
+    def _publish(self, groups: Dict[int, GroupRow]) -> None:
+        active = tuple(
+            sorted(
+                (row for row in groups.values() if row[3] == 1),
+                key=lambda row: row[4] or "",
+                reverse=True,
+            )
+        )
+        self._snapshot = _Snapshot(
+            version=self._snapshot.version + 1,
+            groups=groups,
+            active=active,
+            active_ids=frozenset(row[0] for row in active),
+        )
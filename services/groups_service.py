@@ -1,9 +1,11 @@
+from services.group_directory import GroupDirectory
 from storage.database import Database
 
 
 class GroupsService:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, directory: GroupDirectory):
         self.db = db
+        self.directory = directory
 
     def apply_bot_membership_update(
         self,
@@ -14,16 +16,18 @@ class GroupsService:
         new_status: str,
     ) -> None:
         """
-        Синхронизирует таблицу groups по статусу бота в чате.
+        Синхронизирует таблицу groups (и справочник групп в памяти) по статусу бота в чате.
 
         chat_type ожидается: "group" | "supergroup"
         new_status ожидается как Telegram ChatMember.status
         """
         if new_status in ("member", "administrator"):
             self.db.add_or_update_group(chat_id, chat_title, chat_type, is_active=1)
+            self.directory.upsert(self.db.get_group(chat_id))
             return
 
         if new_status in ("left", "kicked"):
             self.db.remove_group(chat_id)
+            self.directory.upsert(self.db.get_group(chat_id))
             return
 
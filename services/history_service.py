@@ -57,12 +57,10 @@ class HistoryService:
         index: int,
         month_year: str,
     ) -> Tuple[bool, str]:
-        book = self.db.get_suggestion_by_index(chat_id, index)
-        if not book:
+        book_text = self.db.upsert_history_book_from_suggestion_index(chat_id, index, month_year)
+        if book_text is None:
             return False, f"Книга с номером {index} не найдена"
 
-        _suggestion_id, _user_id, _username, book_text, _source_message_id, _created_at = book
-        self.db.upsert_history_book(chat_id=chat_id, month_year=month_year, book=book_text)
         return True, f"Сохранил книгу в историю за {month_year}: {book_text}"
 
     def save_genre_from_index(
@@ -72,11 +70,9 @@ class HistoryService:
         index: int,
         month_year: str,
     ) -> Tuple[bool, str]:
-        genre = self.db.get_genre_by_index(chat_id, index)
-        if not genre:
+        genre_title = self.db.upsert_history_genre_from_genre_index(chat_id, index, month_year)
+        if genre_title is None:
             return False, f"Жанр с номером {index} не найден"
 
-        _genre_id, genre_title, _created_at, _source_message_id, _position, _used = genre
-        self.db.upsert_history_genre(chat_id=chat_id, month_year=month_year, genre=genre_title)
         return True, f"Сохранил жанр в историю за {month_year}: {genre_title}"
 
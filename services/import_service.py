@@ -0,0 +1,135 @@
+import csv
+import io
+import json
+import zipfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional, Tuple
+
+from services.export_service import EXPORT_FORMATS, EXPORT_MANIFEST
+from storage.database import CHAT_EXPORT_TABLES, Database
+
+
+# Что восстанавливается из снимка (polls — нет: опросы привязаны к сообщениям старого чата)
+RESTORE_TABLES = ("suggestions", "genres", "history", "user_activity")
+RESTORE_BATCH_SIZE = 1000
+
+# NOT NULL колонки без значения по умолчанию: пустое значение уронило бы restore на середине,
+# поэтому пробный прогон проверяет их заранее
+RESTORE_REQUIRED_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "suggestions": ("user_id", "text", "source_message_id"),
+    "genres": ("title", "source_message_id"),
+    "history": ("month_year",),
+    "user_activity": ("user_id",),
+}
+
+
+@dataclass(frozen=True)
+class SnapshotPlan:
+    """Итог пробного прогона по архиву: исходный чат, формат и строк в снимке по таблицам."""
+    source_chat_id: Optional[int]
+    fmt: str
+    incoming: Dict[str, int]
+
+
+class SnapshotError(ValueError):
+    """Файл не является архивом /export или повреждён (текст — для пользователя)."""
+
+
+class ImportService:
+    """
+    Загрузка архива /export в выбранный чат.
+
+    inspect — пробный прогон: проверяет архив (в том числе обязательные поля каждой строки)
+    и считает строки. БД не трогает, поэтому
+    вызывается в отдельном потоке (asyncio.to_thread), а не в потоке-воркере БД;
+    строки в чате сейчас считает count_existing (через run_db).
+    restore — потоково читает файлы архива и отдаёт строки Database.restore_chat_snapshot,
+    который пишет их пачками executemany в одной транзакции; вызывать через run_db.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def inspect(self, path: str) -> SnapshotPlan:
+        with _open_snapshot(path) as (zf, manifest):
+            fmt = manifest["format"]
+            incoming = {
+                table: _count_valid_rows(zf, table, fmt)
+                for table in RESTORE_TABLES
+                if f"{table}.{fmt}" in zf.namelist()
+            }
+        return SnapshotPlan(source_chat_id=manifest.get("chat_id"), fmt=fmt, incoming=incoming)
+
+    def count_existing(self, chat_id: int) -> Dict[str, int]:
+        return self.db.count_chat_rows(chat_id)
+
+    def restore(self, path: str, chat_id: int) -> Dict[str, int]:
+        with _open_snapshot(path) as (zf, manifest):
+            fmt = manifest["format"]
+            tables = {
+                table: _iter_rows(zf, table, fmt)
+                for table in RESTORE_TABLES
+                if f"{table}.{fmt}" in zf.namelist()
+            }
+            return self.db.restore_chat_snapshot(chat_id, tables, batch_size=RESTORE_BATCH_SIZE)
+
+
+@contextmanager
+def _open_snapshot(path: str) -> Iterator[Tuple[zipfile.ZipFile, dict]]:
+    """Открывает архив и читает manifest.json; не архив /export — SnapshotError."""
+    try:
+        zf = zipfile.ZipFile(path)
+    except (zipfile.BadZipFile, OSError):
+        raise SnapshotError("Это не архив выгрузки /export.")
+    with zf:
+        try:
+            manifest = json.loads(zf.read(EXPORT_MANIFEST).decode("utf-8"))
+        except (KeyError, ValueError):
+            raise SnapshotError("Это не архив выгрузки /export.")
+        if not isinstance(manifest, dict) or manifest.get("format") not in EXPORT_FORMATS:
+            raise SnapshotError("Неизвестный формат архива выгрузки.")
+        yield zf, manifest
+
+
+def _count_valid_rows(zf: zipfile.ZipFile, table: str, fmt: str) -> int:
+    """Число строк таблицы; строка с пустым обязательным полем — SnapshotError с именем таблицы."""
+    columns, _order_by = CHAT_EXPORT_TABLES[table]
+    required = [(columns.index(column), column) for column in RESTORE_REQUIRED_COLUMNS.get(table, ())]
+    count = 0
+    for count, row in enumerate(_iter_rows(zf, table, fmt), start=1):
+        for pos, column in required:
+            if row[pos] is None:
+                raise SnapshotError(f"В {table}.{fmt} (строка {count}) пустое обязательное поле {column}.")
+    return count
+
+
+def _iter_rows(zf: zipfile.ZipFile, table: str, fmt: str) -> Iterator[Tuple]:
+    """
+    Строки файла таблицы в порядке колонок CHAT_EXPORT_TABLES (читается потоково).
+    Колонки сопоставляются по имени: отсутствующие в файле становятся NULL.
+    """
+    columns, _order_by = CHAT_EXPORT_TABLES[table]
+    with zf.open(f"{table}.{fmt}") as raw:
+        text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+        if fmt == "csv":
+            reader = csv.reader(text)
+            header = next(reader, [])
+            positions = [header.index(column) if column in header else None for column in columns]
+            for row in reader:
+                # csv не различает NULL и пустую строку: пустые значения считаем NULL
+                yield tuple(
+                    (row[pos] or None) if pos is not None and pos < len(row) else None
+                    for pos in positions
+                )
+        else:
+            for line in text:
+                if not line.strip():
+                    continue
+                try:
+                    obj = json.loads(line)
+                except ValueError:
+                    raise SnapshotError(f"Повреждённая строка в {table}.{fmt}.")
+                if not isinstance(obj, dict):
+                    raise SnapshotError(f"Повреждённая строка в {table}.{fmt}.")
+                yield tuple(obj.get(column) for column in columns)
@@ -0,0 +1,103 @@
+import itertools
+import time
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+_SECONDS_PER_DAY = 86400
+
+# Границы корзин гистограммы «дней без активности»: <7, 7–30, 30–90, 90–180, 180+
+HISTOGRAM_BOUNDS_DAYS: Tuple[int, ...] = (7, 30, 90, 180)
+HISTOGRAM_LABELS: Tuple[str, ...] = ("<7д", "7–30д", "30–90д", "90–180д", "180д+")
+
+# «В зоне риска» — молчат дольше месяца, но ещё не попали под фильтр «неактивные 3 месяца»
+AT_RISK_FROM_DAYS = 30
+INACTIVE_FROM_DAYS = 90
+
+
+@dataclass(frozen=True)
+class ChatInactivity:
+    chat_id: int
+    members: int
+    histogram: Tuple[int, ...]
+    p50_days: int
+    p90_days: int
+    at_risk: int
+    inactive: int
+
+
+def build_inactivity_report(
+    rows: Iterable[Tuple[int, Optional[int]]],
+    *,
+    now_ts: Optional[int] = None,
+) -> Dict[int, ChatInactivity]:
+    """
+    Сводка неактивности по чатам из строк (chat_id, last_activity_ts),
+    упорядоченных по (chat_id, last_activity_ts) — так их отдаёт get_activity_ts_for_chats.
+
+    Время каждого чата складывается в отсортированный array('q'); гистограмма, перцентили
+    и зона риска считаются бинарным поиском по порогам, без прохода по строкам в Python.
+    """
+    now = int(time.time()) if now_ts is None else now_ts
+    # Порог «активен позже, чем N дней назад» в секундах epoch, от самого давнего к свежему
+    thresholds = [now - days * _SECONDS_PER_DAY for days in reversed(HISTOGRAM_BOUNDS_DAYS)]
+    at_risk_from = now - AT_RISK_FROM_DAYS * _SECONDS_PER_DAY
+    inactive_from = now - INACTIVE_FROM_DAYS * _SECONDS_PER_DAY
+
+    report: Dict[int, ChatInactivity] = {}
+    for chat_id, group in itertools.groupby(rows, key=lambda row: row[0]):
+        ts = array("q", (row[1] or 0 for row in group))
+        n = len(ts)
+        # Сколько участников молчат дольше каждого порога (ts отсортированы по возрастанию)
+        older = [bisect_left(ts, threshold) for threshold in thresholds]
+        counts_oldest_first = [older[0]] + [b - a for a, b in zip(older, older[1:])] + [n - older[-1]]
+        inactive = bisect_left(ts, inactive_from)
+        report[chat_id] = ChatInactivity(
+            chat_id=chat_id,
+            members=n,
+            histogram=tuple(reversed(counts_oldest_first)),
+            p50_days=_inactivity_percentile(ts, 0.5, now),
+            p90_days=_inactivity_percentile(ts, 0.9, now),
+            at_risk=bisect_left(ts, at_risk_from) - inactive,
+            inactive=inactive,
+        )
+    return report
+
+
+def format_inactivity_report(items: List[Tuple[str, ChatInactivity]]) -> List[str]:
+    """Текст отчёта (title, сводка) по чатам; разбит на части под лимит сообщения Telegram."""
+    blocks = []
+    for title, item in items:
+        histogram = " · ".join(f"{label} {count}" for label, count in zip(HISTOGRAM_LABELS, item.histogram))
+        blocks.append(
+            f"{title} — {item.members} уч.\n"
+            f"молчат: медиана {item.p50_days} дн., 90% — до {item.p90_days} дн.\n"
+            f"{histogram}\n"
+            f"в зоне риска (30–90 дн.): {item.at_risk}, неактивны 90+ дн.: {item.inactive}"
+        )
+    return _split_messages(blocks)
+
+
+def _inactivity_percentile(ts: array, q: float, now: int) -> int:
+    """Дней без активности, которых не превышают q участников (ближайший ранг)."""
+    if not ts:
+        return 0
+    # Самые свежие — в конце массива: q-й перцентиль молчания отсчитываем с конца
+    index = len(ts) - 1 - int(q * (len(ts) - 1))
+    return max(now - ts[index], 0) // _SECONDS_PER_DAY
+
+
+def _split_messages(blocks: List[str], *, limit: int = 4000) -> List[str]:
+    messages: List[str] = []
+    current = ""
+    for block in blocks:
+        candidate = f"{current}\n\n{block}" if current else block
+        if current and len(candidate) > limit:
+            messages.append(current)
+            candidate = block
+        current = candidate
+    if current:
+        messages.append(current)
+    return messages
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+JobFn = Callable[[], Awaitable[Any]]
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """
+    Периодическая фоновая задача планировщика.
+
+    Запуски идут строго по одному: trigger() во время выполнения не начинает
+    второй запуск, а ждёт текущий. После ошибки следующий запуск откладывается
+    с экспоненциальной задержкой (retry_seconds, 2x, 4x ... до max_backoff_seconds),
+    после успеха — снова через interval_seconds. К каждой задержке добавляется
+    случайный разброс ±jitter, чтобы задачи не срабатывали синхронно.
+    Каждая ошибка пишется в лог (logger.exception) и учитывается в stats().
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: JobFn,
+        *,
+        interval_seconds: float,
+        jitter: float = 0.1,
+        retry_seconds: float = 5.0,
+        max_backoff_seconds: Optional[float] = None,
+    ):
+        if interval_seconds <= 0:
+            raise ValueError("interval_seconds must be > 0")
+        if not 0 <= jitter < 1:
+            raise ValueError("jitter must be in [0, 1)")
+        self.name = name
+        self.fn = fn
+        self.interval_seconds = interval_seconds
+        self.jitter = jitter
+        self.retry_seconds = min(retry_seconds, interval_seconds)
+        self.max_backoff_seconds = max_backoff_seconds if max_backoff_seconds is not None else interval_seconds
+        self._loop_task: Optional[asyncio.Task] = None
+        self._run_task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.coalesced_triggers = 0
+        self.restarts = 0
+        self.last_duration_ms: Optional[float] = None
+        self.max_duration_ms = 0.0
+        self.last_success_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._run_task is not None and not self._run_task.done()
+
+    def next_delay(self) -> float:
+        """Пауза до следующего запуска с учётом ошибок подряд и разброса."""
+        if self.consecutive_failures:
+            base = min(
+                self.retry_seconds * 2 ** (self.consecutive_failures - 1),
+                self.max_backoff_seconds,
+            )
+        else:
+            base = self.interval_seconds
+        if self.jitter:
+            base *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return base
+
+    def trigger(self) -> "asyncio.Task[None]":
+        """Запускает задачу вне расписания; если она уже идёт — возвращает текущий запуск."""
+        if self.running:
+            self.coalesced_triggers += 1
+            return self._run_task  # type: ignore[return-value]
+        self._run_task = asyncio.ensure_future(self._run_once())
+        return self._run_task
+
+    async def _run_once(self) -> None:
+        started = time.perf_counter()
+        self.runs += 1
+        try:
+            await self.fn()
+        except Exception as e:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            # Повторы идут с растущей паузой, но каждая ошибка видна в логе, а не только в stats()
+            logger.exception("scheduler job %r failed (%d in a row)", self.name, self.consecutive_failures)
+        else:
+            self.consecutive_failures = 0
+            self.last_success_at = time.time()
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            self.last_duration_ms = duration_ms
+            self.max_duration_ms = max(self.max_duration_ms, duration_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval_seconds": self.interval_seconds,
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "coalesced_triggers": self.coalesced_triggers,
+            "restarts": self.restarts,
+            "last_duration_ms": self.last_duration_ms,
+            "max_duration_ms": self.max_duration_ms,
+            "last_success_at": self.last_success_at,
+            "last_error": self.last_error,
+        }
+
+
+class Scheduler:
+    """
+    Планировщик периодических фоновых задач (без JobQueue).
+
+    Каждая задача крутится в своём цикле «пауза -> запуск». Ошибки запуска
+    не останавливают цикл (учитываются в stats и откладывают следующий запуск),
+    а если цикл всё же упал, он перезапускается.
+
+    stop() прерывает только паузы: начатый запуск дорабатывает до конца,
+    чтобы, например, flush не отменился посреди записи в БД.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, PeriodicJob] = {}
+        self._started = False
+        self._stopping = False
+
+    def add_job(self, name: str, fn: JobFn, *, interval_seconds: float, **options: Any) -> PeriodicJob:
+        if name in self._jobs:
+            raise ValueError(f"job {name!r} already exists")
+        job = PeriodicJob(name, fn, interval_seconds=interval_seconds, **options)
+        self._jobs[name] = job
+        if self._started:
+            self._start_job(job)
+        return job
+
+    def get_job(self, name: str) -> Optional[PeriodicJob]:
+        return self._jobs.get(name)
+
+    def start(self) -> None:
+        """
+        Запускает циклы задач. Используем asyncio.create_task, а не Application.create_task:
+        до running-состояния приложения PTB на него ругается.
+        """
+        if self._started:
+            return
+        self._started = True
+        self._stopping = False
+        for job in self._jobs.values():
+            self._start_job(job)
+
+    def trigger(self, name: str) -> "asyncio.Task[None]":
+        return self._jobs[name].trigger()
+
+    async def stop(self) -> None:
+        """Останавливает циклы и дожидается начатых запусков."""
+        self._stopping = True
+        self._started = False
+        loops = [job._loop_task for job in self._jobs.values() if job._loop_task is not None]
+        for task in loops:
+            task.cancel()
+        if loops:
+            await asyncio.gather(*loops, return_exceptions=True)
+        runs = [job._run_task for job in self._jobs.values() if job.running]
+        if runs:
+            await asyncio.gather(*runs, return_exceptions=True)
+        for job in self._jobs.values():
+            job._loop_task = None
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: job.stats() for name, job in self._jobs.items()}
+
+    def _start_job(self, job: PeriodicJob) -> None:
+        job._loop_task = asyncio.create_task(self._loop(job), name=f"scheduler:{job.name}")
+        job._loop_task.add_done_callback(lambda task, job=job: self._on_loop_done(job, task))
+
+    async def _loop(self, job: PeriodicJob) -> None:
+        while True:
+            await asyncio.sleep(job.next_delay())
+            # shield: отмена цикла при stop() не прерывает сам запуск
+            await asyncio.shield(job.trigger())
+
+    def _on_loop_done(self, job: PeriodicJob, task: asyncio.Task) -> None:
+        if self._stopping or task.cancelled():
+            return
+        job.restarts += 1
+        error = task.exception()
+        if error is not None:
+            job.last_error = f"loop: {type(error).__name__}: {error}"
+            logger.error("scheduler loop of job %r crashed, restarting", job.name, exc_info=error)
+        self._start_job(job)
@@ -1,43 +1,288 @@
 import asyncio
-from typing import Optional
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from telegram.ext import ContextTypes
 
-from storage.database import Database
+from services.db_access import get_async_db_from_bot_data
+from services.scheduler import PeriodicJob, Scheduler
+from storage.activity_journal import ActivityJournal, JournalRow
+from storage.database import ActivityBatchRow, ActivityDailyRow
 
 
 BOT_DATA_ACTIVITY_BUFFER = "activity_buffer"
-BOT_DATA_ACTIVITY_LOCK = "activity_lock"
-BOT_DATA_ACTIVITY_FLUSH_TASK = "activity_flush_task"
 
+# Вид события для дневных счётчиков user_activity_daily (индекс в списке счётчиков)
+ACTIVITY_MESSAGE = 0
+ACTIVITY_CALLBACK = 1
+ACTIVITY_REACTION = 2
 
-def _get_db_from_bot_data(bot_data) -> Database:
+_SECONDS_PER_DAY = 86400
+
+
+# Итог событий одного (chat_id, user_id) в буфере: (username, activity_ts, reset, left).
+# reset=True — участник выходил: строку в БД сначала удалить;
+# left=True — выход последний, activity_ts — его время (None — неизвестно), писать ничего не нужно.
+_PendingState = Tuple[Optional[str], Optional[int], bool, bool]
+
+
+def _compose(first: _PendingState, then: _PendingState) -> _PendingState:
+    """Итог двух последовательных состояний одного ключа (then — более позднее)."""
+    if then[3]:
+        # Выход перечёркивает всё, что было до него
+        return then
+    if first[3]:
+        if first[1] is not None and then[1] <= first[1]:
+            # Активность не позже выхода (например, само служебное сообщение о выходе) — не возвращение
+            return first
+        # Вышел и снова появился: удалить старую строку и записать заново
+        return then[0], then[1], True, False
+    # сохраняем последний username, если он есть; время — самое позднее
+    return then[0] or first[0], max(first[1], then[1]), first[2], False
+
+
+class RecentActivityFilter:
     """
-    Возвращает Database из bot_data, создавая при отсутствии.
+    «Недавно видели»: пропускает повторную буферизацию участника в пределах окна window_seconds.
+
+    Окна выровнены по времени (ts // window_seconds). Внутри окна хранится только множество
+    ключей (chat_id, user_id); при переходе к следующему окну оно целиком сбрасывается,
+    поэтому память ограничена числом участников, активных за одно окно (и max_entries).
+    Для болтливого участника проверка — один поиск в set.
 
-    Импортируем DB_PATH лениво, чтобы импорт модуля не падал,
-    если переменные окружения (например BOT_TOKEN) ещё не подгружены.
+    Цена: last_activity_at может отставать от реальной последней активности не больше чем на окно.
     """
-    db: Database = bot_data.get("database")
-    if not db:
-        from config import DB_PATH
-        db = Database(DB_PATH)
-        bot_data["database"] = db
-    return db
 
+    def __init__(self, *, window_seconds: int = 60, max_entries: int = 100_000):
+        if window_seconds < 1:
+            raise ValueError("window_seconds must be >= 1")
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self._window = -1
+        self._seen: Set[Tuple[int, int]] = set()
+        self.hits = 0
+        self.resets = 0
+
+    def seen(self, key: Tuple[int, int], activity_ts: int) -> bool:
+        """True — участник уже записан в текущем окне, событие можно пропустить."""
+        window = activity_ts // self.window_seconds
+        if window == self._window:
+            if key in self._seen:
+                self.hits += 1
+                return True
+        elif window > self._window:
+            self._window = window
+            self._seen = set()
+            self.resets += 1
+        else:
+            # Запоздавшее событие из прошлого окна: не фильтруем, буфер возьмёт максимум времени
+            return False
+        if len(self._seen) >= self.max_entries:
+            self._seen = set()
+            self.resets += 1
+        self._seen.add(key)
+        return False
+
+    def forget(self, key: Tuple[int, int]) -> None:
+        """Участник вышел: следующее его событие должно попасть в буфер."""
+        self._seen.discard(key)
+
+    def memory_bytes(self) -> int:
+        """Приблизительный объём памяти: сама хеш-таблица + ключи-кортежи с int внутри."""
+        entries = len(self._seen)
+        if not entries:
+            return sys.getsizeof(self._seen)
+        sample = next(iter(self._seen))
+        per_key = sys.getsizeof(sample) + sum(sys.getsizeof(part) for part in sample)
+        return sys.getsizeof(self._seen) + entries * per_key
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "window_seconds": self.window_seconds,
+            "entries": len(self._seen),
+            "hits": self.hits,
+            "resets": self.resets,
+            "memory_bytes": self.memory_bytes(),
+        }
+
+
+class ActivityBuffer:
+    """
+    Буфер активности в памяти: (chat_id, user_id) -> итог его событий
+    (последний известный username, время последнего события, был ли выход).
+
+    Пишется и читается только из event loop, поэтому блокировка не нужна:
+    между await'ами другая корутина словарь не трогает.
+    Когда различных ключей набирается max_pending, запускается внеочередной flush.
+
+    Время хранится в секундах epoch (UTC) и пишется в БД как есть,
+    поэтому last_activity_at не зависит от того, когда прошёл flush.
+    Входы участников — обычные события активности, выходы — удаление строки;
+    активность со временем не позже выхода после него не учитывается;
+    порядок событий одного участника сохраняется.
+
+    Если задан journal, каждое событие дублируется в локальный файл:
+    после падения процесса несброшенные события воспроизводятся на старте.
+
+    Если задан recent, повторные события участника в пределах его окна
+    отбрасываются до буфера и журнала.
+
+    Отдельно копятся дневные счётчики (chat_id, user_id, день) -> [сообщения, нажатия, реакции]:
+    их считают все события вида kind, в том числе отброшенные recent.
+    Счётчики в журнал не пишутся и после падения процесса теряются (last_activity — нет).
+    """
+
+    def __init__(
+        self,
+        *,
+        max_pending: int = 20_000,
+        journal: Optional[ActivityJournal] = None,
+        recent: Optional[RecentActivityFilter] = None,
+    ):
+        if max_pending < 1:
+            raise ValueError("max_pending must be >= 1")
+        self.max_pending = max_pending
+        self.journal = journal
+        self.recent = recent
+        self._pending: Dict[Tuple[int, int], _PendingState] = {}
+        self._daily: Dict[Tuple[int, int, int], List[int]] = {}
+        self._forced_flush: Optional[asyncio.Task] = None
+        # Flush'и идут строго по одному: у журнала один файл .flushing
+        self._flush_lock = asyncio.Lock()
+        self.events_buffered = 0
+        self.events_coalesced = 0
+        self.events_deduped = 0
+        self.departures = 0
+        self.forced_flushes = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(
+        self,
+        chat_id: int,
+        user_id: int,
+        username: Optional[str],
+        activity_ts: int,
+        kind: Optional[int] = None,
+    ) -> bool:
+        """
+        Кладёт событие активности (сообщение, реакция, вход). Возвращает True, если буфер заполнен.
+        kind (ACTIVITY_MESSAGE/CALLBACK/REACTION) — учесть событие в дневных счётчиках.
+        """
+        if kind is not None:
+            day_key = (chat_id, user_id, activity_ts // _SECONDS_PER_DAY)
+            counts = self._daily.get(day_key)
+            if counts is None:
+                counts = self._daily[day_key] = [0, 0, 0]
+            counts[kind] += 1
+        key = (chat_id, user_id)
+        if self.recent is not None and self.recent.seen(key, activity_ts):
+            self.events_deduped += 1
+            return len(self._daily) >= self.max_pending
+        self.events_buffered += 1
+        if self.journal is not None:
+            self.journal.append(chat_id, user_id, username, activity_ts)
+        if self._merge(key, (username, activity_ts, False, False)):
+            self.events_coalesced += 1
+        return len(self._pending) >= self.max_pending or len(self._daily) >= self.max_pending
+
+    def add_departure(self, chat_id: int, user_id: int, activity_ts: int) -> bool:
+        """Кладёт выход участника: его строка будет удалена. Возвращает True, если буфер заполнен."""
+        key = (chat_id, user_id)
+        if self.recent is not None:
+            self.recent.forget(key)
+        self.events_buffered += 1
+        self.departures += 1
+        if self.journal is not None:
+            self.journal.append(chat_id, user_id, None, activity_ts, left=True)
+        if self._merge(key, (None, activity_ts, True, True)):
+            self.events_coalesced += 1
+        return len(self._pending) >= self.max_pending
+
+    def replay(self, rows: List[JournalRow]) -> None:
+        """Загружает строки журнала (в порядке записи) без повторной записи в журнал."""
+        for chat_id, user_id, username, activity_ts, left in rows:
+            self._merge((chat_id, user_id), (None if left else username, activity_ts, left, left))
+
+    def _merge(self, key: Tuple[int, int], state: _PendingState) -> bool:
+        """Дописывает состояние после накопленного; возвращает True, если ключ уже был в буфере."""
+        current = self._pending.get(key)
+        if current is None:
+            self._pending[key] = state
+            return False
+        self._pending[key] = _compose(current, state)
+        return True
 
-def _get_activity_lock(app) -> asyncio.Lock:
-    lock = app.bot_data.get(BOT_DATA_ACTIVITY_LOCK)
-    if not lock:
-        lock = asyncio.Lock()
-        app.bot_data[BOT_DATA_ACTIVITY_LOCK] = lock
-    return lock
+    def drain(self) -> List[ActivityBatchRow]:
+        """Забирает всё накопленное; новые события пишутся уже в пустой буфер."""
+        pending, self._pending = self._pending, {}
+        if pending and self.journal is not None:
+            self.journal.rotate()
+        return [
+            (chat_id, user_id, username, None if left else activity_ts, reset)
+            for (chat_id, user_id), (username, activity_ts, reset, left) in pending.items()
+        ]
 
+    def drain_daily(self) -> List[ActivityDailyRow]:
+        """Забирает накопленный прирост дневных счётчиков."""
+        daily, self._daily = self._daily, {}
+        return [
+            (chat_id, user_id, day, messages, callbacks, reactions)
+            for (chat_id, user_id, day), (messages, callbacks, reactions) in daily.items()
+        ]
 
-def _get_activity_buffer(app) -> dict[tuple[int, int], Optional[str]]:
+    def restore_daily(self, rows: List[ActivityDailyRow]) -> None:
+        """Запись в БД не удалась: прибавляем забранные счётчики обратно."""
+        for chat_id, user_id, day, messages, callbacks, reactions in rows:
+            counts = self._daily.setdefault((chat_id, user_id, day), [0, 0, 0])
+            counts[0] += messages
+            counts[1] += callbacks
+            counts[2] += reactions
+
+    def commit(self, rows: List[ActivityBatchRow]) -> None:
+        """Забранные drain() строки записаны в БД."""
+        self.flushes += 1
+        self.rows_flushed += len(rows)
+        if self.journal is not None:
+            self.journal.commit_rotated()
+
+    def restore(self, rows: List[ActivityBatchRow]) -> None:
+        """
+        Запись в БД не удалась: возвращаем строки в буфер перед накопившимися с тех пор событиями.
+        Журнал не трогаем: .flushing остаётся и при следующем rotate склеится с новым журналом.
+        """
+        newer, self._pending = self._pending, {}
+        for chat_id, user_id, username, activity_ts, reset in rows:
+            # Время выхода в строке не сохраняется: любая следующая активность — возвращение
+            self._pending[(chat_id, user_id)] = (username, activity_ts, reset, activity_ts is None)
+        for key, state in newer.items():
+            self._merge(key, state)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "recent": self.recent.stats() if self.recent is not None else None,
+            "events_deduped": self.events_deduped,
+            "pending": len(self._pending),
+            "daily_pending": len(self._daily),
+            "max_pending": self.max_pending,
+            "events_buffered": self.events_buffered,
+            "events_coalesced": self.events_coalesced,
+            "departures": self.departures,
+            "flushes": self.flushes,
+            "forced_flushes": self.forced_flushes,
+            "rows_flushed": self.rows_flushed,
+        }
+
+
+def _get_activity_buffer(app) -> ActivityBuffer:
     buf = app.bot_data.get(BOT_DATA_ACTIVITY_BUFFER)
-    if not buf:
-        buf = {}
+    if buf is None:
+        buf = ActivityBuffer()
         app.bot_data[BOT_DATA_ACTIVITY_BUFFER] = buf
     return buf
 
@@ -47,61 +292,115 @@ async def buffer_user_activity(
     user_id: int,
     username: Optional[str],
     context: ContextTypes.DEFAULT_TYPE,
+    *,
+    at: Optional[datetime] = None,
+    kind: Optional[int] = None,
 ) -> None:
     """
     Пишем активность в память (без записи в БД).
-    В flush будем ставить last_activity_at=CURRENT_TIMESTAMP.
+    at — время события (например, message.date); по умолчанию — текущее.
+    В flush оно и станет last_activity_at.
+    kind — вид события для дневной статистики (вход в чат не считается).
     """
+    activity_ts = int(at.timestamp()) if at is not None else int(time.time())
     app = context.application
-    lock = _get_activity_lock(app)
-    async with lock:
-        buf = _get_activity_buffer(app)
-        # сохраняем последний username, если он есть
-        if username:
-            buf[(chat_id, user_id)] = username
-        else:
-            buf.setdefault((chat_id, user_id), None)
+    buf = _get_activity_buffer(app)
+    if buf.add(chat_id, user_id, username, activity_ts, kind):
+        _start_forced_flush(app, buf)
+
+
+async def buffer_user_departure(
+    chat_id: int,
+    user_id: int,
+    context: ContextTypes.DEFAULT_TYPE,
+    *,
+    at: Optional[datetime] = None,
+) -> None:
+    """Выход участника из чата: строка user_activity будет удалена при ближайшем flush."""
+    activity_ts = int(at.timestamp()) if at is not None else int(time.time())
+    app = context.application
+    buf = _get_activity_buffer(app)
+    if buf.add_departure(chat_id, user_id, activity_ts):
+        _start_forced_flush(app, buf)
+
+
+def _start_forced_flush(app, buf: ActivityBuffer) -> None:
+    """Внеочередной flush при заполнении буфера (не больше одного одновременно)."""
+    if buf._forced_flush is not None and not buf._forced_flush.done():
+        return
+    buf.forced_flushes += 1
+    buf._forced_flush = app.create_task(_flush_buffer(app, buf), name="activity-forced-flush")
+
+
+async def _flush_buffer(app, buf: ActivityBuffer) -> None:
+    async with buf._flush_lock:
+        rows = buf.drain()
+        daily = buf.drain_daily()
+        if not rows and not daily:
+            return
+        # Пишем в потоке БД, чтобы батч не блокировал event loop
+        adb = get_async_db_from_bot_data(app.bot_data)
+        try:
+            await adb.apply_user_activity_batch(rows, daily)
+        except BaseException:
+            buf.restore(rows)
+            buf.restore_daily(daily)
+            raise
+        buf.commit(rows)
 
 
 async def flush_user_activity_buffer(context: ContextTypes.DEFAULT_TYPE) -> None:
     """Flush: пишет накопленное в SQLite пачкой."""
     app = context.application
-    lock = _get_activity_lock(app)
-    async with lock:
-        buf = _get_activity_buffer(app)
-        if not buf:
-            return
-        snapshot = buf
-        app.bot_data[BOT_DATA_ACTIVITY_BUFFER] = {}
+    await _flush_buffer(app, _get_activity_buffer(app))
 
-    rows = [(chat_id, user_id, username) for (chat_id, user_id), username in snapshot.items()]
-    if not rows:
-        return
 
-    db = _get_db_from_bot_data(app.bot_data)
-    db.upsert_user_activity_many(rows)
+ACTIVITY_FLUSH_JOB = "activity-flush"
 
 
-def start_user_activity_flush_loop(app, *, interval_seconds: int = 60) -> None:
+def schedule_user_activity_flush(scheduler: Scheduler, app, *, interval_seconds: int = 300) -> PeriodicJob:
     """
-    Запускает бесконечный flush-цикл без JobQueue.
+    Регистрирует плановый flush буфера активности в планировщике.
+    Неудачный flush возвращает строки в буфер; планировщик повторит его с backoff.
     """
-    if app.bot_data.get(BOT_DATA_ACTIVITY_FLUSH_TASK):
-        return
 
-    async def _loop() -> None:
-        while True:
-            await asyncio.sleep(interval_seconds)
-            # создаём минимальный контекст-объект-обёртку: нам нужен только .application
-            class _Ctx:
-                __slots__ = ("application",)
+    async def _flush() -> None:
+        await _flush_buffer(app, _get_activity_buffer(app))
+
+    return scheduler.add_job(ACTIVITY_FLUSH_JOB, _flush, interval_seconds=interval_seconds)
 
-                def __init__(self, application):
-                    self.application = application
 
-            await flush_user_activity_buffer(_Ctx(app))  # type: ignore[arg-type]
+async def replay_user_activity_journal(app) -> int:
+    """
+    Воспроизводит в БД события из журнала, не дошедшие до SQLite
+    (процесс упал или был убит между flush'ами). Вызывается в post_init до приёма апдейтов.
+    Возвращает количество воспроизведённых строк.
+    """
+    journal = _get_activity_buffer(app).journal
+    if journal is None:
+        return 0
+    rows = journal.read_pending()
+    if rows:
+        # Сводим события так же, как при обычной буферизации: выходы и повторные входы по порядку
+        replayed = ActivityBuffer()
+        replayed.replay(rows)
+        adb = get_async_db_from_bot_data(app.bot_data)
+        await adb.apply_user_activity_batch(replayed.drain())
+    journal.clear()
+    return len(rows)
 
-    # Не используем Application.create_task до running-состояния приложения,
-    # иначе PTB показывает warning и не будет автоматически await'ить задачу.
-    app.bot_data[BOT_DATA_ACTIVITY_FLUSH_TASK] = asyncio.create_task(_loop())
 
+async def close_user_activity_buffer(app) -> None:
+    """
+    Пишет в БД всё, что осталось в буфере, и закрывает журнал (post_shutdown).
+    Вызывается после остановки планировщика, чтобы плановый flush не шёл параллельно.
+    """
+    buf = _get_activity_buffer(app)
+    if buf._forced_flush is not None and not buf._forced_flush.done():
+        try:
+            await buf._forced_flush
+        except Exception:
+            pass
+    await _flush_buffer(app, buf)
+    if buf.journal is not None:
+        buf.journal.close()
@@ -2,16 +2,31 @@ from __future__ import annotations
 
 import csv
 import io
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
-from storage.database import Database
+from services.inactivity_report import ChatInactivity, build_inactivity_report
+from storage.database import Database, UserEngagementRow
 
 
 UserRow = Tuple[int, Optional[str], Optional[str]]  # (user_id, username, last_activity_at)
 
+USERS_PAGE_SIZE = 20
+USERS_TOP_LIMIT = 20
+# Сколько пользователей из CSV пишется в БД одной транзакцией
+MEMBERS_CSV_BATCH_SIZE = 1000
+MEMBERS_CSV_EMPTY = "В CSV не найдено ни одной строки с корректным `user_id`."
+
+
+@dataclass(frozen=True)
+class UsersPage:
+    users: List[UserRow]
+    has_prev: bool
+    has_next: bool
+
 
 class UsersService:
     def __init__(self, db: Database):
@@ -30,19 +45,39 @@ class UsersService:
                     InlineKeyboardButton("Неактивные 3 месяца", callback_data="users:filter:3"),
                     InlineKeyboardButton("Неактивные полгода", callback_data="users:filter:6"),
                 ],
+                [
+                    InlineKeyboardButton("Топ за неделю", callback_data="users:top:7"),
+                    InlineKeyboardButton("Топ за месяц", callback_data="users:top:30"),
+                ],
             ]
         )
 
-    def list_keyboard(self, users: List[UserRow]) -> InlineKeyboardMarkup:
+    def page_keyboard(self, page: UsersPage, filter_token: str) -> InlineKeyboardMarkup:
+        """
+        Кнопки пользователей одной страницы + навигация.
+        Курсор в callback_data — user_id крайнего пользователя страницы:
+        users:page:<all|months>:<n|p>:<user_id> (укладывается в лимит 64 байта).
+        """
         rows: List[List[InlineKeyboardButton]] = []
-        for user_id, username, last_activity_at in users:
+        for user_id, username, last_activity_at in page.users:
             label = username or f"id:{user_id}"
             ts = self._format_last_activity(last_activity_at)
             label = f"{label} - {ts}"
             rows.append([InlineKeyboardButton(label, callback_data=f"users:user:{user_id}")])
+
+        nav: List[InlineKeyboardButton] = []
+        if page.has_prev and page.users:
+            nav.append(InlineKeyboardButton("◀️ Пред.", callback_data=f"users:page:{filter_token}:p:{page.users[0][0]}"))
+        if page.has_next and page.users:
+            nav.append(InlineKeyboardButton("След. ▶️", callback_data=f"users:page:{filter_token}:n:{page.users[-1][0]}"))
+        if nav:
+            rows.append(nav)
         rows.append([InlineKeyboardButton("⬅️ Назад", callback_data="users:back")])
         return InlineKeyboardMarkup(rows)
 
+    def back_keyboard(self) -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Назад", callback_data="users:back")]])
+
     def confirm_keyboard(self, user_id: int) -> InlineKeyboardMarkup:
         return InlineKeyboardMarkup(
             [
@@ -68,6 +103,47 @@ class UsersService:
     def get_users_for_chat(self, chat_id: int, *, inactive_months: Optional[int]) -> List[UserRow]:
         return self.db.get_users_for_chat(chat_id, inactive_months=inactive_months)
 
+    def get_users_page(
+        self,
+        chat_id: int,
+        *,
+        inactive_months: Optional[int],
+        cursor_user_id: Optional[int] = None,
+        backward: bool = False,
+        page_size: int = USERS_PAGE_SIZE,
+    ) -> UsersPage:
+        """
+        Страница списка /users. Без курсора — первая; иначе следующая (или предыдущая при backward)
+        относительно пользователя cursor_user_id. Берём на одну строку больше, чтобы знать, есть ли ещё.
+        """
+        if backward and cursor_user_id is not None:
+            rows = self.db.get_users_page(
+                chat_id, inactive_months=inactive_months, before_user_id=cursor_user_id, limit=page_size + 1
+            )
+            if len(rows) > page_size:
+                return UsersPage(users=rows[-page_size:], has_prev=True, has_next=True)
+            # До курсора меньше страницы — это начало списка, показываем первую страницу целиком
+            cursor_user_id = None
+
+        rows = self.db.get_users_page(
+            chat_id, inactive_months=inactive_months, after_user_id=cursor_user_id, limit=page_size + 1
+        )
+        return UsersPage(
+            users=rows[:page_size],
+            has_prev=cursor_user_id is not None,
+            has_next=len(rows) > page_size,
+        )
+
+    def get_top_active_users(self, chat_id: int, *, days: int, limit: int = USERS_TOP_LIMIT) -> List[UserEngagementRow]:
+        return self.db.get_top_active_users(chat_id, days=days, limit=limit)
+
+    def get_member_chat_ids(self, user_id: int) -> List[int]:
+        return self.db.get_chat_ids_for_user(user_id)
+
+    def get_inactivity_report(self, chat_ids: List[int]) -> Dict[int, ChatInactivity]:
+        """Сводка неактивности по нескольким чатам: одна выборка из БД, расчёт в памяти."""
+        return build_inactivity_report(self.db.get_activity_ts_for_chats(chat_ids))
+
     def clear_users_for_chat(self, chat_id: int) -> int:
         return self.db.clear_user_activity(chat_id)
 
@@ -75,11 +151,8 @@ class UsersService:
         return self.db.delete_user_activity(chat_id, user_id)
 
     def find_username_for_chat(self, chat_id: int, user_id: int) -> Optional[str]:
-        users = self.db.get_users_for_chat(chat_id, inactive_months=None)
-        for uid, uname, _last in users:
-            if uid == user_id:
-                return uname
-        return None
+        row = self.db.get_user_activity(chat_id, user_id)
+        return row[1] if row else None
 
     # ----- CSV import (/init_users) -----
 
@@ -91,36 +164,63 @@ class UsersService:
         При ok=False message содержит ошибку.
         """
         if len(text) > max_len:
-            return False, "Слишком длинно. Сократите и отправьте снова: /init_users", []
+            return False, "Слишком длинно. Пришлите CSV файлом: /init_users", []
 
-        normalized = text.strip()
-        buf = io.StringIO(normalized)
-        reader = csv.DictReader(buf)
-        if not reader.fieldnames or "user_id" not in reader.fieldnames:
-            return False, "Не вижу колонку `user_id` в CSV.", []
+        try:
+            users = [user for batch in self.iter_members_csv(io.StringIO(text.strip())) for user in batch]
+        except ValueError as e:
+            return False, str(e), []
+
+        if not users:
+            return False, MEMBERS_CSV_EMPTY, []
+
+        return True, "OK", users
 
-        users: List[Tuple[int, Optional[str]]] = []
+    def iter_members_csv(
+        self,
+        lines: Iterable[str],
+        *,
+        batch_size: int = MEMBERS_CSV_BATCH_SIZE,
+    ) -> Iterator[List[Tuple[int, Optional[str]]]]:
+        """
+        Потоковый разбор members.csv: пачки по batch_size пар (user_id, username).
+
+        lines — открытый файл (newline="") или любой итератор строк: читается по мере разбора,
+        поэтому память не зависит от размера файла. Колонки ищутся по заголовку один раз,
+        дальше значения берутся по позиции. Строки без корректного user_id и боты пропускаются.
+        ValueError — в заголовке нет колонки user_id.
+        """
+        reader = csv.reader(lines)
+        header = [name.strip() for name in next(reader, [])]
+        if "user_id" not in header:
+            raise ValueError("Не вижу колонку `user_id` в CSV.")
+        user_id_col = header.index("user_id")
+        username_col = header.index("username") if "username" in header else None
+        is_bot_col = header.index("is_bot") if "is_bot" in header else None
+
+        batch: List[Tuple[int, Optional[str]]] = []
         for row in reader:
-            raw_user_id = (row.get("user_id") or "").strip()
-            if not raw_user_id:
+            if len(row) <= user_id_col:
                 continue
             try:
-                user_id_int = int(raw_user_id)
+                user_id = int(row[user_id_col].strip())
             except ValueError:
                 continue
 
             # Не добавляем ботов (в members.csv is_bot обычно 0/1)
-            raw_is_bot = (row.get("is_bot") or "").strip().lower()
-            if raw_is_bot in ("1", "true", "yes", "y"):
-                continue
-
-            username = (row.get("username") or "").strip() or None
-            users.append((user_id_int, username))
-
-        if not users:
-            return False, "В CSV не найдено ни одной строки с корректным `user_id`.", []
-
-        return True, "OK", users
+            if is_bot_col is not None and is_bot_col < len(row):
+                if row[is_bot_col].strip().lower() in ("1", "true", "yes", "y"):
+                    continue
+
+            username = None
+            if username_col is not None and username_col < len(row):
+                username = row[username_col].strip() or None
+            batch.append((user_id, username))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
     def import_users_if_missing_by_user_id(
         self,
@@ -138,6 +238,14 @@ class UsersService:
             return "Все"
         return f"Неактивные {inactive_months} мес."
 
+    @staticmethod
+    def format_top_active(rows: List[UserEngagementRow]) -> str:
+        lines = []
+        for i, (user_id, username, messages, callbacks, reactions) in enumerate(rows, start=1):
+            label = username or f"id:{user_id}"
+            lines.append(f"{i}. {label} — {messages} / {callbacks} / {reactions}")
+        return "\n".join(lines)
+
     @staticmethod
     def label_for_user(user_id: int, username: Optional[str]) -> str:
         return username or f"id:{user_id}"
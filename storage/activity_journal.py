@@ -0,0 +1,115 @@
+import os
+import shutil
+from typing import IO, List, Optional, Tuple
+
+
+# (chat_id, user_id, username, activity_ts — секунды epoch, left — участник вышел)
+JournalRow = Tuple[int, int, Optional[str], int, bool]
+
+# Пометка события выхода в пятой колонке
+_LEFT_MARK = "left"
+
+
+class ActivityJournal:
+    """
+    Локальный журнал активности (append-only файл рядом с БД).
+
+    Каждое событие буфера активности дописывается строкой в журнал,
+    поэтому при падении процесса несброшенный буфер восстанавливается
+    на следующем старте (read_pending + apply_user_activity_batch).
+
+    Цикл записи:
+    - append: строка в активный файл
+    - rotate: перед flush активный файл переименовывается в <path>.flushing
+    - commit_rotated: после успешной записи в БД .flushing удаляется
+
+    Если запись в БД не удалась, .flushing остаётся на месте: следующий rotate
+    допишет к нему новый журнал, и порядок событий при воспроизведении сохранится.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rotated_path = path + ".flushing"
+        self._file: Optional[IO[str]] = None
+
+    def append(
+        self,
+        chat_id: int,
+        user_id: int,
+        username: Optional[str],
+        activity_ts: int,
+        *,
+        left: bool = False,
+    ) -> None:
+        if self._file is None:
+            # Построчная буферизация: каждая строка сразу уходит в ОС (fsync не делаем)
+            self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+        mark = f"\t{_LEFT_MARK}" if left else ""
+        self._file.write(f"{chat_id}\t{user_id}\t{username or ''}\t{activity_ts}{mark}\n")
+
+    def rotate(self) -> None:
+        """Откладывает текущий журнал в .flushing; новые события пойдут в новый файл."""
+        self._close_file()
+        if not os.path.exists(self.path):
+            return
+        if os.path.exists(self.rotated_path):
+            # Прошлый flush не записан в БД — новые события идут после его строк
+            with open(self.rotated_path, "a", encoding="utf-8") as dst, open(self.path, encoding="utf-8") as src:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.path)
+        else:
+            os.replace(self.path, self.rotated_path)
+
+    def commit_rotated(self) -> None:
+        """Строки из .flushing записаны в БД — файл больше не нужен."""
+        _remove_if_exists(self.rotated_path)
+
+    def read_pending(self) -> List[JournalRow]:
+        """Строки, не дошедшие до БД: сначала .flushing, потом активный файл."""
+        rows: List[JournalRow] = []
+        for path in (self.rotated_path, self.path):
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    row = _parse_line(line)
+                    if row is not None:
+                        rows.append(row)
+        return rows
+
+    def clear(self) -> None:
+        """Удаляет оба файла журнала (после успешного воспроизведения)."""
+        self._close_file()
+        _remove_if_exists(self.rotated_path)
+        _remove_if_exists(self.path)
+
+    def close(self) -> None:
+        self._close_file()
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _parse_line(line: str) -> Optional[JournalRow]:
+    # Последняя строка может быть недописанной, если процесс упал посреди записи
+    if not line.endswith("\n"):
+        return None
+    parts = line.rstrip("\n").split("\t")
+    if len(parts) == 4:
+        # Обычное событие: пометка выхода не пишется
+        parts.append("")
+    if len(parts) != 5:
+        return None
+    try:
+        return (int(parts[0]), int(parts[1]), parts[2] or None, int(parts[3]), parts[4] == _LEFT_MARK)
+    except ValueError:
+        return None
+
+
+def _remove_if_exists(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
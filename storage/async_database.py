@@ -0,0 +1,136 @@
+import asyncio
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from storage.database import Database
+
+
+def _resolve_future(future: asyncio.Future, result: Any, error: Optional[BaseException]) -> None:
+    # Вызывающая корутина могла быть отменена, пока запрос ждал в очереди
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class DbExecutorStats:
+    """Счётчики очереди БД: сколько вызовов, сколько ждали в очереди и сколько выполнялись."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.total_wait_sec = 0.0
+        self.max_wait_sec = 0.0
+        self.last_wait_sec = 0.0
+        self.total_run_sec = 0.0
+        self.max_run_sec = 0.0
+
+    def record(self, wait_sec: float, run_sec: float, *, failed: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            if failed:
+                self.errors += 1
+            self.last_wait_sec = wait_sec
+            self.total_wait_sec += wait_sec
+            self.total_run_sec += run_sec
+            if wait_sec > self.max_wait_sec:
+                self.max_wait_sec = wait_sec
+            if run_sec > self.max_run_sec:
+                self.max_run_sec = run_sec
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            calls = self.calls or 1
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "avg_wait_ms": self.total_wait_sec / calls * 1000,
+                "max_wait_ms": self.max_wait_sec * 1000,
+                "last_wait_ms": self.last_wait_sec * 1000,
+                "avg_run_ms": self.total_run_sec / calls * 1000,
+                "max_run_ms": self.max_run_sec * 1000,
+            }
+
+
+class AsyncDatabase:
+    """
+    Асинхронный фасад над Database.
+
+    Все обращения к SQLite выполняются в одном выделенном потоке-воркере
+    по очереди запросов, а корутины получают awaitable с результатом.
+    Так медленная запись или ожидание SQLITE_BUSY не блокирует event loop бота.
+
+    Использование:
+    - await adb.get_suggestions(chat_id)          # прокси на метод Database
+    - await adb.run(service.list_books, chat_id)  # любой синхронный код, работающий с БД
+    """
+
+    def __init__(self, db: Database, *, thread_name: str = "db-worker"):
+        self.db = db
+        self.stats = DbExecutorStats()
+        self._queue: "queue.SimpleQueue[Optional[tuple]]" = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._worker, name=thread_name, daemon=True)
+        self._thread.start()
+
+    @property
+    def queue_depth(self) -> int:
+        """Сколько запросов ждёт выполнения (приблизительно)."""
+        return self._queue.qsize()
+
+    def _worker(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            loop, future, fn, args, kwargs, enqueued_at = item
+            started_at = time.perf_counter()
+            result: Any = None
+            error: Optional[BaseException] = None
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:  # пробрасываем в вызывающую корутину
+                error = e
+            finished_at = time.perf_counter()
+            self.stats.record(started_at - enqueued_at, finished_at - started_at, failed=error is not None)
+            try:
+                loop.call_soon_threadsafe(_resolve_future, future, result, error)
+            except RuntimeError:
+                # event loop уже закрыт (остановка приложения) — результат никому не нужен
+                pass
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Выполняет fn(*args, **kwargs) в потоке БД и возвращает результат."""
+        if self._closed:
+            raise RuntimeError("AsyncDatabase is closed")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put((loop, future, fn, args, kwargs, time.perf_counter()))
+        return await future
+
+    def __getattr__(self, name: str) -> Any:
+        # Прокси на публичные методы Database: await adb.<method>(...)
+        if name.startswith("_"):
+            raise AttributeError(name)
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+
+        async def _call(*args: Any, **kwargs: Any) -> Any:
+            return await self.run(attr, *args, **kwargs)
+
+        _call.__name__ = name
+        return _call
+
+    async def close(self) -> None:
+        """Дожидается выполнения уже поставленных запросов и останавливает воркер."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
@@ -0,0 +1,103 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Простой LRU-кэш с ограничением по числу записей
+    и (опционально) по суммарному «весу» значений.
+
+    Вытесняются давно не использованные записи. Есть счётчики попаданий/промахов.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        *,
+        max_weight: Optional[int] = None,
+        weigher: Optional[Callable[[Any], int]] = None,
+    ):
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+        if max_weight is not None and weigher is None:
+            raise ValueError("max_weight requires weigher")
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self._weigher = weigher
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._weights: Dict[Hashable, int] = {}
+        self._weight = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    @property
+    def weight(self) -> int:
+        return self._weight
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            weight = self._weigher(value) if self._weigher else 0
+            if self.max_weight is not None and weight > self.max_weight:
+                # Значение больше всего кэша — не кэшируем
+                return
+            self._data[key] = value
+            self._weights[key] = weight
+            self._weight += weight
+            self._evict()
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._weights.clear()
+            self._weight = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._data),
+                "weight": self._weight,
+            }
+
+    def _remove(self, key: Hashable) -> None:
+        del self._data[key]
+        self._weight -= self._weights.pop(key, 0)
+
+    def _evict(self) -> None:
+        while len(self._data) > self.max_entries or (
+            self.max_weight is not None and self._weight > self.max_weight
+        ):
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
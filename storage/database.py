@@ -1,210 +1,447 @@
+import itertools
 import sqlite3
-from typing import List, Optional, Tuple
+import threading
+import urllib.parse
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from storage.cache import LRUCache
+from storage.migrations import apply_migrations
+
+
+# (id, user_id, username, text, source_message_id, created_at)
+SuggestionRow = Tuple[int, int, Optional[str], str, int, str]
+# (id, title, created_at, source_message_id, position, used)
+GenreRow = Tuple[int, str, str, int, int, int]
+# (user_id, username, last_activity_at)
+UserActivityRow = Tuple[int, Optional[str], Optional[str]]
+# Порядок списка пользователей; выражение совпадает с индексом idx_user_activity_chat_name
+_USER_SORT_KEY = "COALESCE(username, '') COLLATE NOCASE"
+# (chat_id, user_id, username, activity_ts) — время события в секундах epoch (UTC) или None
+ActivityRow = Tuple[int, int, Optional[str], Optional[int]]
+# (chat_id, user_id, username, activity_ts, reset): reset — сначала удалить строку (участник выходил),
+# затем, если activity_ts не None, записать активность заново
+ActivityBatchRow = Tuple[int, int, Optional[str], Optional[int], bool]
+
+# (chat_id, user_id, day, messages, callbacks, reactions) — прирост счётчиков за день (секунды epoch // 86400)
+ActivityDailyRow = Tuple[int, int, int, int, int, int]
+# (user_id, username, messages, callbacks, reactions) — сумма за окно дней
+UserEngagementRow = Tuple[int, Optional[str], int, int, int]
+
+# Выгрузка данных чата (/export): таблица -> (колонки без chat_id и суррогатных id, порядок строк).
+# Колонки id и chat_id не выгружаются: при загрузке в другой чат они назначаются заново.
+CHAT_EXPORT_TABLES: Dict[str, Tuple[Tuple[str, ...], str]] = {
+    "suggestions": (("user_id", "username", "text", "source_message_id", "created_at"), "id"),
+    "genres": (("title", "created_at", "source_message_id", "position", "used"), "position, id"),
+    "polls": (("poll_id", "question", "options", "message_id", "status", "created_at", "closed_at"), "id"),
+    "history": (("month_year", "book", "genre", "year", "month"), "year, month"),
+    "user_activity": (("user_id", "username", "first_seen_at", "last_activity_at", "last_activity_ts"), "user_id"),
+}
+
+# Вставка строки снимка (chat_id, *колонки CHAT_EXPORT_TABLES) при восстановлении чата
+_RESTORE_SQL: Dict[str, str] = {
+    "suggestions": """
+        INSERT INTO suggestions (chat_id, user_id, username, text, source_message_id, created_at)
+        VALUES (?1, ?2, ?3, ?4, ?5, COALESCE(?6, CURRENT_TIMESTAMP))
+    """,
+    "genres": """
+        INSERT INTO genres (chat_id, title, created_at, source_message_id, position, used)
+        VALUES (?1, ?2, COALESCE(?3, CURRENT_TIMESTAMP), ?4, COALESCE(?5, 0), COALESCE(?6, 0))
+    """,
+    "history": """
+        INSERT OR REPLACE INTO history (chat_id, month_year, book, genre, year, month)
+        VALUES (?1, ?2, ?3, ?4, ?5, ?6)
+    """,
+    "user_activity": """
+        INSERT INTO user_activity (chat_id, user_id, username, first_seen_at, last_activity_at, last_activity_ts)
+        VALUES (
+            ?1, ?2, ?3,
+            COALESCE(?4, CURRENT_TIMESTAMP),
+            ?5,
+            COALESCE(?6, CAST(strftime('%s', COALESCE(?5, ?4, 'now')) AS INTEGER))
+        )
+        ON CONFLICT(chat_id, user_id) DO UPDATE SET
+            username = COALESCE(user_activity.username, excluded.username),
+            first_seen_at = MIN(COALESCE(user_activity.first_seen_at, excluded.first_seen_at), excluded.first_seen_at),
+            last_activity_at = CASE
+                WHEN user_activity.last_activity_at IS NULL
+                  OR excluded.last_activity_at > user_activity.last_activity_at
+                THEN COALESCE(excluded.last_activity_at, user_activity.last_activity_at)
+                ELSE user_activity.last_activity_at
+            END,
+            last_activity_ts = MAX(COALESCE(user_activity.last_activity_ts, 0), excluded.last_activity_ts)
+    """,
+}
+
+
+def _restore_history_row(row: Tuple) -> Tuple:
+    """Снимки без year/month (или с пустыми) — достраиваем их из month_year."""
+    month_year, book, genre, year, month = row
+    if year is None or month is None:
+        month, year = Database._split_month_year(month_year or "")
+    return month_year, book, genre, year, month
+
+
+_RESTORE_PREPARE = {"history": _restore_history_row}
+
+# Upsert одной строки активности (chat_id, user_id, username, activity_ts); см. upsert_user_activity_many.
+# username здесь не обновляется: любое присваивание колонки переписывает запись idx_user_activity_chat_name,
+# даже если значение то же. Смена имени — отдельным _UPDATE_ACTIVITY_USERNAME_SQL.
+_UPSERT_ACTIVITY_SQL = """
+    INSERT INTO user_activity (chat_id, user_id, username, first_seen_at, last_activity_at, last_activity_ts)
+    VALUES (
+        ?1, ?2, ?3,
+        COALESCE(datetime(?4, 'unixepoch'), CURRENT_TIMESTAMP),
+        COALESCE(datetime(?4, 'unixepoch'), CURRENT_TIMESTAMP),
+        COALESCE(?4, CAST(strftime('%s', 'now') AS INTEGER))
+    )
+    ON CONFLICT(chat_id, user_id) DO UPDATE SET
+        last_activity_at = CASE
+            WHEN user_activity.last_activity_at IS NULL
+              OR excluded.last_activity_at > user_activity.last_activity_at
+            THEN excluded.last_activity_at
+            ELSE user_activity.last_activity_at
+        END,
+        last_activity_ts = MAX(COALESCE(user_activity.last_activity_ts, 0), excluded.last_activity_ts)
+"""
+
+# (chat_id, user_id, username): пишет только действительно изменившиеся имена
+_UPDATE_ACTIVITY_USERNAME_SQL = """
+    UPDATE user_activity SET username = ?3
+    WHERE chat_id = ?1 AND user_id = ?2 AND username IS NOT ?3
+"""
 
 
 class Database:
-    def __init__(self, db_path: str):
+    def __init__(
+        self,
+        db_path: str,
+        *,
+        cached_statements: int = 256,
+        mmap_size: int = 64 * 1024 * 1024,
+        busy_timeout_ms: int = 5000,
+        cache_chats: int = 512,
+    ):
         self.db_path = db_path
+        self._cached_statements = cached_statements
+        self._mmap_size = mmap_size
+        self._busy_timeout_ms = busy_timeout_ms
+        # Одно долгоживущее соединение на процесс. Доступ сериализуем через RLock,
+        # поэтому соединение можно использовать из любого потока.
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = self._open_connection()
+        # Read-through кэш списков предложений/жанров по chat_id.
+        # Заполняется при чтении, сбрасывается любым изменяющим методом для этого чата.
+        self._suggestions_cache = LRUCache(cache_chats)
+        self._genres_cache = LRUCache(cache_chats)
+        # Версии данных списков по chat_id: меняются при каждой записи.
+        # Берутся из общего монотонного счётчика, поэтому никогда не повторяются.
+        self._version_seq = itertools.count(1)
+        self._suggestions_versions: Dict[int, int] = {}
+        self._genres_versions: Dict[int, int] = {}
         self._init_db()
 
-    def _init_db(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS suggestions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    chat_id INTEGER NOT NULL,
-                    user_id INTEGER NOT NULL,
-                    username TEXT,
-                    text TEXT NOT NULL,
-                    source_message_id INTEGER NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS genres (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    chat_id INTEGER NOT NULL,
-                    title TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    source_message_id INTEGER NOT NULL,
-                    position INTEGER DEFAULT 0,
-                    used INTEGER DEFAULT 0
-                )
-            """)
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS polls (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    chat_id INTEGER NOT NULL,
-                    poll_id TEXT NOT NULL,
-                    question TEXT NOT NULL,
-                    options TEXT NOT NULL,
-                    message_id INTEGER,
-                    status TEXT DEFAULT 'active',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    closed_at TIMESTAMP
-                )
-            """)
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS groups (
-                    chat_id     INTEGER PRIMARY KEY,
-                    title       TEXT NOT NULL,
-                    type        TEXT NOT NULL,
-                    is_active   INTEGER NOT NULL DEFAULT 1,
-                    added_at    DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    updated_at  DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS user_activity (
-                    chat_id           INTEGER NOT NULL,
-                    user_id           INTEGER NOT NULL,
-                    username          TEXT,
-                    first_seen_at     DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    last_activity_at  DATETIME,
-
-                    PRIMARY KEY (chat_id, user_id)
-                )
-            """)
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS history (
-                    chat_id     INTEGER NOT NULL,
-                    month_year  TEXT NOT NULL,
-                    book        TEXT,
-                    genre       TEXT,
+    def _open_connection(self) -> sqlite3.Connection:
+        """
+        Открывает и настраивает соединение:
+        - WAL: читатели не блокируют писателя, commit без полного fsync базы
+        - synchronous=NORMAL: в режиме WAL безопасно и заметно быстрее FULL
+        - cached_statements: кэш скомпилированных запросов на соединение
+        - mmap_size / busy_timeout: чтение через mmap и ожидание вместо SQLITE_BUSY
+        """
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self._busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=self._cached_statements,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(self._mmap_size)}")
+        conn.execute(f"PRAGMA busy_timeout={int(self._busy_timeout_ms)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
 
-                    PRIMARY KEY (chat_id, month_year)
-                )
-            """)
-            # Миграция: добавляем поля position и used, если их еще нет
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Выдаёт общее соединение под блокировкой.
+        При успешном выходе делает commit, при исключении — rollback.
+        """
+        with self._lock:
+            conn = self._conn
+            if conn is None:
+                raise sqlite3.ProgrammingError("Database is closed")
             try:
-                conn.execute("ALTER TABLE genres ADD COLUMN position INTEGER DEFAULT 0")
-            except sqlite3.OperationalError:
-                pass  # Поле уже существует
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Явная транзакция (BEGIN IMMEDIATE): блокировка на запись берётся сразу,
+        поэтому чтение и последующая запись внутри видят одно и то же состояние.
+        """
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+
+    def _invalidate_suggestions(self, chat_id: int) -> None:
+        self._suggestions_cache.pop(chat_id)
+        self._suggestions_versions[chat_id] = next(self._version_seq)
+
+    def _invalidate_genres(self, chat_id: int) -> None:
+        self._genres_cache.pop(chat_id)
+        self._genres_versions[chat_id] = next(self._version_seq)
+
+    def suggestions_version(self, chat_id: int) -> int:
+        """Версия списка предложений чата (меняется при каждом изменении списка)."""
+        return self._suggestions_versions.get(chat_id, 0)
+
+    def genres_version(self, chat_id: int) -> int:
+        """Версия списка жанров чата (меняется при каждом изменении списка)."""
+        return self._genres_versions.get(chat_id, 0)
+
+    def clear_caches(self) -> None:
+        """Сбрасывает кэши списков (версии данных не трогает). Нужно бенчмаркам и массовым операциям."""
+        with self._lock:
+            self._suggestions_cache.clear()
+            self._genres_cache.clear()
+
+    def cache_stats(self) -> dict:
+        """Счётчики попаданий/промахов кэша списков (для диагностики)."""
+        return {
+            "suggestions": self._suggestions_cache.stats(),
+            "genres": self._genres_cache.stats(),
+        }
+
+    def close(self) -> None:
+        """Закрывает соединение (вызывается при остановке приложения)."""
+        with self._lock:
+            conn = self._conn
+            self._conn = None
+            if conn is None:
+                return
             try:
-                conn.execute("ALTER TABLE genres ADD COLUMN used INTEGER DEFAULT 0")
-            except sqlite3.OperationalError:
-                pass  # Поле уже существует
-            # Устанавливаем position для существующих записей, если они еще не установлены
-            # Для каждого чата устанавливаем position последовательно на основе created_at
-            cursor = conn.execute("""
-                SELECT DISTINCT chat_id FROM genres
-            """)
-            for (chat_id,) in cursor.fetchall():
-                cursor2 = conn.execute("""
-                    SELECT id FROM genres 
-                    WHERE chat_id = ? 
-                    ORDER BY created_at ASC, id ASC
-                """, (chat_id,))
-                for pos, (genre_id,) in enumerate(cursor2.fetchall(), 1):
-                    conn.execute("""
-                        UPDATE genres 
-                        SET position = ? 
-                        WHERE id = ? AND (position = 0 OR position IS NULL)
-                    """, (pos, genre_id))
-            conn.commit()
+                # Переносим WAL в основной файл, чтобы после остановки остался один файл БД
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error:
+                pass
+            conn.close()
+
+    @contextmanager
+    def snapshot_connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Отдельное read-only соединение с открытой транзакцией чтения: все выборки внутри
+        видят один снимок базы. Общее соединение и его блокировка не занимаются,
+        поэтому долгое чтение (выгрузка) не задерживает остальные запросы бота (WAL).
+        """
+        conn = sqlite3.connect(
+            f"file:{urllib.parse.quote(self.db_path)}?mode=ro",
+            uri=True,
+            timeout=self._busy_timeout_ms / 1000,
+            check_same_thread=False,
+        )
+        try:
+            conn.execute("BEGIN")
+            yield conn
+        finally:
+            conn.rollback()
+            conn.close()
+
+    @staticmethod
+    def iter_chat_table(
+        conn: sqlite3.Connection,
+        table: str,
+        chat_id: int,
+        *,
+        batch_size: int = 1000,
+    ) -> Iterator[List[Tuple]]:
+        """Строки таблицы из CHAT_EXPORT_TABLES для чата, пачками по batch_size (курсор, без fetchall)."""
+        columns, order_by = CHAT_EXPORT_TABLES[table]
+        cursor = conn.execute(
+            f"SELECT {', '.join(columns)} FROM {table} WHERE chat_id = ? ORDER BY {order_by}",
+            (chat_id,),
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+
+    def count_chat_rows(self, chat_id: int) -> Dict[str, int]:
+        """Сколько строк чата в каждой таблице из CHAT_EXPORT_TABLES."""
+        with self._connection() as conn:
+            return {
+                table: conn.execute(f"SELECT count(*) FROM {table} WHERE chat_id = ?", (chat_id,)).fetchone()[0]
+                for table in CHAT_EXPORT_TABLES
+            }
+
+    def restore_chat_snapshot(
+        self,
+        chat_id: int,
+        tables: Dict[str, Iterable[Tuple]],
+        *,
+        batch_size: int = 1000,
+    ) -> Dict[str, int]:
+        """
+        Загружает снимок (/export) в чат одной транзакцией; строки — в порядке колонок CHAT_EXPORT_TABLES.
+
+        suggestions, genres, history: строки чата заменяются строками снимка.
+        user_activity: сливается с текущей — новые пользователи добавляются, у известных
+        сохраняется более поздняя активность и более раннее first_seen_at.
+        polls не восстанавливаются: опросы привязаны к сообщениям старого чата.
+        Строки вставляются executemany пачками по batch_size. Возвращает число строк по таблицам.
+        """
+        counts: Dict[str, int] = {}
+        with self._transaction() as conn:
+            for table, rows in tables.items():
+                if table not in _RESTORE_SQL:
+                    continue
+                if table != "user_activity":
+                    conn.execute(f"DELETE FROM {table} WHERE chat_id = ?", (chat_id,))
+                prepare = _RESTORE_PREPARE.get(table)
+                count = 0
+                iterator = iter(rows)
+                while True:
+                    batch = list(itertools.islice(iterator, batch_size))
+                    if not batch:
+                        break
+                    conn.executemany(
+                        _RESTORE_SQL[table],
+                        [(chat_id, *(prepare(row) if prepare else row)) for row in batch],
+                    )
+                    count += len(batch)
+                counts[table] = count
+            if "suggestions" in counts:
+                self._invalidate_suggestions(chat_id)
+            if "genres" in counts:
+                self._invalidate_genres(chat_id)
+        return counts
+
+    def _init_db(self):
+        """Доводит схему до актуальной версии (см. storage/migrations.py)."""
+        with self._connection() as conn:
+            apply_migrations(conn)
+
+    @staticmethod
+    def _split_month_year(month_year: str) -> Tuple[Optional[int], Optional[int]]:
+        """"12_2026" -> (12, 2026). Для некорректного ключа — (None, None)."""
+        try:
+            m_str, y_str = month_year.strip().split("_", 1)
+            return int(m_str), int(y_str)
+        except (AttributeError, ValueError):
+            return None, None
+
+    @classmethod
+    def _upsert_history_book(cls, conn: sqlite3.Connection, chat_id: int, month_year: str, book: str) -> None:
+        month, year = cls._split_month_year(month_year)
+        conn.execute(
+            """
+            INSERT INTO history (chat_id, month_year, year, month, book, genre)
+            VALUES (?, ?, ?, ?, ?, '')
+            ON CONFLICT(chat_id, month_year) DO UPDATE SET
+                book = excluded.book
+            """,
+            (chat_id, month_year, year, month, book),
+        )
+
+    @classmethod
+    def _upsert_history_genre(cls, conn: sqlite3.Connection, chat_id: int, month_year: str, genre: str) -> None:
+        month, year = cls._split_month_year(month_year)
+        conn.execute(
+            """
+            INSERT INTO history (chat_id, month_year, year, month, book, genre)
+            VALUES (?, ?, ?, ?, '', ?)
+            ON CONFLICT(chat_id, month_year) DO UPDATE SET
+                genre = excluded.genre
+            """,
+            (chat_id, month_year, year, month, genre),
+        )
 
     def upsert_history_book(self, chat_id: int, month_year: str, book: str) -> None:
         """
         Создаёт/обновляет запись истории за месяц.
         Обновляет только поле book, не затирая genre.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                """
-                INSERT INTO history (chat_id, month_year, book, genre)
-                VALUES (?, ?, ?, '')
-                ON CONFLICT(chat_id, month_year) DO UPDATE SET
-                    book = excluded.book
-                """,
-                (chat_id, month_year, book),
-            )
-            conn.commit()
+        with self._connection() as conn:
+            self._upsert_history_book(conn, chat_id, month_year, book)
 
     def upsert_history_genre(self, chat_id: int, month_year: str, genre: str) -> None:
         """
         Создаёт/обновляет запись истории за месяц.
         Обновляет только поле genre, не затирая book.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                """
-                INSERT INTO history (chat_id, month_year, book, genre)
-                VALUES (?, ?, '', ?)
-                ON CONFLICT(chat_id, month_year) DO UPDATE SET
-                    genre = excluded.genre
-                """,
-                (chat_id, month_year, genre),
-            )
-            conn.commit()
+        with self._connection() as conn:
+            self._upsert_history_genre(conn, chat_id, month_year, genre)
+
+    def upsert_history_book_from_suggestion_index(self, chat_id: int, index: int, month_year: str) -> Optional[str]:
+        """
+        Сохраняет в историю книгу с номером index из списка предложений (одна транзакция).
+        Возвращает текст книги или None, если такого номера нет.
+        """
+        with self._transaction() as conn:
+            suggestion = self._suggestion_at(conn, chat_id, index)
+            if not suggestion:
+                return None
+            book_text = suggestion[3]
+            self._upsert_history_book(conn, chat_id, month_year, book_text)
+            return book_text
+
+    def upsert_history_genre_from_genre_index(self, chat_id: int, index: int, month_year: str) -> Optional[str]:
+        """
+        Сохраняет в историю жанр с номером index из списка жанров (одна транзакция).
+        Возвращает название жанра или None, если такого номера нет.
+        """
+        with self._transaction() as conn:
+            genre = self._genre_at(conn, chat_id, index)
+            if not genre:
+                return None
+            genre_title = genre[1]
+            self._upsert_history_genre(conn, chat_id, month_year, genre_title)
+            return genre_title
 
     def get_history_years(self, chat_id: int) -> List[int]:
         """
         Возвращает список лет, за которые есть записи в history для чата.
-        year извлекается из month_year формата "12_2026".
+        Запись считается существующей, только если в ней сохранена книга или жанр.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connection() as conn:
             cursor = conn.execute(
                 """
-                SELECT month_year, book, genre
+                SELECT DISTINCT year
                 FROM history
                 WHERE chat_id = ?
+                  AND year IS NOT NULL
+                  AND (TRIM(COALESCE(book, '')) <> '' OR TRIM(COALESCE(genre, '')) <> '')
+                ORDER BY year ASC
                 """,
                 (chat_id,),
             )
-            years: set[int] = set()
-            for r in cursor.fetchall():
-                month_year = (r["month_year"] or "").strip()
-                if not month_year:
-                    continue
-                # Считаем запись "существующей", только если есть хоть что-то сохранённое
-                book = (r["book"] or "").strip()
-                genre = (r["genre"] or "").strip()
-                if not book and not genre:
-                    continue
-                try:
-                    _m, y = month_year.split("_", 1)
-                    years.add(int(y))
-                except Exception:
-                    continue
-            return sorted(years)
+            return [int(year) for (year,) in cursor.fetchall()]
 
     def get_history_for_year(self, chat_id: int, year: int) -> List[Tuple[int, str, str]]:
         """
-        Возвращает записи истории за конкретный год.
+        Возвращает записи истории за конкретный год (диапазон по индексу chat_id, year, month).
         Формат результата: [(month, genre, book), ...] отсортировано по month.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connection() as conn:
             cursor = conn.execute(
                 """
-                SELECT month_year, book, genre
+                SELECT month, TRIM(COALESCE(genre, '')), TRIM(COALESCE(book, ''))
                 FROM history
                 WHERE chat_id = ?
+                  AND year = ?
+                  AND (TRIM(COALESCE(book, '')) <> '' OR TRIM(COALESCE(genre, '')) <> '')
+                ORDER BY month ASC
                 """,
-                (chat_id,),
+                (chat_id, year),
             )
-            rows: List[Tuple[int, str, str]] = []
-            for r in cursor.fetchall():
-                month_year = (r["month_year"] or "").strip()
-                if not month_year:
-                    continue
-                try:
-                    m_str, y_str = month_year.split("_", 1)
-                    m = int(m_str)
-                    y = int(y_str)
-                except Exception:
-                    continue
-                if y != year:
-                    continue
-                book = (r["book"] or "").strip()
-                genre = (r["genre"] or "").strip()
-                # показываем только те месяцы, где есть хоть что-то
-                if not book and not genre:
-                    continue
-                rows.append((m, genre, book))
-            rows.sort(key=lambda t: t[0])
-            return rows
+            return [(int(month), genre, book) for month, genre, book in cursor.fetchall()]
 
     def insert_user_activity_if_missing_by_user_id(
         self,
@@ -216,49 +453,35 @@ class Database:
 
         Важно: проверка делается по user_id (глобально), как требуется для /init_users.
         Возвращает (inserted_count, skipped_count).
+
+        Вход складывается во временную таблицу (дубликаты отбрасываются, остаётся первый username),
+        затем одна вставка INSERT ... SELECT ... WHERE NOT EXISTS по индексу idx_user_activity_user.
+        Всё в одной транзакции; число пользователей не ограничено лимитом параметров SQLite.
         """
         if not users:
             return 0, 0
 
-        # Убираем дубликаты из входа (берём первый username, который встретился)
-        unique_by_id: dict[int, Optional[str]] = {}
-        for user_id, username in users:
-            if user_id not in unique_by_id:
-                unique_by_id[user_id] = username
-
-        user_ids = list(unique_by_id.keys())
-        if not user_ids:
-            return 0, 0
-
-        with sqlite3.connect(self.db_path) as conn:
-            placeholders = ",".join(["?"] * len(user_ids))
-            cursor = conn.execute(
-                f"SELECT DISTINCT user_id FROM user_activity WHERE user_id IN ({placeholders})",
-                user_ids,
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS import_users (user_id INTEGER PRIMARY KEY, username TEXT)"
             )
-            existing_user_ids = {row[0] for row in cursor.fetchall()}
-
-            to_insert = [
-                (chat_id, user_id, unique_by_id[user_id])
-                for user_id in user_ids
-                if user_id not in existing_user_ids
-            ]
-
-            if not to_insert:
-                return 0, len(user_ids)
-
-            conn.executemany(
+            conn.execute("DELETE FROM temp.import_users")
+            conn.executemany("INSERT OR IGNORE INTO temp.import_users (user_id, username) VALUES (?, ?)", users)
+            total = conn.execute("SELECT count(*) FROM temp.import_users").fetchone()[0]
+            cursor = conn.execute(
                 """
-                INSERT INTO user_activity (chat_id, user_id, username, first_seen_at, last_activity_at)
-                VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                INSERT INTO user_activity (chat_id, user_id, username, first_seen_at, last_activity_at, last_activity_ts)
+                SELECT ?, i.user_id, i.username,
+                       CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, CAST(strftime('%s', 'now') AS INTEGER)
+                FROM temp.import_users AS i
+                WHERE NOT EXISTS (SELECT 1 FROM user_activity AS ua WHERE ua.user_id = i.user_id)
                 """,
-                to_insert,
+                (chat_id,),
             )
-            conn.commit()
+            inserted = cursor.rowcount
+            conn.execute("DELETE FROM temp.import_users")
 
-            inserted = len(to_insert)
-            skipped = len(user_ids) - inserted
-            return inserted, skipped
+        return inserted, total - inserted
 
     def get_users_for_chat(
         self,
@@ -270,10 +493,9 @@ class Database:
         Возвращает список пользователей для чата: (user_id, username, last_activity_at).
 
         Если inactive_months задан, возвращает тех, у кого last_activity_at (или first_seen_at)
-        старше чем now - inactive_months months.
+        старше чем now - inactive_months months. Фильтр идёт по индексу (chat_id, last_activity_ts).
         """
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connection() as conn:
             if inactive_months is None:
                 cursor = conn.execute(
                     """
@@ -290,17 +512,126 @@ class Database:
                     SELECT user_id, username, last_activity_at
                     FROM user_activity
                     WHERE chat_id = ?
-                      AND datetime(COALESCE(last_activity_at, first_seen_at))
-                          < datetime('now', ?)
+                      AND last_activity_ts < CAST(strftime('%s', 'now', ?) AS INTEGER)
                     ORDER BY COALESCE(username, '') COLLATE NOCASE ASC, user_id ASC
                     """,
                     (chat_id, f"-{inactive_months} months"),
                 )
-            return [(int(r["user_id"]), r["username"], r["last_activity_at"]) for r in cursor.fetchall()]
+            return [(int(user_id), username, last_activity_at) for user_id, username, last_activity_at in cursor.fetchall()]
+
+    def get_users_page(
+        self,
+        chat_id: int,
+        *,
+        inactive_months: Optional[int] = None,
+        after_user_id: Optional[int] = None,
+        before_user_id: Optional[int] = None,
+        limit: int = 20,
+    ) -> List[UserActivityRow]:
+        """
+        Страница пользователей чата в порядке (username без учёта регистра, user_id).
+
+        Keyset-пагинация: after_user_id / before_user_id — граничный пользователь
+        предыдущей страницы; берутся до limit строк после/до него (в прямом порядке).
+        Стоимость страницы не зависит от того, насколько далеко она от начала списка.
+        Если граничного пользователя уже нет в чате, возвращается первая страница.
+        """
+        filter_sql = ""
+        filter_params: List[object] = []
+        if inactive_months is not None:
+            filter_sql = " AND last_activity_ts < CAST(strftime('%s', 'now', ?) AS INTEGER)"
+            filter_params.append(f"-{inactive_months} months")
+
+        backward = before_user_id is not None
+        cursor_user_id = before_user_id if backward else after_user_id
+        op, order = ("<", "DESC") if backward else (">", "ASC")
+        select = f"""
+            SELECT user_id, username, last_activity_at
+            FROM user_activity
+            WHERE chat_id = ?{filter_sql}
+        """
+
+        with self._connection() as conn:
+            cursor_key: Optional[str] = None
+            if cursor_user_id is not None:
+                row = conn.execute(
+                    "SELECT COALESCE(username, '') FROM user_activity WHERE chat_id = ? AND user_id = ?",
+                    (chat_id, cursor_user_id),
+                ).fetchone()
+                if row is not None:
+                    cursor_key = row[0]
+
+            if cursor_key is None:
+                backward = False
+                rows = conn.execute(
+                    f"{select} ORDER BY {_USER_SORT_KEY} ASC, user_id ASC LIMIT ?",
+                    (chat_id, *filter_params, limit),
+                ).fetchall()
+            else:
+                # Два поиска по индексу: остаток группы с тем же именем (по user_id),
+                # затем следующие имена. Условие на пару (имя, user_id) одним выражением
+                # SQLite обслуживает только сканом всей группы одинаковых имён.
+                rows = conn.execute(
+                    f"{select} AND {_USER_SORT_KEY} = ? AND user_id {op} ? ORDER BY user_id {order} LIMIT ?",
+                    (chat_id, *filter_params, cursor_key, cursor_user_id, limit),
+                ).fetchall()
+                if len(rows) < limit:
+                    rows += conn.execute(
+                        f"{select} AND {_USER_SORT_KEY} {op} ? ORDER BY {_USER_SORT_KEY} {order}, user_id {order} LIMIT ?",
+                        (chat_id, *filter_params, cursor_key, limit - len(rows)),
+                    ).fetchall()
+
+        if backward:
+            rows.reverse()
+        return [(int(user_id), username, last_activity_at) for user_id, username, last_activity_at in rows]
+
+    def get_chat_ids_for_user(self, user_id: int) -> List[int]:
+        """Чаты, в user_activity которых есть user_id (поиск по idx_user_activity_user)."""
+        with self._connection() as conn:
+            rows = conn.execute("SELECT chat_id FROM user_activity WHERE user_id = ?", (user_id,)).fetchall()
+        return [int(row[0]) for row in rows]
+
+    def get_activity_ts_for_chats(self, chat_ids: List[int]) -> List[Tuple[int, int]]:
+        """
+        (chat_id, last_activity_ts) всех участников указанных чатов одним проходом
+        по индексу idx_user_activity_chat_ts: строки уже упорядочены по (chat_id, last_activity_ts).
+        """
+        rows: List[Tuple[int, int]] = []
+        ordered = sorted(set(chat_ids))
+        with self._connection() as conn:
+            # Пачками, чтобы не упереться в лимит параметров SQLite
+            for start in range(0, len(ordered), 500):
+                part = ordered[start:start + 500]
+                rows += conn.execute(
+                    f"""
+                    SELECT chat_id, last_activity_ts
+                    FROM user_activity
+                    WHERE chat_id IN ({", ".join("?" * len(part))})
+                    ORDER BY chat_id, last_activity_ts
+                    """,
+                    part,
+                ).fetchall()
+        return rows
+
+    def get_user_activity(self, chat_id: int, user_id: int) -> Optional[UserActivityRow]:
+        """Один пользователь чата: (user_id, username, last_activity_at) или None."""
+        with self._connection() as conn:
+            row = conn.execute(
+                """
+                SELECT user_id, username, last_activity_at
+                FROM user_activity
+                WHERE chat_id = ? AND user_id = ?
+                """,
+                (chat_id, user_id),
+            ).fetchone()
+            return (int(row[0]), row[1], row[2]) if row else None
 
     def delete_user_activity(self, chat_id: int, user_id: int) -> bool:
-        """Удаляет пользователя из user_activity для конкретного чата."""
-        with sqlite3.connect(self.db_path) as conn:
+        """
+        Удаляет пользователя из user_activity для конкретного чата
+        вместе с его дневными счётчиками (иначе он остался бы в «Топе» как id:<n>).
+        """
+        with self._connection() as conn:
             cursor = conn.execute(
                 """
                 DELETE FROM user_activity
@@ -308,12 +639,18 @@ class Database:
                 """,
                 (chat_id, user_id),
             )
-            conn.commit()
+            conn.execute(
+                "DELETE FROM user_activity_daily WHERE chat_id = ? AND user_id = ?",
+                (chat_id, user_id),
+            )
             return cursor.rowcount > 0
 
     def clear_user_activity(self, chat_id: int) -> int:
-        """Удаляет все записи user_activity для чата. Возвращает количество удалённых строк."""
-        with sqlite3.connect(self.db_path) as conn:
+        """
+        Удаляет все записи user_activity для чата и его дневные счётчики.
+        Возвращает количество удалённых строк user_activity.
+        """
+        with self._connection() as conn:
             cursor = conn.execute(
                 """
                 DELETE FROM user_activity
@@ -321,79 +658,167 @@ class Database:
                 """,
                 (chat_id,),
             )
-            conn.commit()
-            return cursor.rowcount
+            deleted = cursor.rowcount
+            conn.execute("DELETE FROM user_activity_daily WHERE chat_id = ?", (chat_id,))
+            return deleted
 
     def upsert_user_activity(self, chat_id: int, user_id: int, username: Optional[str]) -> None:
         """
         Добавляет/обновляет пользователя в user_activity для конкретного чата.
         - first_seen_at: фиксируется при первом появлении
-        - last_activity_at: ставится в CURRENT_TIMESTAMP
+        - last_activity_at / last_activity_ts: ставятся в текущее время
         - username: обновляется, если передан
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             conn.execute(
                 """
-                INSERT INTO user_activity (chat_id, user_id, username, first_seen_at, last_activity_at)
-                VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                INSERT INTO user_activity (chat_id, user_id, username, first_seen_at, last_activity_at, last_activity_ts)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, CAST(strftime('%s', 'now') AS INTEGER))
                 ON CONFLICT(chat_id, user_id) DO UPDATE SET
                     username = COALESCE(excluded.username, user_activity.username),
-                    last_activity_at = CURRENT_TIMESTAMP
+                    last_activity_at = CURRENT_TIMESTAMP,
+                    last_activity_ts = excluded.last_activity_ts
                 """,
                 (chat_id, user_id, username),
             )
-            conn.commit()
 
-    def upsert_user_activity_many(self, rows: List[Tuple[int, int, Optional[str]]]) -> int:
+    def upsert_user_activity_many(self, rows: List[ActivityRow]) -> int:
         """
         Пачечный апдейт last_activity_at для user_activity.
 
-        rows: список (chat_id, user_id, username)
+        rows: список (chat_id, user_id, username, activity_ts)
+        - activity_ts: время события (секунды epoch, UTC); None — CURRENT_TIMESTAMP
+        - last_activity_at / last_activity_ts не откатываются назад, если в БД уже более позднее время
         Возвращает количество обработанных строк (len(rows)).
         """
         if not rows:
             return 0
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
+            conn.executemany(_UPSERT_ACTIVITY_SQL, rows)
             conn.executemany(
-                """
-                INSERT INTO user_activity (chat_id, user_id, username, first_seen_at, last_activity_at)
-                VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                ON CONFLICT(chat_id, user_id) DO UPDATE SET
-                    username = COALESCE(excluded.username, user_activity.username),
-                    last_activity_at = CURRENT_TIMESTAMP
-                """,
-                rows,
+                _UPDATE_ACTIVITY_USERNAME_SQL,
+                [(chat_id, user_id, username) for chat_id, user_id, username, _ts in rows if username is not None],
+            )
+        return len(rows)
+
+    def apply_user_activity_batch(
+        self,
+        rows: List[ActivityBatchRow],
+        daily: Optional[List[ActivityDailyRow]] = None,
+    ) -> int:
+        """
+        Применяет накопленные события активности одной транзакцией:
+        сначала удаления (вышедшие участники, reset=True), затем upsert активности,
+        затем прирост дневных счётчиков daily в user_activity_daily.
+        На каждый (chat_id, user_id) в rows должна быть одна строка — итог всех его событий.
+        Возвращает количество строк.
+        """
+        if not rows and not daily:
+            return 0
+
+        with self._transaction() as conn:
+            conn.executemany(
+                "DELETE FROM user_activity WHERE chat_id = ? AND user_id = ?",
+                [(chat_id, user_id) for chat_id, user_id, _u, _ts, reset in rows if reset],
+            )
+            conn.executemany(
+                _UPSERT_ACTIVITY_SQL,
+                [
+                    (chat_id, user_id, username, activity_ts)
+                    for chat_id, user_id, username, activity_ts, _reset in rows
+                    if activity_ts is not None
+                ],
             )
-            conn.commit()
+            conn.executemany(
+                _UPDATE_ACTIVITY_USERNAME_SQL,
+                [
+                    (chat_id, user_id, username)
+                    for chat_id, user_id, username, activity_ts, _reset in rows
+                    if activity_ts is not None and username is not None
+                ],
+            )
+            if daily:
+                conn.executemany(
+                    """
+                    INSERT INTO user_activity_daily (chat_id, user_id, day, messages, callbacks, reactions)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(chat_id, day, user_id) DO UPDATE SET
+                        messages = messages + excluded.messages,
+                        callbacks = callbacks + excluded.callbacks,
+                        reactions = reactions + excluded.reactions
+                    """,
+                    daily,
+                )
         return len(rows)
 
+    def get_top_active_users(self, chat_id: int, *, days: int, limit: int = 20) -> List[UserEngagementRow]:
+        """
+        Самые активные участники чата за последние days дней (включая сегодняшний, UTC):
+        по сумме сообщений, нажатий и реакций. Читаются только дни окна (первичный ключ
+        user_activity_daily); username подставляется уже для limit строк. Вышедшие из чата
+        участники остаются в рейтинге без имени — их активность в окне была;
+        удалённые админом (delete_user_activity / clear_user_activity) — нет.
+        """
+        with self._connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT top.user_id, ua.username, top.messages, top.callbacks, top.reactions
+                FROM (
+                    SELECT user_id,
+                           SUM(messages) AS messages,
+                           SUM(callbacks) AS callbacks,
+                           SUM(reactions) AS reactions
+                    FROM user_activity_daily
+                    WHERE chat_id = ?1
+                      AND day > CAST(strftime('%s', 'now') AS INTEGER) / 86400 - ?2
+                    GROUP BY user_id
+                    ORDER BY SUM(messages) + SUM(callbacks) + SUM(reactions) DESC, user_id ASC
+                    LIMIT ?3
+                ) AS top
+                LEFT JOIN user_activity AS ua ON ua.chat_id = ?1 AND ua.user_id = top.user_id
+                ORDER BY top.messages + top.callbacks + top.reactions DESC, top.user_id ASC
+                """,
+                (chat_id, days, limit),
+            ).fetchall()
+        return [
+            (int(user_id), username, int(messages), int(callbacks), int(reactions))
+            for user_id, username, messages, callbacks, reactions in rows
+        ]
+
     def add_suggestion(self, chat_id: int, user_id: int, username: Optional[str], 
                       text: str, source_message_id: int) -> bool:
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
+                self._invalidate_suggestions(chat_id)
                 conn.execute("""
                     INSERT INTO suggestions (chat_id, user_id, username, text, source_message_id)
                     VALUES (?, ?, ?, ?, ?)
                 """, (chat_id, user_id, username, text, source_message_id))
-                conn.commit()
                 return True
         except sqlite3.Error:
             return False
 
-    def get_suggestions(self, chat_id: int) -> List[Tuple[int, int, Optional[str], str, int, str]]:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+    def get_suggestions(self, chat_id: int) -> List[SuggestionRow]:
+        with self._connection() as conn:
+            cached = self._suggestions_cache.get(chat_id)
+            if cached is not None:
+                return list(cached)
             cursor = conn.execute("""
                 SELECT id, user_id, username, text, source_message_id, created_at
                 FROM suggestions
                 WHERE chat_id = ?
-                ORDER BY created_at ASC
+                ORDER BY created_at ASC, id ASC
             """, (chat_id,))
-            return [tuple(row) for row in cursor.fetchall()]
+            rows = cursor.fetchall()
+            self._suggestions_cache.put(chat_id, tuple(rows))
+            return rows
     
     def count_suggestions(self, chat_id: int) -> int:
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
+            cached = self._suggestions_cache.get(chat_id)
+            if cached is not None:
+                return len(cached)
             cursor = conn.execute("""
                 SELECT COUNT(*) FROM suggestions
                 WHERE chat_id = ?
@@ -401,35 +826,81 @@ class Database:
             return cursor.fetchone()[0]
 
     def clear_suggestions(self, chat_id: int) -> int:
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
+            self._invalidate_suggestions(chat_id)
             cursor = conn.execute("""
                 DELETE FROM suggestions
                 WHERE chat_id = ?
             """, (chat_id,))
-            conn.commit()
             return cursor.rowcount
 
-    def get_suggestion_by_index(self, chat_id: int, index: int) -> Optional[Tuple[int, int, Optional[str], str, int, str]]:
+    @staticmethod
+    def _suggestion_at(conn: sqlite3.Connection, chat_id: int, index: int) -> Optional[SuggestionRow]:
+        """
+        Одна строка по номеру в списке (начиная с 1).
+        Порядок тот же, что в get_suggestions; идёт по индексу (chat_id, created_at).
+        """
+        if index < 1:
+            return None
+        cursor = conn.execute("""
+            SELECT id, user_id, username, text, source_message_id, created_at
+            FROM suggestions
+            WHERE chat_id = ?
+            ORDER BY created_at ASC, id ASC
+            LIMIT 1 OFFSET ?
+        """, (chat_id, index - 1))
+        return cursor.fetchone()
+
+    def get_suggestion_by_index(self, chat_id: int, index: int) -> Optional[SuggestionRow]:
         """Получает предложение по номеру в списке (начиная с 1)"""
-        suggestions = self.get_suggestions(chat_id)
-        if 1 <= index <= len(suggestions):
-            return suggestions[index - 1]
-        return None
+        with self._connection() as conn:
+            cached = self._suggestions_cache.get(chat_id)
+            if cached is not None:
+                return cached[index - 1] if 1 <= index <= len(cached) else None
+            return self._suggestion_at(conn, chat_id, index)
+
+    def delete_suggestion_by_index(
+        self,
+        chat_id: int,
+        index: int,
+        *,
+        author_user_id: Optional[int] = None,
+    ) -> Tuple[Optional[SuggestionRow], bool]:
+        """
+        Находит предложение по номеру в списке и удаляет его в одной транзакции,
+        чтобы параллельное удаление не сдвинуло номер между чтением и записью.
+
+        Если author_user_id задан, удаляет только предложение этого автора.
+        Возвращает (найденное_предложение_или_None, удалено_ли).
+        """
+        with self._transaction() as conn:
+            self._invalidate_suggestions(chat_id)
+            suggestion = self._suggestion_at(conn, chat_id, index)
+            if not suggestion:
+                return None, False
+            if author_user_id is not None and suggestion[1] != author_user_id:
+                return suggestion, False
+            cursor = conn.execute("""
+                DELETE FROM suggestions
+                WHERE chat_id = ? AND id = ?
+            """, (chat_id, suggestion[0]))
+            return suggestion, cursor.rowcount > 0
 
     def delete_suggestion(self, chat_id: int, suggestion_id: int) -> bool:
         """Удаляет предложение по ID. Возвращает True если удалено, False если не найдено"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
+            self._invalidate_suggestions(chat_id)
             cursor = conn.execute("""
                 DELETE FROM suggestions
                 WHERE chat_id = ? AND id = ?
             """, (chat_id, suggestion_id))
-            conn.commit()
             return cursor.rowcount > 0
 
     def add_genre(self, chat_id: int, title: str, source_message_id: int) -> bool:
         """Добавляет жанр. Возвращает True при успехе, False при ошибке"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
+                self._invalidate_genres(chat_id)
                 # Вычисляем следующий position для данного чата
                 cursor = conn.execute("""
                     SELECT COALESCE(MAX(position), 0) + 1
@@ -442,38 +913,93 @@ class Database:
                     INSERT INTO genres (chat_id, title, source_message_id, position, used)
                     VALUES (?, ?, ?, ?, 0)
                 """, (chat_id, title, source_message_id, next_position))
-                conn.commit()
                 return True
         except sqlite3.Error:
             return False
 
-    def get_genres(self, chat_id: int) -> List[Tuple[int, str, str, int, int, int]]:
+    def get_genres(self, chat_id: int) -> List[GenreRow]:
         """Получает все жанры для чата. Возвращает список кортежей (id, title, created_at, source_message_id, position, used)"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connection() as conn:
+            cached = self._genres_cache.get(chat_id)
+            if cached is not None:
+                return list(cached)
             cursor = conn.execute("""
                 SELECT id, title, created_at, source_message_id, position, used
                 FROM genres
                 WHERE chat_id = ?
-                ORDER BY position ASC
+                ORDER BY position ASC, id ASC
             """, (chat_id,))
-            return [tuple(row) for row in cursor.fetchall()]
+            rows = cursor.fetchall()
+            self._genres_cache.put(chat_id, tuple(rows))
+            return rows
+
+    @staticmethod
+    def _genre_at(conn: sqlite3.Connection, chat_id: int, index: int) -> Optional[GenreRow]:
+        """
+        Одна строка по номеру в списке (начиная с 1).
+        Порядок тот же, что в get_genres; идёт по индексу (chat_id, position).
+        """
+        if index < 1:
+            return None
+        cursor = conn.execute("""
+            SELECT id, title, created_at, source_message_id, position, used
+            FROM genres
+            WHERE chat_id = ?
+            ORDER BY position ASC, id ASC
+            LIMIT 1 OFFSET ?
+        """, (chat_id, index - 1))
+        return cursor.fetchone()
 
-    def get_genre_by_index(self, chat_id: int, index: int) -> Optional[Tuple[int, str, str, int, int, int]]:
+    def get_genre_by_index(self, chat_id: int, index: int) -> Optional[GenreRow]:
         """Получает жанр по номеру в списке (начиная с 1)"""
-        genres = self.get_genres(chat_id)
-        if 1 <= index <= len(genres):
-            return genres[index - 1]
-        return None
+        with self._connection() as conn:
+            cached = self._genres_cache.get(chat_id)
+            if cached is not None:
+                return cached[index - 1] if 1 <= index <= len(cached) else None
+            return self._genre_at(conn, chat_id, index)
+
+    def delete_genre_by_index(self, chat_id: int, index: int) -> Optional[GenreRow]:
+        """
+        Находит жанр по номеру в списке и удаляет его в одной транзакции.
+        Возвращает удалённый жанр или None, если такого номера нет.
+        """
+        with self._transaction() as conn:
+            self._invalidate_genres(chat_id)
+            genre = self._genre_at(conn, chat_id, index)
+            if not genre:
+                return None
+            conn.execute("""
+                DELETE FROM genres
+                WHERE chat_id = ? AND id = ?
+            """, (chat_id, genre[0]))
+            return genre
+
+    def toggle_genre_active_by_index(self, chat_id: int, index: int) -> Tuple[Optional[GenreRow], Optional[bool]]:
+        """
+        Находит жанр по номеру в списке и переключает его активность в одной транзакции.
+        Возвращает (жанр, новое_значение_активности) или (None, None), если такого номера нет.
+        """
+        with self._transaction() as conn:
+            self._invalidate_genres(chat_id)
+            genre = self._genre_at(conn, chat_id, index)
+            if not genre:
+                return None, None
+            conn.execute("""
+                UPDATE genres
+                SET used = CASE WHEN used = 0 THEN 1 ELSE 0 END
+                WHERE chat_id = ? AND id = ?
+            """, (chat_id, genre[0]))
+            # active = !used: был used=0 -> стал неактивным
+            return genre, genre[5] != 0
 
     def delete_genre(self, chat_id: int, genre_id: int) -> bool:
         """Удаляет жанр по ID. Возвращает True если удалено, False если не найдено"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
+            self._invalidate_genres(chat_id)
             cursor = conn.execute("""
                 DELETE FROM genres
                 WHERE chat_id = ? AND id = ?
             """, (chat_id, genre_id))
-            conn.commit()
             return cursor.rowcount > 0
 
     def add_poll(self, chat_id: int, poll_id: str, question: str, options: List[str], 
@@ -481,12 +1007,11 @@ class Database:
         """Добавляет опрос в базу данных. Возвращает True при успехе, False при ошибке"""
         import json
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 conn.execute("""
                     INSERT INTO polls (chat_id, poll_id, question, options, message_id, status)
                     VALUES (?, ?, ?, ?, ?, 'active')
                 """, (chat_id, poll_id, question, json.dumps(options, ensure_ascii=False), message_id))
-                conn.commit()
                 return True
         except sqlite3.Error:
             return False
@@ -498,8 +1023,7 @@ class Database:
         Если status указан, фильтрует по статусу.
         """
         import json
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connection() as conn:
             if status:
                 cursor = conn.execute("""
                     SELECT id, chat_id, poll_id, question, options, message_id, status, created_at, closed_at
@@ -514,29 +1038,26 @@ class Database:
                     WHERE chat_id = ?
                     ORDER BY created_at DESC
                 """, (chat_id,))
-            return [tuple(row) for row in cursor.fetchall()]
+            return cursor.fetchall()
 
     def get_poll_by_poll_id(self, chat_id: int, poll_id: str) -> Optional[Tuple[int, int, str, str, str, Optional[int], str, str, Optional[str]]]:
         """Получает опрос по poll_id. Возвращает кортеж или None"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connection() as conn:
             cursor = conn.execute("""
                 SELECT id, chat_id, poll_id, question, options, message_id, status, created_at, closed_at
                 FROM polls
                 WHERE chat_id = ? AND poll_id = ?
             """, (chat_id, poll_id))
-            row = cursor.fetchone()
-            return tuple(row) if row else None
+            return cursor.fetchone()
 
     def close_poll(self, chat_id: int, poll_id: str) -> bool:
         """Закрывает опрос. Возвращает True если обновлено, False если не найдено"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.execute("""
                 UPDATE polls
                 SET status = 'closed', closed_at = CURRENT_TIMESTAMP
                 WHERE chat_id = ? AND poll_id = ? AND status = 'active'
             """, (chat_id, poll_id))
-            conn.commit()
             return cursor.rowcount > 0
 
     def toggle_genre_active(self, chat_id: int, genre_id: int) -> Tuple[bool, Optional[bool]]:
@@ -544,7 +1065,8 @@ class Database:
         Переключает флаг активности жанра через used (active = !used).
         Возвращает (успех, новое_значение_активности) или (False, None) если жанр не найден.
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
+            self._invalidate_genres(chat_id)
             # Получаем текущее значение used
             cursor = conn.execute("""
                 SELECT used FROM genres
@@ -564,7 +1086,6 @@ class Database:
                 SET used = ?
                 WHERE chat_id = ? AND id = ?
             """, (new_used, chat_id, genre_id))
-            conn.commit()
             
             return cursor.rowcount > 0, new_active
 
@@ -573,13 +1094,13 @@ class Database:
         Устанавливает used=0 (active=1) для всех жанров в чате.
         Возвращает количество обновленных записей.
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
+            self._invalidate_genres(chat_id)
             cursor = conn.execute("""
                 UPDATE genres
                 SET used = 0
                 WHERE chat_id = ?
             """, (chat_id,))
-            conn.commit()
             return cursor.rowcount
 
     def add_or_update_group(self, chat_id: int, title: str, chat_type: str, is_active: int = 1) -> bool:
@@ -588,7 +1109,7 @@ class Database:
         Возвращает True при успехе, False при ошибке.
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 # Проверяем, существует ли уже запись
                 cursor = conn.execute("""
                     SELECT chat_id FROM groups WHERE chat_id = ?
@@ -608,7 +1129,6 @@ class Database:
                         INSERT INTO groups (chat_id, title, type, is_active, added_at, updated_at)
                         VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
                     """, (chat_id, title, chat_type, is_active))
-                conn.commit()
                 return True
         except sqlite3.Error:
             return False
@@ -618,13 +1138,12 @@ class Database:
         Удаляет группу из базы данных (устанавливает is_active=0).
         Возвращает True если обновлено, False если не найдено.
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.execute("""
                 UPDATE groups
                 SET is_active = 0, updated_at = CURRENT_TIMESTAMP
                 WHERE chat_id = ?
             """, (chat_id,))
-            conn.commit()
             return cursor.rowcount > 0
 
     def get_group(self, chat_id: int) -> Optional[Tuple[int, str, str, int, str, str]]:
@@ -632,15 +1151,13 @@ class Database:
         Получает информацию о группе.
         Возвращает кортеж (chat_id, title, type, is_active, added_at, updated_at) или None.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connection() as conn:
             cursor = conn.execute("""
                 SELECT chat_id, title, type, is_active, added_at, updated_at
                 FROM groups
                 WHERE chat_id = ?
             """, (chat_id,))
-            row = cursor.fetchone()
-            return tuple(row) if row else None
+            return cursor.fetchone()
 
     def get_all_groups(self, active_only: bool = False) -> List[Tuple[int, str, str, int, str, str]]:
         """
@@ -648,8 +1165,7 @@ class Database:
         Если active_only=True, возвращает только активные группы (is_active=1).
         Возвращает список кортежей (chat_id, title, type, is_active, added_at, updated_at).
         """
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connection() as conn:
             if active_only:
                 cursor = conn.execute("""
                     SELECT chat_id, title, type, is_active, added_at, updated_at
@@ -663,4 +1179,4 @@ class Database:
                     FROM groups
                     ORDER BY added_at DESC
                 """)
-            return [tuple(row) for row in cursor.fetchall()]
+            return cursor.fetchall()
@@ -0,0 +1,269 @@
+"""
+Версионированные миграции схемы SQLite.
+
+Текущая версия схемы хранится в PRAGMA user_version.
+Миграции пронумерованы и применяются по порядку, каждая ровно один раз
+и в своей транзакции (вместе с повышением user_version).
+Если схема актуальна, на старте выполняется только чтение user_version.
+"""
+
+import sqlite3
+from typing import Callable, List, Set, Tuple
+
+
+def _table_columns(conn: sqlite3.Connection, table: str) -> Set[str]:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+
+
+def _migration_1_base_schema(conn: sqlite3.Connection) -> None:
+    """Базовая схема. На существующих БД (до миграций) только догоняет недостающее."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS suggestions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            username TEXT,
+            text TEXT NOT NULL,
+            source_message_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS genres (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            source_message_id INTEGER NOT NULL,
+            position INTEGER DEFAULT 0,
+            used INTEGER DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS polls (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            poll_id TEXT NOT NULL,
+            question TEXT NOT NULL,
+            options TEXT NOT NULL,
+            message_id INTEGER,
+            status TEXT DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            closed_at TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS groups (
+            chat_id     INTEGER PRIMARY KEY,
+            title       TEXT NOT NULL,
+            type        TEXT NOT NULL,
+            is_active   INTEGER NOT NULL DEFAULT 1,
+            added_at    DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at  DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_activity (
+            chat_id           INTEGER NOT NULL,
+            user_id           INTEGER NOT NULL,
+            username          TEXT,
+            first_seen_at     DATETIME DEFAULT CURRENT_TIMESTAMP,
+            last_activity_at  DATETIME,
+
+            PRIMARY KEY (chat_id, user_id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS history (
+            chat_id     INTEGER NOT NULL,
+            month_year  TEXT NOT NULL,
+            book        TEXT,
+            genre       TEXT,
+
+            PRIMARY KEY (chat_id, month_year)
+        )
+    """)
+
+    # Старые БД: поля position и used могли появиться не сразу
+    genre_columns = _table_columns(conn, "genres")
+    if "position" not in genre_columns:
+        conn.execute("ALTER TABLE genres ADD COLUMN position INTEGER DEFAULT 0")
+    if "used" not in genre_columns:
+        conn.execute("ALTER TABLE genres ADD COLUMN used INTEGER DEFAULT 0")
+
+    # Проставляем position там, где его нет: порядковый номер по created_at внутри чата.
+    # Одним проходом по всей таблице, без цикла по чатам.
+    conn.execute("""
+        CREATE TEMP TABLE _genre_positions (
+            id       INTEGER PRIMARY KEY,
+            position INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        INSERT INTO _genre_positions (id, position)
+        SELECT id, ROW_NUMBER() OVER (PARTITION BY chat_id ORDER BY created_at ASC, id ASC)
+        FROM genres
+    """)
+    conn.execute("""
+        UPDATE genres
+        SET position = (SELECT p.position FROM _genre_positions p WHERE p.id = genres.id)
+        WHERE position = 0 OR position IS NULL
+    """)
+    conn.execute("DROP TABLE _genre_positions")
+
+
+def _migration_2_indexes(conn: sqlite3.Connection) -> None:
+    """Индексы под основные выборки по чату."""
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_suggestions_chat_created
+        ON suggestions (chat_id, created_at)
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_genres_chat_position
+        ON genres (chat_id, position)
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_polls_chat_status_created
+        ON polls (chat_id, status, created_at)
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_polls_poll_id
+        ON polls (poll_id)
+    """)
+
+
+def _migration_3_history_year_month(conn: sqlite3.Connection) -> None:
+    """
+    История: целочисленные year/month рядом с ключом month_year ("12_2026")
+    и индекс (chat_id, year, month) для выборок по году без разбора строк.
+    """
+    history_columns = _table_columns(conn, "history")
+    if "year" not in history_columns:
+        conn.execute("ALTER TABLE history ADD COLUMN year INTEGER")
+    if "month" not in history_columns:
+        conn.execute("ALTER TABLE history ADD COLUMN month INTEGER")
+
+    # Как Database._split_month_year: обе части — целые числа, иначе year/month остаются NULL
+    # (CAST превратил бы "ab_2026" в месяц 0)
+    conn.execute("""
+        UPDATE history
+        SET month = CAST(substr(TRIM(month_year), 1, instr(TRIM(month_year), '_') - 1) AS INTEGER),
+            year  = CAST(substr(TRIM(month_year), instr(TRIM(month_year), '_') + 1) AS INTEGER)
+        WHERE instr(TRIM(month_year), '_') > 1
+          AND substr(TRIM(month_year), 1, instr(TRIM(month_year), '_') - 1) NOT GLOB '*[^0-9]*'
+          AND substr(TRIM(month_year), instr(TRIM(month_year), '_') + 1) != ''
+          AND substr(TRIM(month_year), instr(TRIM(month_year), '_') + 1) NOT GLOB '*[^0-9]*'
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_history_chat_year_month
+        ON history (chat_id, year, month)
+    """)
+
+
+def _migration_4_user_activity_ts(conn: sqlite3.Connection) -> None:
+    """
+    user_activity: last_activity_ts — «эффективная» активность в секундах epoch,
+    то есть COALESCE(last_activity_at, first_seen_at). Индекс (chat_id, last_activity_ts)
+    превращает фильтры неактивности в range scan вместо разбора дат по всему чату.
+
+    Индекс покрывающий (user_id, username, last_activity_at в хвосте): выборки списка
+    не ходят в таблицу. Иначе на большой доле совпадений случайные обращения к строкам
+    по rowid обходятся дороже полного прохода по первичному ключу.
+    """
+    if "last_activity_ts" not in _table_columns(conn, "user_activity"):
+        conn.execute("ALTER TABLE user_activity ADD COLUMN last_activity_ts INTEGER")
+
+    conn.execute("""
+        UPDATE user_activity
+        SET last_activity_ts = CAST(strftime('%s', COALESCE(last_activity_at, first_seen_at)) AS INTEGER)
+        WHERE last_activity_ts IS NULL
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_user_activity_chat_ts
+        ON user_activity (chat_id, last_activity_ts, user_id, username, last_activity_at)
+    """)
+
+
+def _migration_5_user_activity_name_index(conn: sqlite3.Connection) -> None:
+    """
+    user_activity: индекс в порядке списка /users — (chat_id, имя без учёта регистра, user_id).
+    По нему страницы выбираются keyset-поиском без сортировки всего чата.
+    Не покрывающий: строки страницы (и фильтр по last_activity_ts) читаются из таблицы по rowid.
+    Зато flush активности, который меняет время на каждом upsert, этот индекс не трогает.
+    """
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_user_activity_chat_name
+        ON user_activity (chat_id, COALESCE(username, '') COLLATE NOCASE, user_id)
+    """)
+
+
+def _migration_6_user_activity_daily(conn: sqlite3.Connection) -> None:
+    """
+    user_activity_daily: счётчики событий участника по дням (UTC, день = секунды epoch // 86400).
+    Первичный ключ (chat_id, day, user_id): выборка за окно дней читает только эти дни.
+    Пишется инкрементально в транзакции flush буфера активности.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_activity_daily (
+            chat_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            messages INTEGER NOT NULL DEFAULT 0,
+            callbacks INTEGER NOT NULL DEFAULT 0,
+            reactions INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (chat_id, day, user_id)
+        ) WITHOUT ROWID
+    """)
+
+
+def _migration_7_user_activity_user_index(conn: sqlite3.Connection) -> None:
+    """
+    user_activity: индекс по user_id. /init_users проверяет «пользователь уже есть хоть в каком-то чате»
+    по user_id без chat_id — без индекса это полный проход таблицы.
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_activity_user ON user_activity (user_id)")
+
+
+# (версия, функция миграции). Новые миграции только добавляются в конец.
+MIGRATIONS: List[Tuple[int, Callable[[sqlite3.Connection], None]]] = [
+    (1, _migration_1_base_schema),
+    (2, _migration_2_indexes),
+    (3, _migration_3_history_year_month),
+    (4, _migration_4_user_activity_ts),
+    (5, _migration_5_user_activity_name_index),
+    (6, _migration_6_user_activity_daily),
+    (7, _migration_7_user_activity_user_index),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def apply_migrations(conn: sqlite3.Connection) -> int:
+    """
+    Применяет все миграции новее текущей версии схемы.
+    Возвращает количество применённых миграций.
+    """
+    current = get_schema_version(conn)
+    if current > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Схема БД (версия {current}) новее, чем поддерживает код (версия {SCHEMA_VERSION})"
+        )
+
+    applied = 0
+    for version, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied += 1
+    return applied
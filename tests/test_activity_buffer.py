@@ -0,0 +1,64 @@
+import pytest
+
+from services.user_activity_service import ActivityBuffer
+from storage.database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "bot.sqlite3"))
+    yield database
+    database.close()
+
+
+def test_activity_at_departure_time_does_not_bring_member_back(db):
+    db.apply_user_activity_batch([(-1, 7, "u7", 1_000, False)])
+
+    buf = ActivityBuffer()
+    # Служебное сообщение о выходе: выход и «активность» с тем же message.date
+    buf.add_departure(-1, 7, 2_000)
+    buf.add(-1, 7, "u7", 2_000)
+    # Запоздавшее событие из времени до выхода
+    buf.add(-1, 7, "u7", 1_500)
+    db.apply_user_activity_batch(buf.drain())
+
+    assert db.get_user_activity(-1, 7) is None
+
+
+def test_activity_after_departure_is_a_rejoin():
+    buf = ActivityBuffer()
+    buf.add_departure(-1, 7, 2_000)
+    buf.add(-1, 7, "u7", 2_001)
+    assert buf.drain() == [(-1, 7, "u7", 2_001, True)]
+
+
+def test_restored_departure_is_still_ordered():
+    buf = ActivityBuffer()
+    buf.add_departure(-1, 7, 2_000)
+    rows = buf.drain()
+    # Запись не удалась, а тем временем участник вернулся
+    buf.add(-1, 7, "u7", 2_500)
+    buf.restore(rows)
+    assert buf.drain() == [(-1, 7, "u7", 2_500, True)]
+
+
+def test_journal_replay_keeps_departure_time():
+    buf = ActivityBuffer()
+    buf.replay([(-1, 7, None, 2_000, True), (-1, 7, "u7", 2_000, False)])
+    assert buf.drain() == [(-1, 7, None, None, True)]
+
+
+def test_clearing_members_drops_them_from_top(db):
+    day = 2_000_000 // 86400
+    db.apply_user_activity_batch(
+        [(-1, 7, "u7", 2_000_000, False), (-1, 8, "u8", 2_000_000, False)],
+        [(-1, 7, day, 3, 0, 0), (-1, 8, day, 1, 0, 0), (-2, 7, day, 5, 0, 0)],
+    )
+
+    db.delete_user_activity(-1, 8)
+    assert [row[0] for row in db.get_top_active_users(-1, days=10**6)] == [7]
+
+    assert db.clear_user_activity(-1) == 1
+    assert db.get_top_active_users(-1, days=10**6) == []
+    # Другие чаты не затронуты
+    assert [row[0] for row in db.get_top_active_users(-2, days=10**6)] == [7]
@@ -0,0 +1,47 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from handlers.activity import handle_any_message_activity
+from services.user_activity_service import BOT_DATA_ACTIVITY_BUFFER, ActivityBuffer
+
+
+def _message_update(**message_fields):
+    chat = SimpleNamespace(id=-1, type="supergroup")
+    user = SimpleNamespace(id=7, username="u7", is_bot=False)
+    message = SimpleNamespace(
+        date=datetime(2024, 5, 1, tzinfo=timezone.utc),
+        new_chat_members=[],
+        left_chat_member=None,
+        **message_fields,
+    )
+    return SimpleNamespace(message=message, effective_chat=chat, effective_user=user)
+
+
+def _context():
+    buf = ActivityBuffer()
+    app = SimpleNamespace(bot_data={BOT_DATA_ACTIVITY_BUFFER: buf})
+    return SimpleNamespace(application=app), buf
+
+
+def test_status_messages_are_not_activity():
+    user = SimpleNamespace(id=7, username="u7", is_bot=False)
+    context, buf = _context()
+    left = _message_update()
+    left.message.left_chat_member = user
+    joined = _message_update()
+    joined.message.new_chat_members = [user, SimpleNamespace(id=8, username=None, is_bot=False)]
+
+    asyncio.run(handle_any_message_activity(left, context))
+    asyncio.run(handle_any_message_activity(joined, context))
+
+    assert len(buf) == 0
+    assert buf.drain_daily() == []
+
+
+def test_regular_message_is_counted():
+    context, buf = _context()
+    asyncio.run(handle_any_message_activity(_message_update(), context))
+
+    assert len(buf) == 1
+    assert [row[3:] for row in buf.drain_daily()] == [(1, 0, 0)]
@@ -1,8 +1,18 @@
 # export_members.py
 import csv
+import os
 import sys
+from typing import List, Optional, Set, Tuple
+
 from telethon import TelegramClient
 from telethon.tl.types import User
+from telethon.utils import get_peer_id
+
+FIELDNAMES = ["user_id", "username", "first_name", "last_name", "phone", "is_bot", "deleted"]
+
+# Сколько строк между сбросами файла на диск / сколько пользователей в одной транзакции БД
+FLUSH_EVERY = 500
+DB_BATCH_SIZE = 1000
 
 API_ID = int(input("api_id: ").strip())
 API_HASH = input("api_hash: ").strip()
@@ -10,36 +20,144 @@ API_HASH = input("api_hash: ").strip()
 # Можно вставить @username группы или ссылку t.me/..., или numeric id
 CHAT = input("chat (например @mygroup или https://t.me/mygroup): ").strip()
 
+# csv — файл members.csv для /init_users; db — сразу в SQLite бота (user_activity)
+MODE = (input("куда сохранить: csv или db [csv]: ").strip() or "csv").lower()
+
 OUT = "members.csv"
 
+
+def _row(u: User) -> dict:
+    return {
+        "user_id": u.id,
+        "username": u.username or "",
+        "first_name": u.first_name or "",
+        "last_name": u.last_name or "",
+        "phone": u.phone or "",
+        "is_bot": int(bool(u.bot)),
+        "deleted": int(bool(u.deleted)),
+    }
+
+
+def _load_done_ids(path: str) -> Set[int]:
+    """
+    user_id, уже записанные в CSV прошлым (прерванным) запуском.
+    Недописанная последняя строка отрезается, чтобы дописывать с начала строки.
+    """
+    if not os.path.exists(path):
+        return set()
+
+    with open(path, "rb+") as f:
+        data_end = f.seek(0, os.SEEK_END)
+        if data_end:
+            f.seek(data_end - 1)
+            if f.read(1) != b"\n":
+                # Ищем последний перевод строки с конца, небольшими кусками
+                pos = data_end
+                while pos > 0:
+                    step = min(4096, pos)
+                    pos -= step
+                    f.seek(pos)
+                    chunk = f.read(step)
+                    idx = chunk.rfind(b"\n")
+                    if idx != -1:
+                        f.truncate(pos + idx + 1)
+                        break
+                else:
+                    f.truncate(0)
+
+    done: Set[int] = set()
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            try:
+                done.add(int(row["user_id"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+    return done
+
+
+async def export_csv(client: TelegramClient, entity) -> None:
+    """Пишет участников в members.csv по мере получения; повторный запуск дописывает недостающих."""
+    done = _load_done_ids(OUT)
+    if done:
+        print(f"Продолжаю: в {OUT} уже {len(done)} участников")
+    new_file = not os.path.exists(OUT) or os.path.getsize(OUT) == 0
+
+    written = 0
+    with open(OUT, "a", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        if new_file:
+            w.writeheader()
+        async for u in client.iter_participants(entity):
+            if not isinstance(u, User) or u.id in done:
+                continue
+            w.writerow(_row(u))
+            done.add(u.id)
+            written += 1
+            if written % FLUSH_EVERY == 0:
+                # Чекпоинт: после прерывания эти строки уже на диске и не запишутся второй раз
+                # (список участников при повторном запуске всё равно скачивается с начала)
+                f.flush()
+                os.fsync(f.fileno())
+                print(f"  ... {written}")
+
+    print(f"Saved {written} new members to {OUT} ({len(done)} total)")
+
+
+async def export_db(client: TelegramClient, entity) -> None:
+    """
+    Пишет участников прямо в user_activity БД бота, пачками (как /init_users по user_id).
+    Уже известные боту user_id пропускаются, поэтому прерванный запуск можно просто повторить.
+    Бота лучше остановить на время импорта.
+    """
+    # Скрипт лежит в util/, модули бота — на уровень выше
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from storage.database import Database
+
+    default_path = os.environ.get("DB_PATH") or os.path.join("data", "bot.sqlite3")
+    db_path = input(f"путь к БД бота [{default_path}]: ").strip() or default_path
+    if not os.path.exists(db_path):
+        print(f"Нет файла БД: {db_path}")
+        return
+    # Тот же id, что видит бот: для супергрупп -100...
+    chat_id = get_peer_id(entity)
+
+    db = Database(db_path)
+    inserted = skipped = 0
+    batch: List[Tuple[int, Optional[str]]] = []
+
+    def flush() -> None:
+        nonlocal inserted, skipped
+        ins, sk = db.insert_user_activity_if_missing_by_user_id(chat_id, batch)
+        inserted += ins
+        skipped += sk
+        batch.clear()
+        print(f"  ... добавлено {inserted}, пропущено {skipped}")
+
+    try:
+        async for u in client.iter_participants(entity):
+            if not isinstance(u, User) or u.bot:
+                continue
+            batch.append((u.id, u.username or None))
+            if len(batch) >= DB_BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
+    finally:
+        db.close()
+
+    print(f"Chat {chat_id}: added {inserted}, skipped (already known) {skipped}")
+
+
 async def main():
     client = TelegramClient("user_session", API_ID, API_HASH)
     await client.start()  # попросит телефон/код/2FA при первом запуске
 
     entity = await client.get_entity(CHAT)
 
-    rows = []
-    async for u in client.iter_participants(entity):
-        if not isinstance(u, User):
-            continue
-        rows.append({
-            "user_id": u.id,
-            "username": u.username or "",
-            "first_name": u.first_name or "",
-            "last_name": u.last_name or "",
-            "phone": u.phone or "",
-            "is_bot": int(bool(u.bot)),
-            "deleted": int(bool(u.deleted)),
-        })
-
-    with open(OUT, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=rows[0].keys() if rows else [
-            "user_id","username","first_name","last_name","phone","is_bot","deleted"
-        ])
-        w.writeheader()
-        w.writerows(rows)
-
-    print(f"Saved {len(rows)} members to {OUT}")
+    if MODE == "db":
+        await export_db(client, entity)
+    else:
+        await export_csv(client, entity)
 
 if __name__ == "__main__":
     try: